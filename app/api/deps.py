@@ -1,44 +1,82 @@
 """FastAPI dependencies for dependency injection."""
 from functools import lru_cache
-from typing import Annotated, Any, Optional
+from typing import Annotated
 
-from fastapi import Depends
+from fastapi import Depends, Request
 
-from app.core.config import Settings, load_settings
-from app.rag.retriever import get_retriever
-from app.rag.vectorstore import load_vectorstore
+from app.core.concurrency import ConcurrencyLimiter
+from app.core.config import get_settings
+from app.core.constants import (
+    INGEST_RATE_LIMIT_BURST,
+    INGEST_RATE_LIMIT_PER_SECOND,
+    QA_MAX_QUEUE,
+    QA_MAX_QUEUE_SECONDS,
+    QA_RATE_LIMIT_BURST,
+    QA_RATE_LIMIT_PER_SECOND,
+    RATE_LIMIT_CLIENT_HEADER,
+    RATE_LIMIT_MAX_CLIENTS,
+)
+from app.core.rate_limit import ClientRateLimiter
+from app.rag.resources import ResourceRegistry, get_resource_registry
 
-# global cache for expensive objects to avoid recreating on every request
-_cached_vectorstore: Optional[Any] = None
-_cached_retriever: Optional[Any] = None
 
-# cache settings to avoid reloading on every request
-# lru_cache ensures settings are only loaded once
+def get_resources() -> ResourceRegistry:
+    """Dependency to get the resource registry started by the application lifespan."""
+    return get_resource_registry()
+
+
+def get_vectorstore_dep(resources: Annotated[ResourceRegistry, Depends(get_resources)]):
+    """Dependency to get vectorstore (owned by the resource registry)."""
+    # loaded during warmup and rebuilt after /ingest rewrote the collection
+    return resources.get_vectorstore()
+
+
+def get_retriever_dep(resources: Annotated[ResourceRegistry, Depends(get_resources)]):
+    """Dependency to get retriever (owned by the resource registry)."""
+    return resources.get_retriever()
+
+
+# one limiter per process so every /ask request shares the same slots
 @lru_cache()
-def get_settings() -> Settings:
-    """Get application settings (cached)."""
-    return load_settings()
+def get_qa_limiter() -> ConcurrencyLimiter:
+    """Get the limiter that bounds concurrent and queued QA pipeline runs (cached)."""
+    return ConcurrencyLimiter(
+        limit=get_settings().qa_max_concurrency,
+        name="qa",
+        max_queue=QA_MAX_QUEUE or None,
+        max_wait=QA_MAX_QUEUE_SECONDS or None,
+    )
 
 
-def get_vectorstore_dep(settings: Annotated[Settings, Depends(get_settings)]):
-    """Dependency to get vectorstore (cached)."""
-    global _cached_vectorstore
-    # create vectorstore on first call, then reuse the cached instance
-    if _cached_vectorstore is None:
-        _cached_vectorstore = load_vectorstore(settings=settings)
-    return _cached_vectorstore
+@lru_cache()
+def get_qa_rate_limiter() -> ClientRateLimiter:
+    """Get the per-client rate limit of the QA endpoints (cached)."""
+    return ClientRateLimiter("qa", QA_RATE_LIMIT_PER_SECOND, QA_RATE_LIMIT_BURST, RATE_LIMIT_MAX_CLIENTS)
+
+
+@lru_cache()
+def get_ingest_rate_limiter() -> ClientRateLimiter:
+    """Get the per-client rate limit of ingestion requests (cached)."""
+    return ClientRateLimiter(
+        "ingest", INGEST_RATE_LIMIT_PER_SECOND, INGEST_RATE_LIMIT_BURST, RATE_LIMIT_MAX_CLIENTS
+    )
+
 
+def get_client_id(request: Request) -> str:
+    """Identify the client of a request for rate limiting."""
+    if RATE_LIMIT_CLIENT_HEADER:
+        value = request.headers.get(RATE_LIMIT_CLIENT_HEADER)
+        if value:
+            # X-Forwarded-For lists the original client first
+            return value.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
 
-def get_retriever_dep(
-    vectorstore: Annotated[Any, Depends(get_vectorstore_dep)] = None,
-    settings: Annotated[Settings, Depends(get_settings)] = None,
-):
-    """Dependency to get retriever (cached)."""
-    global _cached_retriever
-    # create retriever on first call, then reuse the cached instance
-    if _cached_retriever is None:
-        _cached_retriever = get_retriever(vectorstore=vectorstore)
-    return _cached_retriever
 
+def limit_qa_rate(request: Request) -> None:
+    """Dependency charging one request to the client's QA rate limit (429 when exceeded)."""
+    get_qa_rate_limiter().check(get_client_id(request))
 
 
+def limit_ingest_rate(request: Request) -> None:
+    """Dependency charging one request to the client's ingestion rate limit (429 when exceeded)."""
+    get_ingest_rate_limiter().check(get_client_id(request))
@@ -1,5 +1,18 @@
-"""Health check endpoint."""
+"""Health check and readiness endpoints."""
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.api.deps import get_ingest_rate_limiter, get_qa_limiter, get_qa_rate_limiter
+from app.core.resilience import circuit_breakers
+from app.rag.answer_cache import get_answer_cache
+from app.rag.condense import get_condense_stats
+from app.rag.embeddings import get_query_batcher
+from app.rag.ingest_jobs import get_ingest_job_manager
+from app.rag.llm_chain import get_chain_registry
+from app.rag.memory import get_memory_store
+from app.rag.retrieval_cache import get_retrieval_cache
+from app.rag.resilient_llm import get_llm_call_stats
+from app.rag.resources import get_resource_registry
 
 router = APIRouter()
 
@@ -7,6 +20,38 @@ router = APIRouter()
 @router.get("/health")
 async def health_check():
     """Health check endpoint for monitoring service availability."""
-    # simple health check that returns service status
-    return {"status": "healthy", "service": "rag-medical-assistant-backend"}
+    # simple health check that returns service status and current QA load
+    return {
+        "status": "healthy",
+        "service": "rag-medical-assistant-backend",
+        "qa_concurrency": get_qa_limiter().snapshot(),
+        "rate_limits": {"qa": get_qa_rate_limiter().snapshot(), "ingest": get_ingest_rate_limiter().snapshot()},
+        "chain_registry": get_chain_registry().stats(),
+        "llm_calls": get_llm_call_stats(),
+        "memory": get_memory_store().stats(),
+        "condense": get_condense_stats(),
+        "answer_cache": get_answer_cache().stats(),
+        "retrieval_cache": get_retrieval_cache().stats(),
+        "query_embedding_batcher": get_query_batcher().stats(),
+        "ingest_jobs": get_ingest_job_manager().stats(),
+        "circuit_breakers": {name: breaker.snapshot() for name, breaker in circuit_breakers().items()},
+    }
+
+
+@router.get("/ready")
+async def readiness_check():
+    """
+    Readiness probe: 200 once every shared resource is loaded and warm, 503 otherwise.
 
+    Unlike /health (the process is alive), this tells a load balancer when the
+    instance can take traffic. While not ready, resources that failed to warm
+    up are retried in the background.
+    """
+    resources = get_resource_registry()
+    if not resources.ready and not resources.warming_up:
+        resources.start_warmup()
+    readiness = resources.readiness()
+    return JSONResponse(
+        status_code=200 if readiness["ready"] else 503,
+        content={"status": "ready" if readiness["ready"] else "not_ready", **readiness},
+    )
@@ -0,0 +1,114 @@
+"""Prometheus metrics endpoint."""
+from typing import Iterable
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.api.deps import get_ingest_rate_limiter, get_qa_limiter, get_qa_rate_limiter
+from app.core.metrics import Sample, get_metrics_registry
+from app.core.resilience import STATE_VALUES, circuit_breakers
+from app.rag.answer_cache import get_answer_cache
+from app.rag.embeddings import get_embedding_cache_stats, get_query_batcher
+from app.rag.ingest_jobs import get_ingest_job_manager
+from app.rag.llm_chain import get_chain_registry
+from app.rag.memory import get_memory_store
+from app.rag.resilient_llm import get_llm_call_stats
+from app.rag.retrieval_cache import get_retrieval_cache
+
+router = APIRouter()
+
+# content type of the Prometheus text exposition format
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _collect_components() -> Iterable[Sample]:
+    """Read the counters the components already keep for /health."""
+    qa = get_qa_limiter().snapshot()
+    yield "qa_concurrency_limit", "gauge", "Max concurrent QA pipeline runs", {}, qa["limit"]
+    yield "qa_in_flight", "gauge", "QA pipeline runs holding a slot", {}, qa["in_flight"]
+    yield "qa_waiting", "gauge", "QA pipeline runs waiting for a slot", {}, qa["waiting"]
+    yield "qa_completed_total", "counter", "QA pipeline runs completed", {}, qa["completed"]
+    if qa["max_queue"] is not None:
+        yield "qa_queue_limit", "gauge", "Max QA pipeline runs waiting for a slot", {}, qa["max_queue"]
+    for name, limiter in (("qa", get_qa_rate_limiter()), ("ingest", get_ingest_rate_limiter())):
+        clients = limiter.snapshot()["clients"]
+        yield "rate_limit_clients", "gauge", "Clients with a rate limit bucket", {"queue": name}, clients
+
+    answers = get_answer_cache().stats()
+    yield "answer_cache_entries", "gauge", "Answers in the semantic cache", {}, answers["entries"]
+    for result, key in (("hit", "hits"), ("miss", "misses")):
+        yield "answer_cache_lookups_total", "counter", "Semantic answer cache lookups", {"result": result}, answers[key]
+    yield "answer_cache_hit_rate", "gauge", "Semantic answer cache hit rate", {}, answers["hit_rate"]
+    yield "answer_cache_evictions_total", "counter", "Answers evicted (LRU)", {}, answers["evictions"]
+    refused = answers["qualifier_misses"]
+    yield "answer_cache_qualifier_misses_total", "counter", "Similar answers refused (qualifiers differ)", {}, refused
+
+    retrievals = get_retrieval_cache().stats()
+    yield "retrieval_cache_entries", "gauge", "Retrievals in the retrieval cache", {}, retrievals["entries"]
+    yield "retrieval_cache_bytes", "gauge", "Approximate memory held by the retrieval cache", {}, retrievals["bytes"]
+    for result, key in (("hit", "hits"), ("miss", "misses")):
+        yield "retrieval_cache_lookups_total", "counter", "Retrieval cache lookups", {"result": result}, retrievals[key]
+    yield "retrieval_cache_hit_rate", "gauge", "Retrieval cache hit rate", {}, retrievals["hit_rate"]
+    yield "retrieval_cache_evictions_total", "counter", "Retrievals evicted (LRU)", {}, retrievals["evictions"]
+    yield (
+        "retrieval_cache_invalidations_total", "counter", "Retrieval cache flushes after /ingest",
+        {}, retrievals["invalidations"],
+    )
+
+    embeddings = get_embedding_cache_stats()
+    if embeddings is not None:
+        yield "embedding_cache_vectors", "gauge", "Vectors in the embedding disk cache", {}, embeddings["vectors"]
+        for result, key in (("hit", "hits"), ("miss", "misses")):
+            yield (
+                "embedding_cache_lookups_total", "counter", "Embedding disk cache lookups",
+                {"result": result}, embeddings[key],
+            )
+
+    chains = get_chain_registry().stats()
+    yield "llm_clients", "gauge", "Cached LLM clients", {}, chains["llm_clients"]
+    yield "chain_cache_lookups_total", "counter", "Chain cache lookups", {"result": "hit"}, chains["chain_cache_hits"]
+    yield "chain_cache_lookups_total", "counter", "Chain cache lookups", {"result": "miss"}, chains["chain_cache_misses"]
+
+    for model, calls in get_llm_call_stats()["models"].items():
+        if calls["hedge_after_seconds"] is not None:
+            yield (
+                "llm_hedge_after_seconds", "gauge", "Delay before a hedged LLM request (recent p95 latency)",
+                {"model": model}, calls["hedge_after_seconds"],
+            )
+
+    memory = get_memory_store().stats()
+    yield "memory_sessions", "gauge", "Live conversation memories", {}, memory["sessions"]
+    yield "memory_evictions_total", "counter", "Conversation memories evicted", {"reason": "lru"}, memory["evicted_lru"]
+    yield "memory_evictions_total", "counter", "Conversation memories evicted", {"reason": "ttl"}, memory["evicted_ttl"]
+
+    jobs = get_ingest_job_manager().stats()
+    yield "ingest_jobs_active", "gauge", "Ingestion jobs running or queued", {}, len(jobs["active"])
+    yield "ingest_jobs_running", "gauge", "Ingestion jobs running", {}, jobs["running"]
+    yield "ingest_jobs_queued", "gauge", "Ingestion jobs waiting for a slot", {}, jobs["queued"]
+
+    for name, breaker in circuit_breakers().items():
+        stats = breaker.snapshot()
+        yield (
+            "circuit_breaker_state", "gauge", "Circuit breaker state (0 closed, 1 half-open, 2 open)",
+            {"service": name}, STATE_VALUES[stats["state"]],
+        )
+        for result, key in (("success", "successes"), ("failure", "failures"), ("rejected", "rejected")):
+            yield (
+                "circuit_breaker_calls_total", "counter", "Calls through a circuit breaker",
+                {"service": name, "result": result}, stats[key],
+            )
+        yield "circuit_breaker_retries_total", "counter", "Retried calls", {"service": name}, stats["retries"]
+        yield "circuit_breaker_opened_total", "counter", "Times a circuit opened", {"service": name}, stats["opened"]
+
+
+# the batcher keeps its own histograms, exported as they are
+_batcher = get_query_batcher()
+get_metrics_registry().register(_batcher.batch_size)
+get_metrics_registry().register(_batcher.queue_wait)
+get_metrics_registry().add_collector(_collect_components)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """Expose every metric in the Prometheus text format."""
+    return PlainTextResponse(get_metrics_registry().render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,14 +1,40 @@
 """Question-answering endpoint."""
-from typing import Annotated, Any, Optional
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import Annotated, Any, AsyncIterator, Iterator, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 
-from app.api.deps import get_retriever_dep, get_settings
+from app.api.deps import (
+    get_client_id,
+    get_qa_limiter,
+    get_qa_rate_limiter,
+    get_retriever_dep,
+    get_settings,
+    limit_qa_rate,
+)
+from app.core.concurrency import BATCH, INTERACTIVE, AdmissionRejected, ConcurrencyLimiter
 from app.core.config import Settings
-from app.rag.llm_chain import PromptType
+from app.core.constants import ANSWER_CACHE_ENABLED, BATCH_ASK_MAX_CONCURRENCY, BATCH_ASK_MAX_QUESTIONS
+from app.core.logger import get_logger
+from app.core.metrics import get_metrics_registry, stage_timer
+from app.rag.answer_cache import CachedAnswer, get_answer_cache
+from app.rag.context_packing import context_report, pack_documents
+from app.rag.embeddings import aembed_queries, aembed_query
+from app.rag.llm_chain import PromptType, agenerate_answer
+from app.rag.tokens import count_tokens
+from app.rag.vectorstore import get_collection_generation
 
 router = APIRouter()
+LOGGER = get_logger(__name__)
+
+# answer returned when the chain produced no output (never cached)
+NO_ANSWER_MESSAGE = "No se obtuvo respuesta."
 
 
 class QuestionRequest(BaseModel):
@@ -16,7 +42,7 @@ class QuestionRequest(BaseModel):
     question: str  # the user's question
     use_memory: bool = True  # whether to use conversational memory
     prompt_type: str = PromptType.DEFAULT.value  # prompt engineering technique to use
-    conversation_id: Optional[str] = None  # for future session management
+    conversation_id: Optional[str] = None  # conversation whose memory is used (shared default if None)
 
 
 class SourceDocument(BaseModel):
@@ -26,17 +52,231 @@ class SourceDocument(BaseModel):
     page_end: Optional[int] = None  # ending page number
 
 
+class ContextStats(BaseModel):
+    """How the retrieved chunks were packed into the prompt context."""
+    chunks_retrieved: int  # chunks returned by the retriever
+    chunks_merged: int  # chunks joined to an overlapping neighbour
+    duplicates_removed: int  # chunks whose text was already in the context
+    chunks_dropped: int  # passages left out to stay within the token budget
+    passages: int  # passages in the final context
+    context_tokens: int  # tokens of the final context
+    token_budget: int  # CONTEXT_TOKEN_BUDGET (0 = unbounded)
+
+
 class QuestionResponse(BaseModel):
     """Response model for QA."""
     answer: str  # the generated answer
     sources: list[SourceDocument]  # list of source documents used
     conversation_id: Optional[str] = None  # conversation identifier
+    context: Optional[ContextStats] = None  # context packing report (None for cached answers)
+
+
+class BatchQuestionRequest(BaseModel):
+    """Request model for batch QA (stateless questions, answered independently)."""
+    questions: list[str] = Field(min_length=1, max_length=BATCH_ASK_MAX_QUESTIONS)  # questions, in order
+    prompt_type: str = PromptType.DEFAULT.value  # prompt engineering technique used for every question
+    # LLM calls in flight for this batch (capped by BATCH_ASK_MAX_CONCURRENCY)
+    max_concurrency: Optional[int] = Field(default=None, ge=1)
+
+
+class BatchAnswer(BaseModel):
+    """Answer to one question of a batch (error is set instead of answer if it failed)."""
+    index: int  # position of the question in the request
+    question: str
+    answer: Optional[str] = None
+    sources: list[SourceDocument] = []
+    context: Optional[ContextStats] = None
+    cached: bool = False  # served from the semantic answer cache
+    error: Optional[str] = None
+
+
+class BatchQuestionResponse(BaseModel):
+    """Response model for batch QA."""
+    results: list[BatchAnswer]  # one entry per question, in request order
+    answered: int  # questions answered (cached or generated)
+    failed: int  # questions that failed
+
+
+@dataclass
+class _RequestOutcome:
+    """Outcome label of a request, set by the handler before it finishes."""
+    value: str = "error"
+
+
+@asynccontextmanager
+async def _admission(
+    limiter: ConcurrencyLimiter, outcome: _RequestOutcome, priority: int = INTERACTIVE
+) -> AsyncIterator[None]:
+    """Hold a QA limiter slot, labelling the request as rejected if it is not admitted."""
+    try:
+        await limiter.admit(priority)
+    except AdmissionRejected:
+        outcome.value = "rejected"
+        raise
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        limiter.release(time.perf_counter() - started)
+
+
+@contextmanager
+def _track_request(endpoint: str) -> Iterator[_RequestOutcome]:
+    """Count the request as in flight and observe its latency by outcome."""
+    metrics = get_metrics_registry()
+    outcome = _RequestOutcome()
+    started = time.perf_counter()
+    with metrics.gauge("requests_in_flight", "QA requests being processed", endpoint=endpoint).track_inprogress():
+        try:
+            yield outcome
+        finally:
+            metrics.histogram(
+                "request_duration_seconds",
+                "End-to-end latency of QA requests",
+                endpoint=endpoint,
+                outcome=outcome.value,
+            ).observe(time.perf_counter() - started)
+
+
+def _record_tokens(question: str, answer: str) -> None:
+    """Count question and answer tokens (context tokens are counted when packing)."""
+    metrics = get_metrics_registry()
+    metrics.counter("llm_tokens_total", "Tokens sent to or produced by the LLM", kind="question").inc(
+        count_tokens(question)
+    )
+    metrics.counter("llm_tokens_total", "Tokens sent to or produced by the LLM", kind="answer").inc(
+        count_tokens(answer)
+    )
+
+
+def _resolve_prompt_type(value: str) -> PromptType:
+    """Convert a prompt_type string to PromptType, defaulting to DEFAULT."""
+    try:
+        return PromptType(value)
+    except ValueError:
+        # if invalid prompt type, default to DEFAULT
+        return PromptType.DEFAULT
+
+
+def _build_qa_chain(
+    request: QuestionRequest,
+    retriever: Any,
+    settings: Optional[Settings],
+    prompt_type: PromptType,
+) -> tuple[Any, dict]:
+    """Build the QA chain for a request and the input dict it expects."""
+    # if use_memory is true, use conversational chain that maintains context
+    if request.use_memory:
+        from app.rag.llm_chain import build_conversational_chain
+        from app.rag.memory import get_memory
+        qa_chain = build_conversational_chain(
+            retriever=retriever,
+            memory=get_memory(request.conversation_id),
+            settings=settings,
+            verbose=False,
+            prompt_type=prompt_type,
+        )
+        # ConversationalRetrievalChain expects "question" as input key
+        return qa_chain, {"question": request.question}
+
+    # if use_memory is false, use simple retrieval chain without memory
+    from app.rag.llm_chain import build_retrieval_qa_chain
+    qa_chain = build_retrieval_qa_chain(
+        retriever=retriever,
+        settings=settings,
+        prompt_type=prompt_type,
+    )
+    # RetrievalQA expects "query" as input key
+    return qa_chain, {"query": request.question}
 
 
-@router.post("/ask", response_model=QuestionResponse)
+def _extract_answer(qa_chain: Any, response: Any) -> str:
+    """Extract the answer text from a chain response."""
+    # different chain types may use different output keys
+    answer = None
+    if isinstance(response, dict):
+        # try to get the output_key from the chain if available
+        output_key = getattr(qa_chain, "output_key", None)
+        if output_key and output_key in response:
+            answer = response[output_key]
+
+        # fallback to common keys if output_key not found
+        if not answer:
+            answer = response.get("answer") or response.get("result") or response.get("output")
+
+    # default message if no answer was found
+    return answer or NO_ANSWER_MESSAGE
+
+
+def _extract_sources(source_documents: list) -> list[SourceDocument]:
+    """Build the source list from the retrieved documents."""
+    sources = []
+    for doc in source_documents:
+        metadata = doc.metadata or {}
+        sources.append(
+            SourceDocument(
+                source=metadata.get("source", "desconocido"),
+                page_start=metadata.get("page_start"),
+                page_end=metadata.get("page_end"),
+            )
+        )
+    return sources
+
+
+def _context_stats(source_documents: Any) -> Optional[ContextStats]:
+    """Return the packing report attached to the retrieved documents, if any."""
+    report = context_report(source_documents)
+    return ContextStats(**report.as_dict()) if report is not None else None
+
+
+@dataclass
+class _AnswerCacheLookup:
+    """Result of an answer cache lookup, kept to store the answer on a miss."""
+    embedding: Optional[list] = None  # question embedding (None if the cache is bypassed)
+    generation: Optional[int] = None  # collection generation before retrieval
+    cached: Optional[CachedAnswer] = None  # cached answer if the lookup hit
+
+    def store(self, question: str, prompt_type: PromptType, answer: str, source_documents: list) -> None:
+        """Store a freshly generated answer if the cache was consulted."""
+        if self.embedding is None or answer == NO_ANSWER_MESSAGE:
+            return
+        get_answer_cache().store(
+            embedding=self.embedding,
+            prompt_type=prompt_type.value,
+            question=question,
+            answer=answer,
+            source_documents=source_documents,
+            generation=self.generation,
+        )
+
+
+async def _lookup_answer_cache(request: QuestionRequest, prompt_type: PromptType) -> _AnswerCacheLookup:
+    """Look up a cached answer for a stateless question."""
+    # answers that depend on chat history cannot be reused
+    if request.use_memory or not ANSWER_CACHE_ENABLED:
+        return _AnswerCacheLookup()
+
+    # read the generation first so an answer computed during a re-index is not stored
+    with stage_timer("ask", "answer_cache"):
+        lookup = _AnswerCacheLookup(
+            embedding=await aembed_query(request.question),
+            generation=get_collection_generation(),
+        )
+        lookup.cached = get_answer_cache().lookup(lookup.embedding, prompt_type.value, request.question)
+    if lookup.cached is not None:
+        LOGGER.info(
+            "Respuesta servida desde caché (similitud %.3f con '%s')",
+            lookup.cached.similarity,
+            lookup.cached.question,
+        )
+    return lookup
+
+
+@router.post("/ask", response_model=QuestionResponse, dependencies=[Depends(limit_qa_rate)])
 async def ask_question(
     request: QuestionRequest,
     retriever: Annotated[Any, Depends(get_retriever_dep)],
+    limiter: Annotated[ConcurrencyLimiter, Depends(get_qa_limiter)],
     settings: Annotated[Settings, Depends(get_settings)] = None,
 ):
     """
@@ -45,82 +285,276 @@ async def ask_question(
     Args:
         request: Question request with question text and optional memory flag
         retriever: Retriever dependency (injected by FastAPI)
+        limiter: Limiter bounding concurrent QA pipeline runs
         settings: Application settings
     
     Returns:
         Answer with source documents
+
+    Raises 503 with Retry-After when the QA queue is full or the question
+    waited too long for a slot, and 429 when the client is over its rate limit.
     """
-    try:
-        # validate and convert prompt_type string to PromptType enum
+    with _track_request("ask") as outcome:
         try:
-            prompt_type = PromptType(request.prompt_type)
-        except ValueError:
-            # if invalid prompt type, default to DEFAULT
-            prompt_type = PromptType.DEFAULT
-        
-        # build the appropriate QA chain based on memory preference
-        # if use_memory is true, use conversational chain that maintains context
-        if request.use_memory:
-            from app.rag.llm_chain import build_conversational_chain
-            qa_chain = build_conversational_chain(
-                retriever=retriever,
-                settings=settings,
-                verbose=False,
-                prompt_type=prompt_type,
-            )
-            # ConversationalRetrievalChain expects "question" as input key
-            chain_input = {"question": request.question}
-        else:
-            # if use_memory is false, use simple retrieval chain without memory
-            from app.rag.llm_chain import build_retrieval_qa_chain
-            qa_chain = build_retrieval_qa_chain(
-                retriever=retriever,
-                settings=settings,
-                prompt_type=prompt_type,
-            )
-            # RetrievalQA expects "query" as input key
-            chain_input = {"query": request.question}
-        
-        # invoke the chain with the question
-        # this triggers: retrieval -> prompt construction -> LLM generation
-        response = qa_chain.invoke(chain_input)
-        
-        # extract the answer from the chain response
-        # different chain types may use different output keys
-        answer = None
-        if isinstance(response, dict):
-            # try to get the output_key from the chain if available
-            output_key = getattr(qa_chain, "output_key", None)
-            if output_key and output_key in response:
-                answer = response[output_key]
-            
-            # fallback to common keys if output_key not found
-            if not answer:
-                answer = response.get("answer") or response.get("result") or response.get("output")
-        
-        # default message if no answer was found
-        if not answer:
-            answer = "No se obtuvo respuesta."
-        
-        # extract source documents from the response
-        # these are the documents that were retrieved and used to generate the answer
-        source_documents = response.get("source_documents", []) if isinstance(response, dict) else []
-        sources = []
-        for doc in source_documents:
-            metadata = doc.metadata or {}
-            sources.append(
-                SourceDocument(
-                    source=metadata.get("source", "desconocido"),
-                    page_start=metadata.get("page_start"),
-                    page_end=metadata.get("page_end"),
-                )
+            # validate and convert prompt_type string to PromptType enum
+            prompt_type = _resolve_prompt_type(request.prompt_type)
+
+            # admit first: even the answer cache lookup embeds the question
+            async with _admission(limiter, outcome):
+                # paraphrases of an already answered stateless question skip the LLM entirely
+                cache_lookup = await _lookup_answer_cache(request, prompt_type)
+                if cache_lookup.cached is not None:
+                    outcome.value = "cached"
+                    return QuestionResponse(
+                        answer=cache_lookup.cached.answer,
+                        sources=_extract_sources(cache_lookup.cached.source_documents),
+                        conversation_id=request.conversation_id,
+                    )
+
+                # build the appropriate QA chain based on memory preference
+                qa_chain, chain_input = _build_qa_chain(request, retriever, settings, prompt_type)
+
+                # invoke the chain asynchronously so the event loop keeps serving other requests
+                # this triggers: retrieval -> prompt construction -> LLM generation
+                with stage_timer("ask", "chain"):
+                    response = await qa_chain.ainvoke(chain_input)
+
+            answer = _extract_answer(qa_chain, response)
+            _record_tokens(request.question, answer)
+
+            # extract source documents from the response
+            # these are the documents that were retrieved and used to generate the answer
+            source_documents = response.get("source_documents", []) if isinstance(response, dict) else []
+            cache_lookup.store(request.question, prompt_type, answer, source_documents)
+
+            outcome.value = "answered"
+            return QuestionResponse(
+                answer=answer,
+                sources=_extract_sources(source_documents),
+                conversation_id=request.conversation_id,
+                context=_context_stats(source_documents),
             )
-        
-        return QuestionResponse(
-            answer=answer,
-            sources=sources,
-            conversation_id=request.conversation_id,
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing question: {str(e)}")
+        except AdmissionRejected:
+            # answered with 503 and Retry-After by the application's exception handler
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error processing question: {str(e)}")
+
+
+def _format_sse(event: str, data: Any) -> str:
+    """Format a Server-Sent Events message with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/ask/stream", dependencies=[Depends(limit_qa_rate)])
+async def ask_question_stream(
+    request: QuestionRequest,
+    retriever: Annotated[Any, Depends(get_retriever_dep)],
+    limiter: Annotated[ConcurrencyLimiter, Depends(get_qa_limiter)],
+    settings: Annotated[Settings, Depends(get_settings)] = None,
+):
+    """
+    Ask a question and stream the answer with Server-Sent Events.
+
+    Events, in order:
+        sources: list of SourceDocument retrieved for the question
+        token: {"text": ...} for every chunk generated by the LLM
+        end: {"conversation_id": ..., "context": ContextStats} once the answer is complete
+        error: {"detail": ...} if the pipeline fails mid-stream
+
+    Args:
+        request: Question request with question text and optional memory flag
+        retriever: Retriever dependency (injected by FastAPI)
+        limiter: Limiter bounding concurrent QA pipeline runs
+        settings: Application settings
+
+    Returns:
+        text/event-stream response
+
+    Admission happens before the response starts, so a rejected question
+    still gets a 503 (or 429) with Retry-After instead of an event stream.
+    """
+    from app.rag.llm_chain import astream_answer
+    from app.rag.memory import get_memory
+
+    prompt_type = _resolve_prompt_type(request.prompt_type)
+
+    async def event_stream() -> AsyncIterator[str]:
+        with _track_request("ask_stream") as outcome:
+            async with _admission(limiter, outcome):
+                try:
+                    cache_lookup = await _lookup_answer_cache(request, prompt_type)
+                    if cache_lookup.cached is not None:
+                        # replay the cached answer as a single token
+                        cached = cache_lookup.cached
+                        yield _format_sse(
+                            "sources",
+                            [source.model_dump() for source in _extract_sources(cached.source_documents)],
+                        )
+                        yield _format_sse("token", {"text": cached.answer})
+                        yield _format_sse("end", {"conversation_id": request.conversation_id})
+                        outcome.value = "cached"
+                        return
+
+                    source_documents: list = []
+                    async for event, payload in astream_answer(
+                        retriever=retriever,
+                        question=request.question,
+                        memory=get_memory(request.conversation_id) if request.use_memory else None,
+                        use_memory=request.use_memory,
+                        settings=settings,
+                        prompt_type=prompt_type,
+                    ):
+                        if event == "sources":
+                            source_documents = payload
+                            data = [source.model_dump() for source in _extract_sources(payload)]
+                        elif event == "token":
+                            data = {"text": payload}
+                        else:
+                            _record_tokens(request.question, payload)
+                            cache_lookup.store(request.question, prompt_type, payload or NO_ANSWER_MESSAGE, source_documents)
+                            # the answer was already streamed token by token
+                            context = _context_stats(source_documents)
+                            data = {
+                                "conversation_id": request.conversation_id,
+                                "context": context.model_dump() if context is not None else None,
+                            }
+                            outcome.value = "answered"
+                        yield _format_sse(event, data)
+                except Exception as e:
+                    # headers are already sent, so report the failure as an event
+                    LOGGER.error("Error durante el streaming de la respuesta: %s", e, exc_info=True)
+                    yield _format_sse("error", {"detail": f"Error processing question: {str(e)}"})
+
+    # wait for the first event so admission rejections are raised before the headers are sent
+    events = event_stream()
+    first_event = await events.__anext__()
+
+    async def admitted_stream() -> AsyncIterator[str]:
+        yield first_event
+        async for event in events:
+            yield event
+
+    return StreamingResponse(
+        admitted_stream(),
+        media_type="text/event-stream",
+        # disable proxy buffering so tokens reach the client as soon as they are produced
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _retrieve_batch(retriever: Any, questions: List[str], embeddings: List[List[float]]) -> List[list]:
+    """Retrieve the documents of several questions, in one collection query if supported."""
+    if hasattr(retriever, "aretrieve_many"):
+        return await retriever.aretrieve_many(questions, embeddings)
+    return list(await asyncio.gather(*(retriever.ainvoke(question) for question in questions)))
+
+
+@router.post("/ask/batch", response_model=BatchQuestionResponse)
+async def ask_batch(
+    request: BatchQuestionRequest,
+    http_request: Request,
+    retriever: Annotated[Any, Depends(get_retriever_dep)],
+    limiter: Annotated[ConcurrencyLimiter, Depends(get_qa_limiter)],
+    settings: Annotated[Settings, Depends(get_settings)] = None,
+):
+    """
+    Answer several stateless questions in one request.
+
+    The questions are embedded in a single forward pass, looked up in the
+    answer cache and retrieved with a single multi-query collection request,
+    all while holding one batch-priority slot of the QA limiter, so the batch
+    is rejected with a 503 before that work when the queue is full.
+    The LLM calls then run concurrently, at most max_concurrency at a time
+    (each also holding a slot of the QA limiter, queued behind interactive
+    /ask requests). Results keep the request order; a failed question
+    reports its error without failing the batch. Every question is charged
+    to the client's rate limit.
+
+    Args:
+        request: Questions and the prompt type used for all of them
+        http_request: Incoming HTTP request (identifies the client)
+        retriever: Retriever dependency (injected by FastAPI)
+        limiter: Limiter bounding concurrent QA pipeline runs
+        settings: Application settings
+
+    Returns:
+        One answer or error per question
+    """
+    with _track_request("ask_batch") as outcome:
+        try:
+            get_qa_rate_limiter().check(get_client_id(http_request), cost=len(request.questions))
+        except AdmissionRejected:
+            outcome.value = "rejected"
+            raise
+        prompt_type = _resolve_prompt_type(request.prompt_type)
+        questions = request.questions
+        results = [BatchAnswer(index=index, question=question) for index, question in enumerate(questions)]
+
+        # the embedding and retrieval pass holds one batch slot, so bursts of batches queue (or get a 503)
+        async with _admission(limiter, outcome, BATCH):
+            try:
+                with stage_timer("ask_batch", "embed"):
+                    # read the generation first so answers computed during a re-index are not stored
+                    generation = get_collection_generation()
+                    embeddings = await aembed_queries(questions)
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Error processing questions: {str(e)}")
+
+            lookups = [_AnswerCacheLookup() for _ in questions]
+            if ANSWER_CACHE_ENABLED:
+                cache = get_answer_cache()
+                for result, embedding, lookup in zip(results, embeddings, lookups):
+                    lookup.embedding, lookup.generation = embedding, generation
+                    lookup.cached = cache.lookup(embedding, prompt_type.value, result.question)
+                    if lookup.cached is not None:
+                        result.answer = lookup.cached.answer
+                        result.sources = _extract_sources(lookup.cached.source_documents)
+                        result.cached = True
+
+            pending = [result.index for result in results if not result.cached]
+            documents: dict = {}
+            if pending:
+                try:
+                    with stage_timer("ask_batch", "retrieve"):
+                        retrieved = await _retrieve_batch(
+                            retriever, [questions[i] for i in pending], [embeddings[i] for i in pending]
+                        )
+                    documents = {index: pack_documents(docs) for index, docs in zip(pending, retrieved)}
+                except Exception as e:
+                    LOGGER.error("Error en la recuperación del lote: %s", e, exc_info=True)
+                    for index in pending:
+                        results[index].error = f"Error retrieving documents: {str(e)}"
+
+        # per-batch bound, so one large batch cannot take every QA limiter slot
+        concurrency = min(request.max_concurrency or BATCH_ASK_MAX_CONCURRENCY, BATCH_ASK_MAX_CONCURRENCY)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def answer(index: int) -> None:
+            result, source_documents = results[index], documents[index]
+            try:
+                async with semaphore, limiter.acquire(BATCH):
+                    text = await agenerate_answer(
+                        result.question, source_documents, settings=settings, prompt_type=prompt_type
+                    )
+            except Exception as e:
+                result.error = f"Error processing question: {str(e)}"
+                return
+            result.answer = text or NO_ANSWER_MESSAGE
+            result.sources = _extract_sources(source_documents)
+            result.context = _context_stats(source_documents)
+            _record_tokens(result.question, result.answer)
+            lookups[index].store(result.question, prompt_type, result.answer, source_documents)
+
+        with stage_timer("ask_batch", "generate"):
+            await asyncio.gather(*(answer(index) for index in documents))
 
+        cached = sum(result.cached for result in results)
+        failed = sum(result.error is not None for result in results)
+        counts = {"cached": cached, "answered": len(results) - cached - failed, "error": failed}
+        for label, count in counts.items():
+            get_metrics_registry().counter(
+                "batch_questions_total", "Questions received by /ask/batch", result=label
+            ).inc(count)
+        outcome.value = "answered" if not failed else "error"
+        return BatchQuestionResponse(results=results, answered=len(results) - failed, failed=failed)
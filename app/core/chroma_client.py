@@ -0,0 +1,205 @@
+"""ChromaDB client wrappers adding retries, timeouts and a circuit breaker."""
+import asyncio
+import functools
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable
+
+from .constants import (
+    CHROMA_BREAKER_FAILURES,
+    CHROMA_BREAKER_RESET_SECONDS,
+    CHROMA_CONNECT_TIMEOUT,
+    CHROMA_POOL_KEEPALIVE_SECONDS,
+    CHROMA_POOL_MAX_CONNECTIONS,
+    CHROMA_READ_TIMEOUT,
+    CHROMA_RETRY_ATTEMPTS,
+    CHROMA_RETRY_BASE_DELAY,
+    CHROMA_RETRY_MAX_DELAY,
+)
+from .logger import get_logger
+from .resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    acall_with_retry,
+    call_with_retry,
+    get_circuit_breaker,
+    is_transient_error,
+)
+
+LOGGER = get_logger(__name__)
+
+# client and collection methods safe to repeat, so they are retried
+CLIENT_IDEMPOTENT = frozenset({
+    "heartbeat", "get_version", "get_collection", "get_or_create_collection",
+    "list_collections", "count_collections", "get_max_batch_size",
+})
+COLLECTION_IDEMPOTENT = frozenset({"count", "get", "query", "peek", "upsert", "delete"})
+# client methods returning a collection handle, which is wrapped too
+COLLECTION_FACTORIES = frozenset({"get_collection", "get_or_create_collection", "create_collection"})
+
+
+def chroma_breaker() -> CircuitBreaker:
+    """Return the circuit breaker shared by every ChromaDB client of the process."""
+    return get_circuit_breaker("chroma", CHROMA_BREAKER_FAILURES, CHROMA_BREAKER_RESET_SECONDS)
+
+
+def retrying(function: Callable[[], Any], idempotent: bool) -> Any:
+    """Run a ChromaDB call through the breaker, retrying it if it is idempotent."""
+    return call_with_retry(
+        function,
+        breaker=chroma_breaker(),
+        attempts=CHROMA_RETRY_ATTEMPTS if idempotent else 1,
+        base_delay=CHROMA_RETRY_BASE_DELAY,
+        max_delay=CHROMA_RETRY_MAX_DELAY,
+    )
+
+
+def is_missing_collection_error(exc: BaseException) -> bool:
+    """Whether ChromaDB reported that a collection does not exist (e.g. /ingest recreated it)."""
+    if isinstance(exc, CircuitOpenError) or is_transient_error(exc):
+        return False
+    name = type(exc).__name__
+    return "NotFound" in name or "InvalidCollection" in name or "does not exist" in str(exc)
+
+
+def client_settings(chromadb: Any) -> Any:
+    """
+    Build chromadb Settings with the keep-alive pool limits.
+
+    Only fields known to the installed chromadb version are set, so older
+    versions keep their defaults instead of failing validation.
+    """
+    desired = {
+        "chroma_http_keepalive_secs": CHROMA_POOL_KEEPALIVE_SECONDS,
+        "chroma_http_max_connections": CHROMA_POOL_MAX_CONNECTIONS,
+        "chroma_http_max_keepalive_connections": CHROMA_POOL_MAX_CONNECTIONS,
+    }
+    settings_class = chromadb.config.Settings
+    fields = getattr(settings_class, "model_fields", None) or getattr(settings_class, "__fields__", {})
+    return settings_class(**{key: value for key, value in desired.items() if key in fields})
+
+
+def apply_timeouts(client: Any) -> None:
+    """Set connect/read timeouts on the client's HTTP session (chromadb leaves them unbounded)."""
+    try:
+        import httpx
+    except ImportError:
+        return
+    session = getattr(getattr(client, "_server", None), "_session", None)
+    if isinstance(session, httpx.Client):
+        session.timeout = httpx.Timeout(CHROMA_READ_TIMEOUT, connect=CHROMA_CONNECT_TIMEOUT)
+    else:
+        LOGGER.debug("Sesión HTTP de Chroma no encontrada: se mantienen sus timeouts por defecto")
+
+
+def bounded(function: Callable[[], Any], timeout: float, name: str = "chroma-connect") -> Any:
+    """
+    Run a blocking chromadb call with a deadline.
+
+    The HttpClient constructor already talks to the server over a session
+    without timeouts and accepts none, so it runs in a daemon thread and a
+    TimeoutError is raised once the deadline passes; a late client is dropped.
+    """
+    future: Future = Future()
+
+    def run() -> None:
+        try:
+            future.set_result(function())
+        except BaseException as exc:
+            future.set_exception(exc)
+
+    threading.Thread(target=run, name=name, daemon=True).start()
+    try:
+        return future.result(timeout)
+    except FutureTimeoutError as exc:
+        raise TimeoutError(f"ChromaDB no respondió en {timeout:g}s al crear el cliente") from exc
+
+
+class ResilientCollection:
+    """Collection proxy: idempotent calls are retried, every call goes through the circuit breaker."""
+
+    def __init__(self, collection: Any):
+        self._collection = collection
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._collection, name)
+        if not callable(attribute):
+            return attribute
+
+        @functools.wraps(attribute)
+        def call(*args: Any, **kwargs: Any) -> Any:
+            return retrying(lambda: attribute(*args, **kwargs), idempotent=name in COLLECTION_IDEMPOTENT)
+
+        return call
+
+
+class ResilientClient:
+    """
+    ChromaDB HTTP client proxy shared by every caller with the same settings.
+
+    Idempotent calls (reads, upserts, deletes by id) are retried with jittered
+    exponential backoff on transport errors; the rest are attempted once.
+    All calls count toward the shared circuit breaker, which rejects them at
+    once while ChromaDB is down.
+    """
+
+    def __init__(self, client: Any):
+        self._client = client
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._client, name)
+        if not callable(attribute):
+            return attribute
+
+        @functools.wraps(attribute)
+        def call(*args: Any, **kwargs: Any) -> Any:
+            result = retrying(lambda: attribute(*args, **kwargs), idempotent=name in CLIENT_IDEMPOTENT)
+            return ResilientCollection(result) if name in COLLECTION_FACTORIES else result
+
+        return call
+
+
+async def aretrying(function: Callable[[], Any], idempotent: bool) -> Any:
+    """Async variant of retrying; each attempt is bounded by CHROMA_READ_TIMEOUT."""
+    return await acall_with_retry(
+        lambda: asyncio.wait_for(function(), CHROMA_READ_TIMEOUT),
+        breaker=chroma_breaker(),
+        attempts=CHROMA_RETRY_ATTEMPTS if idempotent else 1,
+        base_delay=CHROMA_RETRY_BASE_DELAY,
+        max_delay=CHROMA_RETRY_MAX_DELAY,
+    )
+
+
+class ResilientAsyncCollection:
+    """Async collection proxy with the same policy as ResilientCollection."""
+
+    def __init__(self, collection: Any):
+        self._collection = collection
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._collection, name)
+        if not callable(attribute):
+            return attribute
+
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            return await aretrying(lambda: attribute(*args, **kwargs), idempotent=name in COLLECTION_IDEMPOTENT)
+
+        return call
+
+
+class ResilientAsyncClient:
+    """Async client proxy with the same policy as ResilientClient."""
+
+    def __init__(self, client: Any):
+        self._client = client
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._client, name)
+        if not callable(attribute):
+            return attribute
+
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            result = await aretrying(lambda: attribute(*args, **kwargs), idempotent=name in CLIENT_IDEMPOTENT)
+            return ResilientAsyncCollection(result) if name in COLLECTION_FACTORIES else result
+
+        return call
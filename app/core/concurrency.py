@@ -0,0 +1,179 @@
+"""Concurrency limiting and admission control primitives for async request handlers."""
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from .logger import get_logger
+from .metrics import get_metrics_registry
+
+LOGGER = get_logger(__name__)
+
+# admission priorities (lower is served first): interactive /ask before /ask/batch items
+INTERACTIVE, BATCH = 0, 1
+
+# Retry-After bounds (seconds) suggested to rejected clients
+MIN_RETRY_AFTER, MAX_RETRY_AFTER = 1, 60
+
+_REJECTION_MESSAGES = {
+    "queue_full": "cola llena",
+    "queue_timeout": "tiempo máximo de espera en cola superado",
+    "rate_limited": "límite de peticiones del cliente superado",
+}
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is not admitted: its queue is full, it waited too long or it is over its rate limit."""
+
+    def __init__(self, name: str, reason: str, retry_after: float):
+        self.name = name
+        self.reason = reason
+        self.retry_after = int(min(MAX_RETRY_AFTER, max(MIN_RETRY_AFTER, math.ceil(retry_after))))
+        prefix = "Demasiadas peticiones" if reason == "rate_limited" else "Servidor saturado"
+        super().__init__(
+            f"{prefix} ({name}): {_REJECTION_MESSAGES.get(reason, reason)}. Reintenta en {self.retry_after}s"
+        )
+
+    @property
+    def status_code(self) -> int:
+        """429 for a client over its rate limit, 503 when the server is saturated."""
+        return 429 if self.reason == "rate_limited" else 503
+
+
+def record_rejection(name: str, reason: str) -> None:
+    """Count a rejected request in /metrics."""
+    get_metrics_registry().counter(
+        "admission_rejected_total", "Requests rejected by admission control", queue=name, reason=reason
+    ).inc()
+
+
+class ConcurrencyLimiter:
+    """
+    Bound the number of coroutines running a section at once.
+
+    Callers beyond the limit wait in a queue ordered by priority, then
+    arrival. With max_queue the queue is bounded and further callers are
+    rejected at once; with max_wait a caller still queued after that many
+    seconds is rejected. Rejections raise AdmissionRejected with a
+    Retry-After estimated from the recent time slots are held. Counters of
+    in-flight, waiting and rejected callers are reported by the health
+    endpoint.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        name: str = "default",
+        max_queue: Optional[int] = None,
+        max_wait: Optional[float] = None,
+    ):
+        if limit < 1:
+            raise ValueError(f"El límite de concurrencia debe ser >= 1 (recibido {limit})")
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        # (priority, arrival, future) of queued callers; abandoned entries are skipped on release
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._arrivals = itertools.count()
+        self._hold_seconds: Optional[float] = None  # moving average of slot hold times
+        self._queue_wait = get_metrics_registry().histogram(
+            "admission_queue_wait_seconds", "Time requests waited for an admission slot", queue=name
+        )
+        # counters are only touched from the event loop, so no lock is needed
+        self.in_flight = 0
+        self.waiting = 0
+        self.peak_in_flight = 0
+        self.completed = 0
+        self.rejected: Dict[str, int] = {}
+
+    @asynccontextmanager
+    async def acquire(self, priority: int = INTERACTIVE) -> AsyncIterator[None]:
+        """Wait for a free slot and hold it for the duration of the block."""
+        await self.admit(priority)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - started)
+
+    async def admit(self, priority: int = INTERACTIVE) -> None:
+        """
+        Take a slot, waiting in the queue if none is free.
+
+        Raises:
+            AdmissionRejected: If the queue is full or the wait exceeds max_wait
+        """
+        if self.in_flight < self.limit and not self.waiting:
+            self._take()
+            self._queue_wait.observe(0.0)
+            return
+        if self.max_queue is not None and self.waiting >= self.max_queue:
+            raise self._reject("queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._arrivals), future))
+        self.waiting += 1
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+        except asyncio.TimeoutError:
+            # a slot handed over just as the wait expired is kept
+            if not future.done():
+                future.cancel()
+                raise self._reject("queue_timeout") from None
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # the slot was already handed over: pass it on
+                self._hand_off()
+            else:
+                future.cancel()
+            raise
+        finally:
+            self.waiting -= 1
+        self._queue_wait.observe(time.perf_counter() - started)
+
+    def release(self, held_seconds: float = 0.0) -> None:
+        """Give back a slot taken by admit()."""
+        self.completed += 1
+        previous = self._hold_seconds
+        self._hold_seconds = held_seconds if previous is None else 0.9 * previous + 0.1 * held_seconds
+        self._hand_off()
+
+    def _take(self) -> None:
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def _hand_off(self) -> None:
+        """Pass the slot to the first live waiter, or free it."""
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        record_rejection(self.name, reason)
+        # time for the queue ahead of a new caller to drain through the slots
+        hold = self._hold_seconds if self._hold_seconds is not None else 1.0
+        retry_after = hold * (self.waiting + 1) / self.limit
+        LOGGER.warning("Petición rechazada por '%s' (%s), %s en cola", self.name, reason, self.waiting)
+        return AdmissionRejected(self.name, reason, retry_after)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the current limiter counters."""
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "peak_in_flight": self.peak_in_flight,
+            "completed": self.completed,
+            "max_queue": self.max_queue,
+            "max_wait_seconds": self.max_wait,
+            "rejected": dict(self.rejected),
+        }
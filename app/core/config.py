@@ -1,11 +1,24 @@
 """Configuration management using environment variables."""
+import asyncio
 import os
+import threading
 from dataclasses import dataclass
-from typing import Optional
+from functools import lru_cache
+from typing import Any, Dict, Optional
 
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
 
+from .chroma_client import (
+    ResilientAsyncClient,
+    ResilientClient,
+    apply_timeouts,
+    aretrying,
+    bounded,
+    client_settings,
+    retrying,
+)
+from .constants import CHROMA_CONNECT_TIMEOUT, CHROMA_READ_TIMEOUT
 from .logger import get_logger
 
 LOGGER = get_logger(__name__)
@@ -22,6 +35,8 @@ class Settings:
     chroma_ssl: bool  # whether to use SSL for ChromaDB connection
     chroma_collection: str  # name of the ChromaDB collection
     chroma_api_key: Optional[str]  # API key for ChromaDB (if required)
+    qa_max_concurrency: int = 32  # max /ask requests running the QA pipeline at once
+    vector_backend: str = "chroma"  # vector store backend: "chroma" (HTTP server) or "local" (in-process index)
 
 
 def load_settings() -> Settings:
@@ -52,34 +67,157 @@ def load_settings() -> Settings:
         chroma_ssl=chroma_ssl,
         chroma_collection=os.getenv("CHROMA_COLLECTION", "medical_guides"),
         chroma_api_key=os.getenv("CHROMA_API_KEY"),
+        qa_max_concurrency=int(os.getenv("QA_MAX_CONCURRENCY", "32")),
+        vector_backend=os.getenv("VECTOR_BACKEND", "chroma").lower(),
     )
     return settings
 
 
-def get_chroma_client(settings: Optional[Settings] = None):
-    """Create and return a ChromaDB HTTP client."""
-    # load settings if not provided
-    settings = settings or load_settings()
-    
-    # check if chromadb is installed
+# cache settings to avoid re-reading .env on every call
+# lru_cache ensures settings are only loaded once per process
+@lru_cache()
+def get_settings() -> Settings:
+    """Get application settings (cached)."""
+    return load_settings()
+
+
+# shared ChromaDB clients by (host, port, ssl, api key)
+_chroma_clients: Dict[tuple, Any] = {}
+# guards the dicts only; it is never held while a client is being created
+_chroma_clients_lock = threading.Lock()
+# one creation lock per server, so a slow server only blocks the callers waiting for that client
+_chroma_creation_locks: Dict[tuple, threading.Lock] = {}
+# shared async ChromaDB clients by (event loop id, server): an async client only works on its own loop
+_async_chroma_clients: Dict[tuple, Any] = {}
+_async_chroma_locks: Dict[tuple, asyncio.Lock] = {}
+
+
+def _import_chromadb():
+    """Import chromadb with a helpful error if it is missing."""
     try:
         import chromadb
     except ImportError as exc:
         raise ImportError(
             "chromadb no está instalado. Ejecutar `pip install chromadb`."
         ) from exc
+    return chromadb
 
-    # prepare headers if API key is configured
-    headers = None
+
+def _chroma_headers(settings: Settings) -> Optional[dict]:
+    """Build auth headers for ChromaDB if an API key is configured."""
     if settings.chroma_api_key:
-        headers = {"Authorization": f"Bearer {settings.chroma_api_key}"}
-
-    # create HTTP client connection to ChromaDB server
-    client = chromadb.HttpClient(
-        host=settings.chroma_host,
-        port=settings.chroma_port,
-        ssl=settings.chroma_ssl,
-        headers=headers,
+        return {"Authorization": f"Bearer {settings.chroma_api_key}"}
+    return None
+
+
+def get_chroma_client(settings: Optional[Settings] = None):
+    """
+    Return the shared ChromaDB HTTP client for the configured server.
+
+    One client (and so one keep-alive connection pool) is created per server
+    and reused by every caller; it retries reads on transport errors and
+    fails fast through a circuit breaker while ChromaDB is down.
+    """
+    # load settings if not provided
+    settings = settings or load_settings()
+    key = _chroma_key(settings)
+    with _chroma_clients_lock:
+        client = _chroma_clients.get(key)
+        if client is not None:
+            return client
+        creation_lock = _chroma_creation_locks.setdefault(key, threading.Lock())
+
+    # a single thread per server creates the client, the others wait for it
+    with creation_lock:
+        with _chroma_clients_lock:
+            client = _chroma_clients.get(key)
+        if client is not None:
+            return client
+        client = _create_chroma_client(settings)
+        with _chroma_clients_lock:
+            return _chroma_clients.setdefault(key, client)
+
+
+def _chroma_key(settings: Settings) -> tuple:
+    return (settings.chroma_host, settings.chroma_port, settings.chroma_ssl, settings.chroma_api_key)
+
+
+def _create_chroma_client(settings: Settings):
+    """Create a ChromaDB HTTP client wrapped with retries and the circuit breaker."""
+    # check if chromadb is installed
+    chromadb = _import_chromadb()
+
+    # the constructor already talks to the server (tenant/database checks) and takes no timeout,
+    # so each attempt gets a deadline; the session timeouts apply to every later call
+    client = retrying(
+        lambda: bounded(
+            lambda: chromadb.HttpClient(
+                host=settings.chroma_host,
+                port=settings.chroma_port,
+                ssl=settings.chroma_ssl,
+                headers=_chroma_headers(settings),
+                settings=client_settings(chromadb),
+            ),
+            CHROMA_CONNECT_TIMEOUT + CHROMA_READ_TIMEOUT,
+        ),
+        idempotent=True,
     )
-    return client
+    apply_timeouts(client)
+    return ResilientClient(client)
+
+
+async def get_async_chroma_client(settings: Optional[Settings] = None):
+    """
+    Return the shared async ChromaDB HTTP client of the running event loop.
 
+    One client is created per server and event loop and reused by every
+    caller on that loop, like get_chroma_client. Clients of closed loops are
+    dropped when a new one is created.
+    """
+    settings = settings or load_settings()
+    loop = asyncio.get_running_loop()
+    key = (id(loop),) + _chroma_key(settings)
+    with _chroma_clients_lock:
+        entry = _async_chroma_clients.get(key)
+        if entry is not None:
+            return entry[1]
+        lock = _async_chroma_locks.setdefault(key, asyncio.Lock())
+
+    # a single coroutine per loop and server creates the client, the others wait for it
+    async with lock:
+        with _chroma_clients_lock:
+            entry = _async_chroma_clients.get(key)
+        if entry is not None:
+            return entry[1]
+        client = await _create_async_chroma_client(settings)
+        with _chroma_clients_lock:
+            for stale in [other for other, (other_loop, _) in _async_chroma_clients.items() if other_loop.is_closed()]:
+                del _async_chroma_clients[stale]
+                _async_chroma_locks.pop(stale, None)
+            # the loop is kept with its client so its id is not reused while the entry exists
+            _async_chroma_clients[key] = (loop, client)
+        return client
+
+
+async def _create_async_chroma_client(settings: Settings):
+    """Create an async ChromaDB HTTP client wrapped with retries and the circuit breaker."""
+    chromadb = _import_chromadb()
+
+    # AsyncHttpClient is only available in chromadb>=0.5
+    if not hasattr(chromadb, "AsyncHttpClient"):
+        raise ImportError(
+            "La versión instalada de chromadb no soporta AsyncHttpClient. "
+            "Ejecutar `pip install -U chromadb`."
+        )
+
+    client = await aretrying(
+        lambda: chromadb.AsyncHttpClient(
+            host=settings.chroma_host,
+            port=settings.chroma_port,
+            ssl=settings.chroma_ssl,
+            headers=_chroma_headers(settings),
+            settings=client_settings(chromadb),
+        ),
+        idempotent=True,
+    )
+    return ResilientAsyncClient(client)
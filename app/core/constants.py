@@ -20,6 +20,151 @@ DEFAULT_CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "900"))
 DEFAULT_CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "150"))
 MIN_PAGE_CHARACTERS = int(os.getenv("MIN_PAGE_CHARACTERS", "400"))
 
+# Parallel PDF parsing: worker processes and max pages parsed per task
+LOADER_WORKERS = int(os.getenv("LOADER_WORKERS", str(min(os.cpu_count() or 1, 8))))
+LOADER_PAGES_PER_TASK = int(os.getenv("LOADER_PAGES_PER_TASK", "50"))
+
+# Streaming ingestion: chunks embedded per call, chunks upserted per ChromaDB request
+# and batches buffered between pipeline stages (peak memory scales with these)
+INGEST_EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "64"))
+INGEST_UPSERT_BATCH_SIZE = int(os.getenv("INGEST_UPSERT_BATCH_SIZE", "256"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "4"))
+
+# Background ingestion jobs: finished jobs kept for status queries and the
+# niceness increment of job threads (keeps /ask responsive while indexing)
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "100"))
+INGEST_JOB_NICE = int(os.getenv("INGEST_JOB_NICE", "10"))
+
+# Admission control of ingestion jobs: jobs running at once, jobs waiting for a
+# slot (further /ingest requests get 503), max seconds a job waits before it is
+# dropped, and max seconds a job pauses at each file/batch boundary while /ask
+# requests are queued (interactive traffic first)
+INGEST_MAX_RUNNING_JOBS = int(os.getenv("INGEST_MAX_RUNNING_JOBS", "1"))
+INGEST_MAX_QUEUED_JOBS = int(os.getenv("INGEST_MAX_QUEUED_JOBS", "2"))
+INGEST_MAX_QUEUE_SECONDS = float(os.getenv("INGEST_MAX_QUEUE_SECONDS", "600"))
+INGEST_YIELD_MAX_SECONDS = float(os.getenv("INGEST_YIELD_MAX_SECONDS", "2"))
+
+# Conversational memory limits (per conversation_id)
+MEMORY_MAX_SESSIONS = int(os.getenv("MEMORY_MAX_SESSIONS", "1000"))
+MEMORY_SESSION_TTL_SECONDS = int(os.getenv("MEMORY_SESSION_TTL_SECONDS", "3600"))
+MEMORY_MAX_TURNS = int(os.getenv("MEMORY_MAX_TURNS", "10"))
+MEMORY_MAX_TOKENS = int(os.getenv("MEMORY_MAX_TOKENS", "2000"))
+
+# Embedding backend: "torch" (sentence-transformers), "onnx" (ONNX Runtime fp32)
+# or "onnx-int8" (dynamically quantized); ONNX exports are stored under EMBEDDING_ONNX_DIR
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_ONNX_DIR = CACHE_DIR / "onnx"
+EMBEDDING_ONNX_THREADS = int(os.getenv("EMBEDDING_ONNX_THREADS", "0"))  # 0 lets ONNX Runtime decide
+
+# On-disk cache of chunk embeddings, keyed by chunk text and embedding model
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() in {"1", "true", "yes", "on"}
+EMBEDDING_CACHE_DIR = CACHE_DIR / "embeddings"
+
+# Query embedding memo shared by the answer cache and the retriever
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "256"))
+
+# Micro-batching of concurrent query embeddings: max queries per model call and
+# how long the first query waits for others to join its batch
+QUERY_BATCHING_ENABLED = os.getenv("QUERY_BATCHING_ENABLED", "true").lower() in {"1", "true", "yes", "on"}
+QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", "32"))
+QUERY_BATCH_MAX_WAIT_MS = float(os.getenv("QUERY_BATCH_MAX_WAIT_MS", "5"))
+
+# Semantic answer cache for stateless questions (use_memory=false). Off by default: a hit
+# skips the LLM, so a wrong match returns another question's answer
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "false").lower() in {"1", "true", "yes", "on"}
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+
+# Retrieval result cache: LRU of retrieved chunks by normalized question and search
+# parameters, bounded by entries and approximate size, cleared when /ingest changes the collection
+RETRIEVAL_CACHE_ENABLED = os.getenv("RETRIEVAL_CACHE_ENABLED", "true").lower() in {"1", "true", "yes", "on"}
+RETRIEVAL_CACHE_MAX_ENTRIES = int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "2048"))
+RETRIEVAL_CACHE_MAX_MB = float(os.getenv("RETRIEVAL_CACHE_MAX_MB", "64"))
+
+# In-process vector index (VECTOR_BACKEND=local): one directory per collection.
+# Collections with at least VECTOR_INDEX_IVF_MIN_ROWS vectors get an IVF index
+# (0 lists = sqrt of the row count) searched over VECTOR_INDEX_IVF_NPROBE lists
+VECTOR_INDEX_DIR = DATA_DIR / "vector_index"
+VECTOR_INDEX_IVF_MIN_ROWS = int(os.getenv("VECTOR_INDEX_IVF_MIN_ROWS", "50000"))
+VECTOR_INDEX_IVF_NLIST = int(os.getenv("VECTOR_INDEX_IVF_NLIST", "0"))
+VECTOR_INDEX_IVF_NPROBE = int(os.getenv("VECTOR_INDEX_IVF_NPROBE", "16"))
+
+# Hybrid retrieval: BM25 index built by /ingest (one file per collection), fused
+# with dense results by reciprocal-rank fusion (score = sum of 1 / (HYBRID_RRF_K + rank))
+LEXICAL_INDEX_DIR = CACHE_DIR / "lexical"
+HYBRID_SEARCH_ENABLED = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() in {"1", "true", "yes", "on"}
+HYBRID_LEXICAL_K = int(os.getenv("HYBRID_LEXICAL_K", "20"))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+
+# Context packing: max tokens of retrieved text stuffed into the prompt (0 = unbounded)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2500"))
+
+# Condense-question step of conversational requests: skipped for questions the local
+# follow-up detector finds self-contained (no pronouns, connective or ellipsis, longer
+# than FOLLOWUP_SHORT_QUESTION_WORDS words and with an embedding cosine below
+# FOLLOWUP_SIMILARITY_THRESHOLD to the previous question); the rest are rewritten by
+# CONDENSE_MODEL_NAME and cached
+CONDENSE_SKIP_ENABLED = os.getenv("CONDENSE_SKIP_ENABLED", "true").lower() in {"1", "true", "yes", "on"}
+CONDENSE_MODEL_NAME = os.getenv("CONDENSE_MODEL_NAME", "gemini-2.0-flash-lite")
+CONDENSE_CACHE_MAX_ENTRIES = int(os.getenv("CONDENSE_CACHE_MAX_ENTRIES", "1024"))
+FOLLOWUP_SHORT_QUESTION_WORDS = int(os.getenv("FOLLOWUP_SHORT_QUESTION_WORDS", "4"))
+FOLLOWUP_SIMILARITY_THRESHOLD = float(os.getenv("FOLLOWUP_SIMILARITY_THRESHOLD", "0.5"))
+
+# Batch endpoint (/ask/batch): max questions per request and LLM calls in flight per batch
+BATCH_ASK_MAX_QUESTIONS = int(os.getenv("BATCH_ASK_MAX_QUESTIONS", "64"))
+BATCH_ASK_MAX_CONCURRENCY = int(os.getenv("BATCH_ASK_MAX_CONCURRENCY", "8"))
+
+# ChromaDB HTTP client: timeouts (seconds), keep-alive connection pool, retries of
+# idempotent calls (jittered exponential backoff) and the circuit breaker that
+# fails fast after CHROMA_BREAKER_FAILURES consecutive failed calls (after retries)
+CHROMA_CONNECT_TIMEOUT = float(os.getenv("CHROMA_CONNECT_TIMEOUT", "5"))
+CHROMA_READ_TIMEOUT = float(os.getenv("CHROMA_READ_TIMEOUT", "30"))
+CHROMA_POOL_MAX_CONNECTIONS = int(os.getenv("CHROMA_POOL_MAX_CONNECTIONS", "64"))
+CHROMA_POOL_KEEPALIVE_SECONDS = float(os.getenv("CHROMA_POOL_KEEPALIVE_SECONDS", "60"))
+CHROMA_RETRY_ATTEMPTS = int(os.getenv("CHROMA_RETRY_ATTEMPTS", "3"))
+CHROMA_RETRY_BASE_DELAY = float(os.getenv("CHROMA_RETRY_BASE_DELAY", "0.1"))
+CHROMA_RETRY_MAX_DELAY = float(os.getenv("CHROMA_RETRY_MAX_DELAY", "2"))
+CHROMA_BREAKER_FAILURES = int(os.getenv("CHROMA_BREAKER_FAILURES", "5"))
+CHROMA_BREAKER_RESET_SECONDS = float(os.getenv("CHROMA_BREAKER_RESET_SECONDS", "30"))
+
+# LLM calls: deadline per attempt (seconds), bounded retries of transient errors
+# (deadlines, 5xx, 429) with jittered backoff, a circuit breaker per model and a
+# faster fallback model used once the primary model's attempts are spent ("" disables it).
+# Hedging sends a second identical request when an attempt outlives the model's recent
+# LLM_HEDGE_PERCENTILE latency (never before LLM_HEDGE_MIN_DELAY); it trims the slow
+# tail at the cost of duplicate tokens, so it is off by default
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+LLM_RETRY_ATTEMPTS = int(os.getenv("LLM_RETRY_ATTEMPTS", "2"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "4"))
+LLM_FALLBACK_MODEL_NAME = os.getenv("LLM_FALLBACK_MODEL_NAME", "gemini-2.0-flash-lite")
+LLM_HEDGING_ENABLED = os.getenv("LLM_HEDGING_ENABLED", "false").lower() in {"1", "true", "yes", "on"}
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+# Admission control of the QA pipeline: requests beyond QA_MAX_CONCURRENCY wait in a
+# queue of at most QA_MAX_QUEUE (interactive /ask before /ask/batch items) for at most
+# QA_MAX_QUEUE_SECONDS; beyond either they get 503 with Retry-After (0 = unbounded)
+QA_MAX_QUEUE = int(os.getenv("QA_MAX_QUEUE", "64"))
+QA_MAX_QUEUE_SECONDS = float(os.getenv("QA_MAX_QUEUE_SECONDS", "10"))
+
+# Per-client token buckets (requests per second and burst; rate 0 disables them).
+# /ask/batch is charged one token per question. Clients are identified by
+# RATE_LIMIT_CLIENT_HEADER when set (e.g. X-Forwarded-For behind a trusted proxy),
+# otherwise by the peer address
+QA_RATE_LIMIT_PER_SECOND = float(os.getenv("QA_RATE_LIMIT_PER_SECOND", "5"))
+QA_RATE_LIMIT_BURST = float(os.getenv("QA_RATE_LIMIT_BURST", "20"))
+INGEST_RATE_LIMIT_PER_SECOND = float(os.getenv("INGEST_RATE_LIMIT_PER_SECOND", "0.1"))
+INGEST_RATE_LIMIT_BURST = float(os.getenv("INGEST_RATE_LIMIT_BURST", "2"))
+RATE_LIMIT_CLIENT_HEADER = os.getenv("RATE_LIMIT_CLIENT_HEADER", "")
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000"))
+
+# Startup warmup: also send a one-line prompt to the LLM (costs a few tokens per start)
+WARMUP_LLM_ENABLED = os.getenv("WARMUP_LLM_ENABLED", "true").lower() in {"1", "true", "yes", "on"}
+
 # Header patterns for cleaning
 HEADER_PATTERNS = [
     r"^GUÍA.*",
@@ -0,0 +1,279 @@
+"""In-process metrics primitives and their Prometheus text export."""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# default buckets for latencies in seconds (from a cache hit to a slow LLM call)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram of observed values.
+
+    Buckets are upper bounds (an implicit +Inf bucket catches the rest) and
+    counts are cumulative, as in Prometheus, so snapshots can be exported as-is.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        buckets: Sequence[float],
+        description: str = "",
+        labels: Optional[Dict[str, str]] = None,
+    ):
+        self.name = name
+        self.description = description
+        self.labels = dict(labels or {})
+        self.buckets: List[float] = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """Record one observation."""
+        # first bucket whose upper bound is >= value (len(buckets) is +Inf)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return count, sum, mean, cumulative buckets and approximate percentiles."""
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+
+        cumulative: Dict[str, int] = {}
+        running = 0
+        for bound, bucket_count in zip(self.buckets + [math.inf], counts):
+            running += bucket_count
+            cumulative["+Inf" if bound == math.inf else f"{bound:g}"] = running
+        return {
+            "count": count,
+            "sum": round(total, 4),
+            "mean": round(total / count, 4) if count else 0.0,
+            "p50": self._quantile(counts, count, 0.5),
+            "p95": self._quantile(counts, count, 0.95),
+            "buckets": cumulative,
+        }
+
+    def _quantile(self, counts: List[int], count: int, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (the last finite bound for +Inf)."""
+        if not count:
+            return 0.0
+        target = q * count
+        running = 0
+        for index, bucket_count in enumerate(counts):
+            running += bucket_count
+            if running >= target:
+                return self.buckets[min(index, len(self.buckets) - 1)]
+        return self.buckets[-1]
+
+
+class Counter:
+    """Monotonically increasing value."""
+
+    def __init__(self, name: str, description: str = "", labels: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.description = description
+        self.labels = dict(labels or {})
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class Gauge:
+    """Value that goes up and down, such as requests in flight."""
+
+    def __init__(self, name: str, description: str = "", labels: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.description = description
+        self.labels = dict(labels or {})
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+    @contextmanager
+    def track_inprogress(self) -> Iterator[None]:
+        """Count the block as in progress while it runs."""
+        self.inc()
+        try:
+            yield
+        finally:
+            self.dec()
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+# (name, type, description, labels, value) computed by a collector at scrape time
+Sample = Tuple[str, str, str, Dict[str, str], float]
+
+
+class MetricsRegistry:
+    """
+    Process-wide set of metrics, exported in the Prometheus text format.
+
+    Metrics are created once per name and label set and reused, so hot paths
+    only pay for a lock and an addition. Values kept elsewhere (cache
+    counters, queue sizes) are read by collectors when /metrics is scraped.
+    """
+
+    def __init__(self, namespace: str = "rag"):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._metrics: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Any] = {}
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def _get_or_create(self, name: str, labels: Dict[str, str], factory: Callable[[], Any]) -> Any:
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.setdefault(key, factory())
+        return metric
+
+    def histogram(
+        self, name: str, description: str = "", buckets: Sequence[float] = LATENCY_BUCKETS, **labels: str
+    ) -> Histogram:
+        return self._get_or_create(name, labels, lambda: Histogram(name, buckets, description, labels))
+
+    def counter(self, name: str, description: str = "", **labels: str) -> Counter:
+        return self._get_or_create(name, labels, lambda: Counter(name, description, labels))
+
+    def gauge(self, name: str, description: str = "", **labels: str) -> Gauge:
+        return self._get_or_create(name, labels, lambda: Gauge(name, description, labels))
+
+    def register(self, metric: Any) -> None:
+        """Export a metric created elsewhere (e.g. a component's own histogram)."""
+        with self._lock:
+            self._metrics[(metric.name, tuple(sorted(metric.labels.items())))] = metric
+
+    def add_collector(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        """Register a function returning samples computed at scrape time."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render_prometheus(self) -> str:
+        """Return every metric in the Prometheus text exposition format (0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        families: Dict[str, Tuple[str, str, List[str]]] = {}
+
+        def family(name: str, kind: str, description: str) -> List[str]:
+            return families.setdefault(name, (kind, description, []))[2]
+
+        for metric in sorted(metrics, key=lambda item: item.name):
+            name = f"{self.namespace}_{metric.name}"
+            if isinstance(metric, Histogram):
+                snapshot = metric.snapshot()
+                lines = family(name, "histogram", metric.description)
+                for bound, count in snapshot["buckets"].items():
+                    lines.append(f"{name}_bucket{_labels(metric.labels, le=bound)} {count}")
+                lines.append(f"{name}_sum{_labels(metric.labels)} {snapshot['sum']}")
+                lines.append(f"{name}_count{_labels(metric.labels)} {snapshot['count']}")
+            else:
+                kind = "counter" if isinstance(metric, Counter) else "gauge"
+                family(name, kind, metric.description).append(
+                    f"{name}{_labels(metric.labels)} {_number(metric.value)}"
+                )
+
+        for collector in collectors:
+            for sample_name, kind, description, labels, value in collector():
+                name = f"{self.namespace}_{sample_name}"
+                family(name, kind, description).append(f"{name}{_labels(labels)} {_number(value)}")
+
+        output: List[str] = []
+        for name, (kind, description, lines) in families.items():
+            if description:
+                output.append(f"# HELP {name} {description}")
+            output.append(f"# TYPE {name} {kind}")
+            output.extend(lines)
+        return "\n".join(output) + "\n"
+
+
+def _labels(labels: Dict[str, str], **extra: str) -> str:
+    """Format a Prometheus label set ("" when empty)."""
+    items = {**labels, **extra}
+    if not items:
+        return ""
+    escaped = (
+        f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for key, value in items.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+# process-wide registry exported on /metrics
+_registry = MetricsRegistry()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """Get the process-wide metrics registry."""
+    return _registry
+
+
+def stage_histogram(pipeline: str, stage: str) -> Histogram:
+    """Return the latency histogram of one stage of a pipeline (ask or ingest)."""
+    return _registry.histogram(
+        "stage_duration_seconds",
+        "Latency of each pipeline stage",
+        pipeline=pipeline,
+        stage=stage,
+    )
+
+
+@contextmanager
+def stage_timer(pipeline: str, stage: str) -> Iterator[None]:
+    """Observe the duration of the block in the stage's histogram."""
+    histogram = stage_histogram(pipeline, stage)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started)
+
+
+def timed_iter(items: Iterable[T], histogram: Histogram) -> Iterator[T]:
+    """Yield items, observing how long producing each one took."""
+    iterator = iter(items)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        histogram.observe(time.perf_counter() - started)
+        yield item
@@ -0,0 +1,89 @@
+"""Per-client token-bucket rate limits."""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict
+
+from .concurrency import AdmissionRejected, record_rejection
+
+
+class TokenBucket:
+    """Bucket refilled at rate tokens per second, holding at most burst tokens."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, cost: float, now: float) -> float:
+        """Take cost tokens; return 0 if they were taken, else the seconds until they will be available."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class ClientRateLimiter:
+    """
+    Token bucket per client.
+
+    A client may send burst requests at once and rate requests per second
+    on average; beyond that check() raises AdmissionRejected (HTTP 429) with
+    the time until its bucket refills. Buckets of the least recently seen
+    clients are dropped beyond max_clients. rate <= 0 disables the limit.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float, max_clients: int = 10000):
+        self.name = name
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def check(self, client: str, cost: float = 1.0) -> None:
+        """
+        Charge cost tokens to a client.
+
+        Raises:
+            AdmissionRejected: If the client's bucket does not hold enough tokens
+        """
+        if not self.enabled:
+            return
+        # a request larger than the burst only needs a full bucket
+        cost = min(cost, self.burst)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = TokenBucket(self.rate, self.burst, now)
+                while len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+            wait = bucket.take(cost, now)
+            if wait > 0:
+                self.rejected += 1
+        if wait > 0:
+            record_rejection(self.name, "rate_limited")
+            raise AdmissionRejected(self.name, "rate_limited", wait)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "rate_per_second": self.rate,
+                "burst": self.burst,
+                "clients": len(self._buckets),
+                "rejected": self.rejected,
+            }
@@ -0,0 +1,322 @@
+"""Retry and circuit breaker primitives for calls to external services."""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from .logger import get_logger
+
+LOGGER = get_logger(__name__)
+
+T = TypeVar("T")
+
+# circuit breaker states, exported as gauge values
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised without calling the service while its circuit breaker is open."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(
+            f"Servicio '{name}' no disponible (circuito abierto, reintento en {retry_in:.1f}s)"
+        )
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Fail fast while a service keeps failing.
+
+    After failure_threshold consecutive failed calls (transient errors, once
+    their retries are spent) the circuit opens and calls raise
+    CircuitOpenError at once. Once reset_timeout seconds have passed one
+    trial call is let through (half-open): success closes the circuit,
+    failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0  # consecutive failures
+        self._opened_at = 0.0
+        self._trial_running = False
+        # counters reported by snapshot()
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.retries = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now: float) -> str:
+        if self._state == OPEN and now - self._opened_at >= self.reset_timeout:
+            return HALF_OPEN
+        return self._state
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError if the call must not reach the service."""
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and not self._trial_running:
+                # let a single trial call through
+                self._state = HALF_OPEN
+                self._trial_running = True
+                return
+            self.rejected += 1
+            retry_in = max(0.0, self.reset_timeout - (now - self._opened_at))
+        raise CircuitOpenError(self.name, retry_in)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.successes += 1
+            self._failures = 0
+            self._trial_running = False
+            if self._state != CLOSED:
+                LOGGER.info("Circuito '%s' cerrado: el servicio responde de nuevo", self.name)
+            self._state = CLOSED
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._failures += 1
+            trial_failed = self._state == HALF_OPEN
+            self._trial_running = False
+            if trial_failed or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self.opened += 1
+                LOGGER.warning(
+                    "Circuito '%s' abierto tras %s fallos consecutivos (%.0fs sin llamadas)",
+                    self.name, self._failures, self.reset_timeout,
+                )
+
+    def record_retry(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+    def record_ignored(self) -> None:
+        """End a call whose error says nothing about the service's health (e.g. not found)."""
+        with self._lock:
+            self._trial_running = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._current_state(time.monotonic()),
+                "consecutive_failures": self._failures,
+                "successes": self.successes,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "retries": self.retries,
+                "opened": self.opened,
+            }
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """Whether an error is worth retrying: network failures, timeouts and 5xx responses."""
+    if isinstance(exc, CircuitOpenError):
+        return False
+    if isinstance(exc, (ConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    try:
+        import httpx
+    except ImportError:
+        httpx = None
+    if httpx is not None:
+        if isinstance(exc, httpx.TransportError):
+            return True
+        if isinstance(exc, httpx.HTTPStatusError):
+            return exc.response.status_code >= 500 or exc.response.status_code == 429
+    # API clients exposing the HTTP status (e.g. google.api_core errors carry it in .code)
+    status = getattr(exc, "status_code", None) or getattr(exc, "code", None)
+    if isinstance(status, int) and (status >= 500 or status == 429):
+        return True
+    # clients that wrap transport errors in their own exception types
+    name = type(exc).__name__
+    return any(marker in name for marker in ("Timeout", "Connect", "Unavailable", "DeadlineExceeded"))
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Delay before retry number attempt (0-based): full jitter over an exponential window."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def call_with_retry(
+    function: Callable[[], T],
+    breaker: Optional[CircuitBreaker] = None,
+    attempts: int = 1,
+    base_delay: float = 0.1,
+    max_delay: float = 2.0,
+) -> T:
+    """
+    Call function, retrying transient errors up to attempts times, guarded by a breaker.
+
+    The breaker sees one call whatever the number of attempts: a failure is
+    recorded once the last attempt failed, so its threshold counts failed
+    calls rather than attempts.
+    """
+    if breaker is not None:
+        breaker.before_call()
+    try:
+        for attempt in range(max(1, attempts)):
+            try:
+                result = function()
+            except Exception as exc:
+                if not is_transient_error(exc) or attempt + 1 >= attempts:
+                    raise
+                if breaker is not None:
+                    breaker.record_retry()
+                delay = backoff_delay(attempt, base_delay, max_delay)
+                LOGGER.debug("Error transitorio (%s), reintento en %.2fs", exc, delay)
+                time.sleep(delay)
+                continue
+            if breaker is not None:
+                breaker.record_success()
+            return result
+        raise AssertionError("unreachable")
+    except BaseException as exc:
+        if breaker is not None:
+            _record_error(breaker, exc)
+        raise
+
+
+async def acall_with_retry(
+    function: Callable[[], Awaitable[T]],
+    breaker: Optional[CircuitBreaker] = None,
+    attempts: int = 1,
+    base_delay: float = 0.1,
+    max_delay: float = 2.0,
+) -> T:
+    """Async variant of call_with_retry (backoff sleeps do not block the event loop)."""
+    if breaker is not None:
+        breaker.before_call()
+    try:
+        for attempt in range(max(1, attempts)):
+            try:
+                result = await function()
+            except Exception as exc:
+                if not is_transient_error(exc) or attempt + 1 >= attempts:
+                    raise
+                if breaker is not None:
+                    breaker.record_retry()
+                delay = backoff_delay(attempt, base_delay, max_delay)
+                LOGGER.debug("Error transitorio (%s), reintento en %.2fs", exc, delay)
+                await asyncio.sleep(delay)
+                continue
+            if breaker is not None:
+                breaker.record_success()
+            return result
+        raise AssertionError("unreachable")
+    except BaseException as exc:
+        if breaker is not None:
+            _record_error(breaker, exc)
+        raise
+
+
+def _record_error(breaker: CircuitBreaker, exc: BaseException) -> None:
+    """
+    End a failed call in its breaker.
+
+    Transient errors count as failures. Anything else, including
+    cancellation, ends the call without judging the service, so a half-open
+    trial never stays pending.
+    """
+    if isinstance(exc, Exception) and is_transient_error(exc):
+        breaker.record_failure()
+    else:
+        breaker.record_ignored()
+
+
+async def ahedged(
+    function: Callable[[], Awaitable[T]],
+    hedge_after: Optional[float],
+    on_hedge: Optional[Callable[[], None]] = None,
+) -> T:
+    """
+    Await function, sending a second identical call if the first is still running after hedge_after seconds.
+
+    The first successful result wins and the other call is cancelled; if both
+    fail, the last error is raised. hedge_after=None disables hedging.
+    """
+    first = asyncio.ensure_future(function())
+    if hedge_after is None:
+        return await first
+    try:
+        done, _ = await asyncio.wait({first}, timeout=hedge_after)
+    except BaseException:
+        first.cancel()
+        raise
+    if done:
+        return first.result()
+
+    if on_hedge is not None:
+        on_hedge()
+    pending = {first, asyncio.ensure_future(function())}
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+class LatencyWindow:
+    """Latencies of the most recent successful calls, used to pick a hedging delay."""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: "deque[float]" = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Return the q-th percentile of the window (None until min_samples were observed)."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+
+# breakers by service name, reported by /health and /metrics
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str, failure_threshold: int = 5, reset_timeout: float = 30.0) -> CircuitBreaker:
+    """Get the process-wide breaker of a service, creating it on first use."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name, failure_threshold, reset_timeout)
+        return breaker
+
+
+def circuit_breakers() -> Dict[str, CircuitBreaker]:
+    """Return every breaker created so far."""
+    with _breakers_lock:
+        return dict(_breakers)
@@ -1,21 +1,51 @@
 """FastAPI application entry point."""
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
-from app.api.v1.endpoints import health, ingest, qa
-from app.core.config import load_settings
+from app.api.deps import get_qa_limiter
+from app.api.v1.endpoints import health, ingest, metrics, qa
+from app.core.concurrency import AdmissionRejected
 from app.core.logger import get_logger
-from app.rag.embeddings import get_embedding_model
-from app.rag.vectorstore import load_vectorstore
+from app.rag.ingest_jobs import get_ingest_job_manager
+from app.rag.resources import get_resource_registry
 
 LOGGER = get_logger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Warm up the shared resources on startup and release them on shutdown."""
+    LOGGER.info("RAG Medical Assistant Backend starting up")
+    resources = get_resource_registry()
+    app.state.resources = resources
+    # warm up in the background: /health answers at once and /ready reports
+    # when the embedding model, vectorstore, retriever and LLM are warm
+    # (resources that fail to warm up are loaded on demand, e.g. if ChromaDB
+    # is temporarily unavailable)
+    resources.start_warmup()
+    # ingestion pauses between batches while /ask requests wait for a QA slot
+    qa_limiter = get_qa_limiter()
+    get_ingest_job_manager().yield_to(lambda: qa_limiter.waiting > 0)
+    try:
+        yield
+    finally:
+        LOGGER.info("RAG Medical Assistant Backend shutting down")
+        # stop running ingestion jobs at their next batch
+        get_ingest_job_manager().shutdown()
+        await resources.close()
+
+
 # create the main FastAPI application instance
 # this is the entry point for all API requests
 app = FastAPI(
     title="RAG Medical Assistant API",
     description="API para asistente médico basado en RAG con LangChain y Gemini",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # configure CORS middleware to allow cross-origin requests
@@ -28,42 +58,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected) -> JSONResponse:
+    """Answer requests rejected by admission control with 503 (or 429) and Retry-After."""
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": str(exc), "reason": exc.reason},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 # register all API routers with the /api/v1 prefix
 # each router handles a specific set of endpoints
 app.include_router(health.router, prefix="/api/v1", tags=["health"])
 app.include_router(qa.router, prefix="/api/v1", tags=["qa"])
 app.include_router(ingest.router, prefix="/api/v1", tags=["ingest"])
-
-
-@app.on_event("startup")
-async def startup_event():
-    """Pre-load expensive resources on startup to avoid delays on first request."""
-    LOGGER.info("RAG Medical Assistant Backend starting up")
-    
-    try:
-        # pre-load the embedding model which can take 30-60 seconds on first run
-        # this gets cached so subsequent requests are fast
-        embedding_config = get_embedding_model()
-        LOGGER.info("Embedding model loaded: %s", embedding_config.identifier)
-        
-        # pre-load the vectorstore connection to ChromaDB
-        # this also caches the connection for reuse
-        settings = load_settings()
-        vectorstore = load_vectorstore(settings=settings)
-        LOGGER.info("Vectorstore loaded and ready")
-        
-    except Exception as e:
-        # if pre-loading fails, resources will be loaded on-demand
-        # this allows the app to start even if ChromaDB is temporarily unavailable
-        import traceback
-        LOGGER.error("Error pre-loading resources (will load on-demand): %s", str(e))
-        LOGGER.debug("Traceback: %s", traceback.format_exc())
-
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Cleanup tasks when the application shuts down."""
-    LOGGER.info("RAG Medical Assistant Backend shutting down")
+# Prometheus scrapes /metrics at the root, by convention
+app.include_router(metrics.router, tags=["metrics"])
 
 
 @app.get("/")
@@ -74,5 +86,7 @@ async def root():
         "version": "1.0.0",
         "docs": "/docs",
         "health": "/api/v1/health",
+        "ready": "/api/v1/ready",
+        "metrics": "/metrics",
     }
 
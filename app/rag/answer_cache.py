@@ -0,0 +1,246 @@
+"""Semantic cache of answers keyed by question embedding."""
+import re
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.core.constants import (
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_TTL_SECONDS,
+)
+from app.core.logger import get_logger
+from app.rag.vectorstore import get_collection_generation
+
+LOGGER = get_logger(__name__)
+
+# numbers (with a decimal part) and words, as in the lexical index
+_TOKEN_PATTERN = re.compile(r"\d+(?:[.,]\d+)?|[a-z]+")
+# words that turn a question into a different one while barely moving its embedding (accent-folded)
+NEGATIONS = frozenset({
+    "no", "sin", "nunca", "jamas", "ni", "tampoco", "ningun", "ninguna", "ninguno", "nada",
+    "not", "without", "never",
+})
+PATIENT_TERMS = frozenset({
+    "nino", "nina", "ninos", "ninas", "infantil", "pediatrico", "pediatrica", "bebe", "bebes",
+    "lactante", "lactantes", "neonato", "neonatos", "recien", "adolescente", "adolescentes",
+    "adulto", "adulta", "adultos", "adultas", "anciano", "anciana", "ancianos", "embarazada",
+    "embarazadas", "embarazo", "child", "children", "infant", "baby", "adult", "elderly", "pregnant",
+})
+
+
+@dataclass(frozen=True)
+class CachedAnswer:
+    """An answer served from the cache."""
+    answer: str  # answer generated for the original question
+    source_documents: List[Document]  # documents used to generate it
+    question: str  # original question that produced the answer
+    similarity: float  # cosine similarity between the two questions
+
+
+class SemanticAnswerCache:
+    """
+    Answer cache that matches paraphrased questions.
+
+    Question embeddings are stored L2-normalized in a preallocated matrix, so a
+    lookup is a single matrix-vector product. An entry is returned when its
+    prompt type matches and its cosine similarity is at least the threshold.
+    Questions that differ only in a dose, a negation or the patient embed
+    almost identically, so a match must also have the same qualifiers
+    (numbers, negations and patient terms) as the new question.
+    Entries expire after ttl_seconds, the least recently used one is replaced
+    when the cache is full, and everything is dropped when the collection
+    generation changes (i.e. after /ingest rewrote the collection).
+    """
+
+    def __init__(
+        self,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # the matrix is allocated on first insert, once the embedding size is known
+        self._vectors: Optional[np.ndarray] = None
+        self._prompt_types: List[Optional[str]] = [None] * max_entries
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * max_entries
+        self._created = np.zeros(max_entries, dtype=np.float64)
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._generation = get_collection_generation()
+        # counters reported by stats()
+        self.hits = 0
+        self.misses = 0
+        self.qualifier_misses = 0  # similar enough, but with different qualifiers
+        self.evictions = 0
+        self.invalidations = 0
+
+    def lookup(self, embedding: List[float], prompt_type: str, question: str) -> Optional[CachedAnswer]:
+        """Return a cached answer for a similar question with the same qualifiers, or None."""
+        query = _normalize(embedding)
+        now = time.monotonic()
+        with self._lock:
+            self._check_generation()
+            if self._vectors is None:
+                self.misses += 1
+                return None
+
+            valid = self._valid_mask(now)
+            valid &= np.fromiter(
+                (stored == prompt_type for stored in self._prompt_types),
+                dtype=bool,
+                count=self.max_entries,
+            )
+            if not valid.any():
+                self.misses += 1
+                return None
+
+            similarities = np.where(valid, self._vectors @ query, -np.inf)
+            slot = int(np.argmax(similarities))
+            similarity = float(similarities[slot])
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+
+            entry = self._entries[slot]
+            if entry["qualifiers"] != qualifiers(question):
+                self.misses += 1
+                self.qualifier_misses += 1
+                return None
+
+            self.hits += 1
+            self._last_used[slot] = now
+            return CachedAnswer(
+                answer=entry["answer"],
+                source_documents=entry["source_documents"],
+                question=entry["question"],
+                similarity=similarity,
+            )
+
+    def store(
+        self,
+        embedding: List[float],
+        prompt_type: str,
+        question: str,
+        answer: str,
+        source_documents: List[Document],
+        generation: Optional[int] = None,
+    ) -> None:
+        """
+        Store an answer for a question.
+
+        Args:
+            embedding: Embedding of the question
+            prompt_type: Prompt type used to generate the answer
+            question: Original question
+            answer: Generated answer
+            source_documents: Documents used to generate the answer
+            generation: Collection generation read before retrieval; answers
+                computed against an older collection are not stored
+        """
+        vector = _normalize(embedding)
+        now = time.monotonic()
+        with self._lock:
+            self._check_generation()
+            if generation is not None and generation != self._generation:
+                return
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+
+            slot = self._free_slot(now)
+            self._vectors[slot] = vector
+            self._prompt_types[slot] = prompt_type
+            self._entries[slot] = {
+                "answer": answer,
+                "source_documents": list(source_documents),
+                "question": question,
+                "qualifiers": qualifiers(question),
+            }
+            self._created[slot] = now
+            self._last_used[slot] = now
+
+    def clear(self) -> None:
+        """Drop every cached answer."""
+        with self._lock:
+            self._clear_locked()
+
+    def _clear_locked(self) -> None:
+        self._prompt_types = [None] * self.max_entries
+        self._entries = [None] * self.max_entries
+        self._created[:] = 0
+        self._last_used[:] = 0
+
+    def _check_generation(self) -> None:
+        """Invalidate the cache if the collection changed since it was filled."""
+        generation = get_collection_generation()
+        if generation != self._generation:
+            self._generation = generation
+            self._clear_locked()
+            self.invalidations += 1
+
+    def _valid_mask(self, now: float) -> np.ndarray:
+        """Return the mask of occupied and unexpired slots."""
+        occupied = np.fromiter(
+            (entry is not None for entry in self._entries), dtype=bool, count=self.max_entries
+        )
+        return occupied & (now - self._created <= self.ttl_seconds)
+
+    def _free_slot(self, now: float) -> int:
+        """Return an empty or expired slot, evicting the least recently used if needed."""
+        valid = self._valid_mask(now)
+        free = np.flatnonzero(~valid)
+        if free.size:
+            return int(free[0])
+        self.evictions += 1
+        return int(np.argmin(self._last_used))
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the number of cached answers."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": int(self._valid_mask(time.monotonic()).sum()),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "qualifier_misses": self.qualifier_misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def qualifiers(question: str) -> FrozenSet[str]:
+    """Numbers, negations and patient terms of a question, which two questions sharing an answer must agree on."""
+    folded = unicodedata.normalize("NFKD", question.lower())
+    folded = "".join(char for char in folded if not unicodedata.combining(char))
+    terms = set()
+    for token in _TOKEN_PATTERN.findall(folded):
+        if token[0].isdigit():
+            terms.add(token.replace(",", "."))
+        elif token in NEGATIONS or token in PATIENT_TERMS:
+            terms.add(token)
+    return frozenset(terms)
+
+
+def _normalize(embedding: List[float]) -> np.ndarray:
+    """Return the L2-normalized embedding as float32."""
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+# process-wide answer cache
+_answer_cache = SemanticAnswerCache()
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """Get the process-wide semantic answer cache."""
+    return _answer_cache
@@ -0,0 +1,278 @@
+"""Condense-question step of conversational requests, skipped for self-contained questions."""
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from langchain.chains.base import Chain
+from langchain_core.callbacks import AsyncCallbackManagerForChainRun, CallbackManagerForChainRun
+
+from app.core.constants import (
+    CONDENSE_CACHE_MAX_ENTRIES,
+    CONDENSE_SKIP_ENABLED,
+    FOLLOWUP_SHORT_QUESTION_WORDS,
+    FOLLOWUP_SIMILARITY_THRESHOLD,
+)
+from app.core.logger import get_logger
+from app.core.metrics import get_metrics_registry
+from app.rag.embeddings import aembed_query, get_embedding_model
+from app.rag.retrieval_cache import normalize_question
+
+LOGGER = get_logger(__name__)
+
+# words that point back to an earlier turn (articles lo/la/los/las are left out)
+ANAPHORIC_WORDS = frozenset({
+    "eso", "esto", "ello", "aquello", "ese", "esa", "esos", "esas", "este", "esta", "estos", "estas",
+    "aquel", "aquella", "aquellos", "aquellas", "dicho", "dicha", "dichos", "dichas", "mismo", "misma",
+    "anterior", "mencionado", "mencionada", "él", "ella", "ellos", "ellas",
+    "it", "that", "this", "these", "those", "they", "them", "he", "she",
+})
+# openings that continue the previous question ("¿y en niños?", "pero si...")
+LEADING_CONNECTIVES = frozenset({
+    "y", "e", "o", "u", "pero", "entonces", "también", "además", "aparte", "tampoco", "and", "but", "also",
+})
+# verbs with an attached object pronoun ("tratarla", "administrándole")
+_ENCLITIC = re.compile(r"\b\w{3,}(?:ar|er|ir|ando|endo|ándo|iendo|iéndo)(?:lo|la|los|las|le|les)\b")
+_WORD = re.compile(r"\w+")
+_HUMAN_PREFIX = "\nHuman: "
+_ASSISTANT_PREFIX = "\nAssistant: "
+
+
+@dataclass(frozen=True)
+class FollowUpDecision:
+    """Whether a question must be rewritten with the chat history, and why."""
+    rewrite: bool
+    reason: str  # pronoun, connective, ellipsis, short, related, unscored, topic_shift or disabled
+    similarity: Optional[float] = None  # cosine similarity to the previous question, if computed
+
+
+class FollowUpDetector:
+    """
+    Local heuristics telling follow-up questions from self-contained ones.
+
+    Anaphoric pronouns and demonstratives, enclitic pronouns, a leading
+    connective, an ellipsis or a very short question mark a follow-up. A
+    question without any of these can still be an elliptical follow-up
+    ("¿Cuál es la dosis para niños?" after a question about paracetamol),
+    so it is compared with the previous question too: only when its
+    embedding is far from it (a topic shift) is it answered as asked,
+    without the condense-question LLM call. Everything else is rewritten.
+    """
+
+    def __init__(
+        self,
+        short_question_words: int = FOLLOWUP_SHORT_QUESTION_WORDS,
+        similarity_threshold: float = FOLLOWUP_SIMILARITY_THRESHOLD,
+        enabled: bool = CONDENSE_SKIP_ENABLED,
+    ):
+        self.short_question_words = short_question_words
+        self.similarity_threshold = similarity_threshold
+        self.enabled = enabled  # when off every question is rewritten, as before
+
+    def text_signal(self, question: str) -> Optional[str]:
+        """Follow-up signal found in the text alone (None: only the similarity can tell)."""
+        text = question.strip()
+        words = _WORD.findall(normalize_question(text))
+        if not words:
+            return "short"
+        if words[0] in LEADING_CONNECTIVES:
+            return "connective"
+        if text.endswith(("...", "…")) or text.startswith(("...", "…")):
+            return "ellipsis"
+        if any(word in ANAPHORIC_WORDS for word in words) or _ENCLITIC.search(text.lower()):
+            return "pronoun"
+        if len(words) <= self.short_question_words:
+            return "short"
+        return None
+
+    def decide(self, question: str, similarity: Optional[float] = None) -> FollowUpDecision:
+        """
+        Decide whether the question needs the condense-question rewrite.
+
+        Args:
+            question: Question as asked
+            similarity: Cosine similarity to the previous question (needed for
+                questions without a text signal; None rewrites them)
+        """
+        if not self.enabled:
+            return FollowUpDecision(rewrite=True, reason="disabled")
+        signal = self.text_signal(question)
+        if signal is not None:
+            return FollowUpDecision(rewrite=True, reason=signal, similarity=similarity)
+        if similarity is None:
+            return FollowUpDecision(rewrite=True, reason="unscored")
+        if similarity < self.similarity_threshold:
+            return FollowUpDecision(rewrite=False, reason="topic_shift", similarity=similarity)
+        return FollowUpDecision(rewrite=True, reason="related", similarity=similarity)
+
+
+class CondenseStats:
+    """Counters of condense-question decisions, reported by /health."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.skipped = 0
+        self.rewritten = 0
+        self.cache_hits = 0
+        self.reasons: Dict[str, int] = {}
+
+    def record(self, decision: FollowUpDecision, cached: bool = False) -> None:
+        outcome = "skipped" if not decision.rewrite else "cached" if cached else "rewritten"
+        with self._lock:
+            if not decision.rewrite:
+                self.skipped += 1
+            elif cached:
+                self.cache_hits += 1
+            else:
+                self.rewritten += 1
+            self.reasons[decision.reason] = self.reasons.get(decision.reason, 0) + 1
+        get_metrics_registry().counter(
+            "condense_decisions_total",
+            "Condense-question decisions of conversational requests",
+            outcome=outcome,
+            reason=decision.reason,
+        ).inc()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.skipped + self.rewritten + self.cache_hits
+            return {
+                "skipped": self.skipped,
+                "rewritten": self.rewritten,
+                "cache_hits": self.cache_hits,
+                "skip_rate": self.skipped / total if total else 0.0,
+                "rewrite_rate": self.rewritten / total if total else 0.0,
+                "reasons": dict(self.reasons),
+            }
+
+
+class StandaloneQuestionGenerator(Chain):
+    """
+    Drop-in question generator for ConversationalRetrievalChain.
+
+    Self-contained questions are returned as asked. Follow-ups are rewritten
+    by llm_chain (the condense prompt on a cheaper model), and the rewrites
+    are cached by chat history and normalized question.
+    """
+
+    llm_chain: Chain  # condense-question prompt | LLM
+    output_key: str = "text"
+
+    @property
+    def input_keys(self) -> List[str]:
+        return ["question", "chat_history"]
+
+    @property
+    def output_keys(self) -> List[str]:
+        return [self.output_key]
+
+    def _call(
+        self, inputs: Dict[str, Any], run_manager: Optional[CallbackManagerForChainRun] = None
+    ) -> Dict[str, str]:
+        question, chat_history = inputs["question"], inputs["chat_history"]
+        decision = _detector.decide(question, self._similarity(question, chat_history, _embed_sync))
+        rewritten = self._resolve_locally(question, chat_history, decision)
+        if rewritten is None:
+            callbacks = run_manager.get_child() if run_manager else None
+            rewritten = self.llm_chain.run(question=question, chat_history=chat_history, callbacks=callbacks)
+            self._remember(question, chat_history, rewritten)
+        return {self.output_key: rewritten}
+
+    async def _acall(
+        self, inputs: Dict[str, Any], run_manager: Optional[AsyncCallbackManagerForChainRun] = None
+    ) -> Dict[str, str]:
+        question, chat_history = inputs["question"], inputs["chat_history"]
+        decision = _detector.decide(question, await self._asimilarity(question, chat_history))
+        rewritten = self._resolve_locally(question, chat_history, decision)
+        if rewritten is None:
+            callbacks = run_manager.get_child() if run_manager else None
+            rewritten = await self.llm_chain.arun(question=question, chat_history=chat_history, callbacks=callbacks)
+            self._remember(question, chat_history, rewritten)
+        return {self.output_key: rewritten}
+
+    @staticmethod
+    def _similarity(question: str, chat_history: str, embed: Callable[[str], List[float]]) -> Optional[float]:
+        """Similarity to the previous question, computed unless the text alone already marks a follow-up."""
+        previous = previous_question(chat_history)
+        if previous is None or not _detector.enabled or _detector.text_signal(question) is not None:
+            return None
+        try:
+            return _cosine(embed(question), embed(previous))
+        except Exception as exc:
+            LOGGER.warning("No se pudo comparar con la pregunta anterior: %s", exc)
+            return None
+
+    @staticmethod
+    async def _asimilarity(question: str, chat_history: str) -> Optional[float]:
+        """Async variant of _similarity (query embeddings are memoized and batched)."""
+        previous = previous_question(chat_history)
+        if previous is None or not _detector.enabled or _detector.text_signal(question) is not None:
+            return None
+        try:
+            return _cosine(await aembed_query(question), await aembed_query(previous))
+        except Exception as exc:
+            LOGGER.warning("No se pudo comparar con la pregunta anterior: %s", exc)
+            return None
+
+    @staticmethod
+    def _resolve_locally(question: str, chat_history: str, decision: FollowUpDecision) -> Optional[str]:
+        """Question to use without calling the LLM (None if it must be rewritten)."""
+        if not decision.rewrite:
+            _stats.record(decision)
+            return question
+        key = _cache_key(question, chat_history)
+        with _cache_lock:
+            rewritten = _rewrites.get(key)
+            if rewritten is not None:
+                _rewrites.move_to_end(key)
+        _stats.record(decision, cached=rewritten is not None)
+        return rewritten
+
+    @staticmethod
+    def _remember(question: str, chat_history: str, rewritten: str) -> None:
+        with _cache_lock:
+            _rewrites[_cache_key(question, chat_history)] = rewritten
+            while len(_rewrites) > CONDENSE_CACHE_MAX_ENTRIES:
+                _rewrites.popitem(last=False)
+
+    @property
+    def _chain_type(self) -> str:
+        return "standalone_question_generator"
+
+
+def previous_question(chat_history: str) -> Optional[str]:
+    """Last human question of a chat history formatted by ConversationalRetrievalChain."""
+    start = chat_history.rfind(_HUMAN_PREFIX)
+    if start < 0:
+        return None
+    turn = chat_history[start + len(_HUMAN_PREFIX):]
+    return turn.split(_ASSISTANT_PREFIX, 1)[0].strip() or None
+
+
+def _cache_key(question: str, chat_history: str) -> tuple:
+    return chat_history.strip(), normalize_question(question)
+
+
+def _embed_sync(text: str) -> List[float]:
+    return get_embedding_model().embedding.embed_query(text)
+
+
+def _cosine(first: List[float], second: List[float]) -> float:
+    a = np.asarray(first, dtype=np.float32)
+    b = np.asarray(second, dtype=np.float32)
+    norms = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(a @ b) / norms if norms > 0 else 0.0
+
+
+_detector = FollowUpDetector()
+_stats = CondenseStats()
+# rewrites by (chat history, normalized question), least recently used first
+_rewrites: "OrderedDict[tuple, str]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_condense_stats() -> Dict[str, Any]:
+    """Return skip/rewrite counters and rates of the condense-question step."""
+    return _stats.stats()
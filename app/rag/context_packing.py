@@ -0,0 +1,199 @@
+"""Context assembly between retrieval and the "stuff" prompt."""
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from app.core.constants import CONTEXT_TOKEN_BUDGET, DEFAULT_CHUNK_OVERLAP
+from app.core.logger import get_logger
+from app.core.metrics import get_metrics_registry, stage_timer
+from app.rag.tokens import count_tokens
+
+LOGGER = get_logger(__name__)
+
+# shortest shared span treated as splitter overlap rather than a coincidence
+MIN_OVERLAP_CHARS = 30
+# longest span searched for (the splitter may extend the overlap to a word boundary)
+MAX_OVERLAP_CHARS = 2 * DEFAULT_CHUNK_OVERLAP
+
+
+@dataclass
+class ContextReport:
+    """What context packing did to the retrieved chunks of one request."""
+    chunks_retrieved: int = 0  # chunks returned by the retriever
+    chunks_merged: int = 0  # chunks joined to an overlapping neighbour
+    duplicates_removed: int = 0  # chunks whose text was already in the context
+    chunks_dropped: int = 0  # passages left out to stay within the token budget
+    passages: int = 0  # passages in the final context
+    context_tokens: int = 0  # tokens of the final context
+    token_budget: int = 0  # budget the context was packed into (0 = unbounded)
+
+    def as_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+
+class PackedDocuments(list):
+    """
+    List of packed context documents that carries its ContextReport.
+
+    Slices keep the report, since chains trim their documents by slicing.
+    """
+
+    def __init__(self, documents: List[Document], report: ContextReport):
+        super().__init__(documents)
+        self.report = report
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return PackedDocuments(super().__getitem__(index), self.report)
+        return super().__getitem__(index)
+
+
+@dataclass
+class _Passage:
+    """A span of one source assembled from one or more chunks."""
+    rank: int  # best retrieval rank among its chunks
+    text: str
+    metadata: Dict[str, Any]
+    doc_id: Optional[str] = None  # chunk ID (dropped once chunks are joined)
+    chunks: int = 1
+
+    @property
+    def source(self) -> Any:
+        return self.metadata.get("source")
+
+    def pages_touch(self, other: "_Passage") -> bool:
+        """Whether both passages cover overlapping or adjacent page ranges."""
+        start, end = self.metadata.get("page_start"), self.metadata.get("page_end")
+        other_start, other_end = other.metadata.get("page_start"), other.metadata.get("page_end")
+        if None in (start, end, other_start, other_end):
+            return True
+        return start <= other_end + 1 and other_start <= end + 1
+
+
+def pack_documents(documents: List[Document], token_budget: int = CONTEXT_TOKEN_BUDGET) -> PackedDocuments:
+    """
+    Merge overlapping chunks and fit the context into a token budget.
+
+    Chunks of the same source whose page ranges touch are joined when the end
+    of one repeats the start of the other (the splitter's chunk_overlap), so
+    the shared span appears once; chunks whose text is already contained in
+    another passage are removed. Passages keep the best retrieval rank of their
+    chunks and are added best first while they fit in token_budget tokens
+    (0 disables the budget). The best passage is always kept.
+    """
+    with stage_timer("ask", "pack"):
+        packed = _pack(documents, token_budget)
+    get_metrics_registry().counter(
+        "llm_tokens_total", "Tokens sent to or produced by the LLM", kind="context"
+    ).inc(packed.report.context_tokens)
+    return packed
+
+
+def _pack(documents: List[Document], token_budget: int) -> PackedDocuments:
+    report = ContextReport(chunks_retrieved=len(documents), token_budget=token_budget)
+    passages: List[_Passage] = []
+    for rank, doc in enumerate(documents):
+        text = doc.page_content.strip()
+        passage = _Passage(rank=rank, text=text, metadata=dict(doc.metadata or {}), doc_id=doc.id)
+        if any(other.source == passage.source and text in other.text for other in passages):
+            report.duplicates_removed += 1
+            continue
+        passages.append(passage)
+
+    # join pairs until no two passages overlap (joins can enable further joins)
+    joined = True
+    while joined:
+        joined = False
+        for first in passages:
+            for second in passages:
+                if first is second or first.source != second.source or not first.pages_touch(second):
+                    continue
+                if second.text in first.text:
+                    passages.remove(second)
+                    report.duplicates_removed += second.chunks
+                    joined = True
+                    break
+                overlap = _overlap(first.text, second.text)
+                if overlap:
+                    _join(first, second, overlap)
+                    passages.remove(second)
+                    report.chunks_merged += second.chunks
+                    joined = True
+                    break
+            if joined:
+                break
+
+    packed: List[Document] = []
+    for passage in sorted(passages, key=lambda item: item.rank):
+        tokens = count_tokens(passage.text)
+        if packed and token_budget and report.context_tokens + tokens > token_budget:
+            report.chunks_dropped += passage.chunks
+            continue
+        metadata = dict(passage.metadata)
+        if passage.chunks > 1:
+            metadata["merged_chunks"] = passage.chunks
+        packed.append(Document(page_content=passage.text, metadata=metadata, id=passage.doc_id))
+        report.context_tokens += tokens
+    report.passages = len(packed)
+    return PackedDocuments(packed, report)
+
+
+def _overlap(first: str, second: str) -> int:
+    """Length of the longest end of first that starts second (0 if shorter than MIN_OVERLAP_CHARS)."""
+    tail = first[-MAX_OVERLAP_CHARS:]
+    probe = second[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+    position = tail.find(probe)
+    while position != -1:
+        if second.startswith(tail[position:]):
+            return len(tail) - position
+        position = tail.find(probe, position + 1)
+    return 0
+
+
+def _join(first: _Passage, second: _Passage, overlap: int) -> None:
+    """Append second to first, writing the shared span once."""
+    first.text += second.text[overlap:]
+    first.doc_id = None
+    first.rank = min(first.rank, second.rank)
+    first.chunks += second.chunks
+    for key, pick in (("page_start", min), ("page_end", max)):
+        values = [value for value in (first.metadata.get(key), second.metadata.get(key)) if value is not None]
+        if values:
+            first.metadata[key] = pick(values)
+
+
+def context_report(documents: Any) -> Optional[ContextReport]:
+    """Return the packing report of retrieved documents (None if they were not packed)."""
+    return getattr(documents, "report", None)
+
+
+class ContextPackingRetriever(BaseRetriever):
+    """Retriever wrapper that packs the retrieved chunks with pack_documents."""
+
+    retriever: BaseRetriever
+    token_budget: int = CONTEXT_TOKEN_BUDGET
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        documents = self.retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        return self._pack(documents)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        documents = await self.retriever.ainvoke(query, config={"callbacks": run_manager.get_child()})
+        return self._pack(documents)
+
+    def _pack(self, documents: List[Document]) -> PackedDocuments:
+        packed = pack_documents(documents, self.token_budget)
+        LOGGER.info("Contexto empaquetado: %s", packed.report.as_dict())
+        return packed
@@ -0,0 +1,222 @@
+"""Persistent content-addressed cache of document embeddings."""
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.logger import get_logger
+
+LOGGER = get_logger(__name__)
+
+DIGEST_SIZE = 32  # sha256 digest length in bytes
+
+
+class EmbeddingDiskCache:
+    """
+    Append-only on-disk embedding cache.
+
+    Each namespace (one per embedding model) is a directory with three files:
+
+    - vectors.f32: float32 rows of size `dim`, read through a memory map
+    - keys.bin: one sha256 digest per row, in the same order as the vectors
+    - meta.json: namespace and vector dimension
+
+    Keys hash the namespace and the chunk text, so a chunk is only embedded
+    again when its text (or the model) changes. Vectors are appended before
+    their keys, so a crash mid-write leaves at most some unreferenced rows.
+    """
+
+    def __init__(self, directory: Path, namespace: str):
+        self.namespace = namespace
+        self.directory = Path(directory) / _safe_name(namespace)
+        self._vectors_path = self.directory / "vectors.f32"
+        self._keys_path = self.directory / "keys.bin"
+        self._meta_path = self.directory / "meta.json"
+        self._lock = threading.Lock()
+        self._rows: Dict[bytes, int] = {}
+        self._dim: Optional[int] = None
+        self._keys_offset = 0  # bytes of keys.bin already loaded
+        self._mmap: Optional[np.memmap] = None
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def key(self, text: str) -> bytes:
+        """Return the cache key of a text."""
+        return hashlib.sha256(f"{self.namespace}\0{text}".encode("utf-8")).digest()
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Return the cached vector of each text (None for misses)."""
+        keys = [self.key(text) for text in texts]
+        with self._lock:
+            # pick up rows appended by other worker processes
+            if any(key not in self._rows for key in keys):
+                self._refresh()
+            rows = [self._rows.get(key) for key in keys]
+            found = [row for row in rows if row is not None]
+            self.hits += len(found)
+            self.misses += len(rows) - len(found)
+            if not found:
+                return [None] * len(texts)
+
+            vectors = np.asarray(self._get_mmap()[found])
+            results: List[Optional[np.ndarray]] = []
+            position = 0
+            for row in rows:
+                if row is None:
+                    results.append(None)
+                else:
+                    results.append(vectors[position])
+                    position += 1
+            return results
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        """Append the vectors of texts that are not cached yet."""
+        if not texts:
+            return
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2 or matrix.shape[0] != len(texts):
+            raise ValueError("Se esperaba un vector por texto para la caché de embeddings")
+
+        with self._lock:
+            if self._dim is None:
+                self._init_namespace(matrix.shape[1])
+            elif matrix.shape[1] != self._dim:
+                raise ValueError(
+                    f"Dimensión de embedding {matrix.shape[1]} incompatible con la caché ({self._dim})"
+                )
+
+            new_keys: List[bytes] = []
+            new_rows: List[int] = []
+            seen = set()
+            for index, text in enumerate(texts):
+                key = self.key(text)
+                if key in self._rows or key in seen:
+                    continue
+                seen.add(key)
+                new_keys.append(key)
+                new_rows.append(index)
+            if not new_keys:
+                return
+
+            with _FileLock(self.directory / ".lock"):
+                # another process may have appended since we last read the files
+                self._refresh()
+                first_row = self._keys_offset // DIGEST_SIZE
+                # keep both files aligned even if a previous writer crashed mid-way
+                if self._vectors_path.stat().st_size != first_row * 4 * self._dim:
+                    self._truncate(first_row)
+                with open(self._vectors_path, "ab") as handle:
+                    handle.write(np.ascontiguousarray(matrix[new_rows]).tobytes())
+                    handle.flush()
+                    os.fsync(handle.fileno())
+                with open(self._keys_path, "ab") as handle:
+                    handle.write(b"".join(new_keys))
+                    handle.flush()
+                self._keys_offset += len(new_keys) * DIGEST_SIZE
+
+            for offset, key in enumerate(new_keys):
+                self._rows[key] = first_row + offset
+            self._mmap = None
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of cached vectors and hit/miss counters."""
+        with self._lock:
+            return {
+                "vectors": len(self._rows),
+                "dim": self._dim or 0,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _load(self) -> None:
+        """Load the key index of an existing namespace."""
+        if not self._meta_path.exists():
+            return
+        meta = json.loads(self._meta_path.read_text(encoding="utf-8"))
+        self._dim = int(meta["dim"])
+        self._refresh()
+        LOGGER.info("Caché de embeddings '%s': %s vectores", self.namespace, len(self._rows))
+
+    def _init_namespace(self, dim: int) -> None:
+        """Create the namespace directory and metadata."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._meta_path.write_text(
+            json.dumps({"namespace": self.namespace, "dim": dim}), encoding="utf-8"
+        )
+        self._vectors_path.touch()
+        self._keys_path.touch()
+        self._dim = dim
+
+    def _refresh(self) -> None:
+        """Read keys appended since the last refresh (only complete rows)."""
+        if self._dim is None or not self._keys_path.exists():
+            return
+        vector_rows = self._vectors_path.stat().st_size // (4 * self._dim)
+        key_rows = self._keys_path.stat().st_size // DIGEST_SIZE
+        rows = min(vector_rows, key_rows)
+        loaded_rows = self._keys_offset // DIGEST_SIZE
+        if rows <= loaded_rows:
+            return
+        with open(self._keys_path, "rb") as handle:
+            handle.seek(self._keys_offset)
+            data = handle.read((rows - loaded_rows) * DIGEST_SIZE)
+        for index in range(rows - loaded_rows):
+            key = data[index * DIGEST_SIZE:(index + 1) * DIGEST_SIZE]
+            self._rows.setdefault(key, loaded_rows + index)
+        self._keys_offset = rows * DIGEST_SIZE
+        self._mmap = None
+
+    def _truncate(self, rows: int) -> None:
+        """Drop partially written rows so keys and vectors stay aligned."""
+        LOGGER.warning("Caché de embeddings '%s' inconsistente, recortando a %s filas", self.namespace, rows)
+        with open(self._vectors_path, "r+b") as handle:
+            handle.truncate(rows * 4 * self._dim)
+        with open(self._keys_path, "r+b") as handle:
+            handle.truncate(rows * DIGEST_SIZE)
+        self._keys_offset = rows * DIGEST_SIZE
+
+    def _get_mmap(self) -> np.memmap:
+        """Return a read-only memory map over the cached vectors."""
+        if self._mmap is None:
+            rows = self._keys_offset // DIGEST_SIZE
+            self._mmap = np.memmap(
+                self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self._dim)
+            )
+        return self._mmap
+
+
+class _FileLock:
+    """Exclusive advisory lock on a file, shared by all worker processes."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._handle = None
+
+    def __enter__(self):
+        self._handle = open(self.path, "a+b")
+        try:
+            import fcntl
+            fcntl.flock(self._handle.fileno(), fcntl.LOCK_EX)
+        except ImportError:
+            # no fcntl (Windows): rely on the in-process lock only
+            pass
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            import fcntl
+            fcntl.flock(self._handle.fileno(), fcntl.LOCK_UN)
+        except ImportError:
+            pass
+        self._handle.close()
+
+
+def _safe_name(namespace: str) -> str:
+    """Turn a namespace into a safe directory name."""
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", namespace)
@@ -1,14 +1,38 @@
 """Embedding model configuration."""
+import asyncio
 import importlib
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
+from langchain_core.embeddings import Embeddings
+
+from app.core.constants import (
+    EMBEDDING_BACKEND,
+    EMBEDDING_CACHE_DIR,
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_ONNX_DIR,
+    EMBEDDING_ONNX_THREADS,
+    QUERY_BATCHING_ENABLED,
+    QUERY_EMBEDDING_CACHE_SIZE,
+)
 from app.core.logger import get_logger
+from app.rag.embedding_cache import EmbeddingDiskCache
+from app.rag.query_batcher import QueryEmbeddingBatcher
 
 LOGGER = get_logger(__name__)
 
+# use multilingual model that works better with Spanish
+# this model supports multiple languages including Spanish
+EMBEDDING_MODEL_NAME = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
 # global cache for embedding model to avoid reloading on every request
 _cached_embedding_config: Optional["EmbeddingConfig"] = None
+_cached_backend_request: Optional[str] = None
+
+# LRU memo of recent query embeddings (only touched from the event loop)
+_query_embedding_memo: "OrderedDict[str, List[float]]" = OrderedDict()
 
 
 def _load_hf_embeddings():
@@ -31,30 +55,201 @@ def _load_hf_embeddings():
         ) from exc
 
 
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that consults the on-disk cache before the model.
+
+    Only documents are cached: chunk texts repeat across re-indexes, while
+    questions are embedded once per request.
+    """
+
+    def __init__(self, embedding: Embeddings, cache: EmbeddingDiskCache):
+        self.embedding = embedding  # the wrapped embedding model
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        cached = self.cache.get_many(texts)
+
+        # embed each missing text once, even if it appears several times
+        missing: Dict[str, List[int]] = {}
+        for index, vector in enumerate(cached):
+            if vector is None:
+                missing.setdefault(texts[index], []).append(index)
+
+        results: List[Optional[List[float]]] = [
+            vector.tolist() if vector is not None else None for vector in cached
+        ]
+        if missing:
+            missing_texts = list(missing)
+            vectors = self.embedding.embed_documents(missing_texts)
+            self.cache.put_many(missing_texts, vectors)
+            for text, vector in zip(missing_texts, vectors):
+                for index in missing[text]:
+                    results[index] = list(vector)
+            LOGGER.debug(
+                "Embeddings: %s desde caché, %s calculados",
+                len(texts) - sum(len(indexes) for indexes in missing.values()),
+                len(missing_texts),
+            )
+        return results
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embedding.embed_query(text)
+
+
 @dataclass(frozen=True)
 class EmbeddingConfig:
     """Embedding model configuration container."""
     embedding: object  # the actual embedding model instance
     identifier: str  # model identifier for tracking
+    backend: str = "torch"  # runtime computing the vectors (torch, onnx or onnx-int8)
 
 
-def get_embedding_model(force_reload: bool = False) -> EmbeddingConfig:
-    """Get the configured embedding model (cached for performance)."""
-    global _cached_embedding_config
-    
-    # reload if cache is empty or force_reload is True
-    if _cached_embedding_config is None or force_reload:
-        # dynamically load the HuggingFaceEmbeddings class
-        HuggingFaceEmbeddings = _load_hf_embeddings()
-        
-        # use multilingual model that works better with Spanish
-        # this model supports multiple languages including Spanish
-        model_name = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"
-        # create the embedding model instance
-        # this will download the model on first use (can take 30-60 seconds)
-        embedding = HuggingFaceEmbeddings(model_name=model_name)
+def _load_model(backend: str) -> Tuple[Embeddings, str]:
+    """Create the embedding model for a backend (falling back to PyTorch) and return the backend used."""
+    if backend in {"onnx", "onnx-int8"}:
+        from app.rag.onnx_embeddings import load_onnx_embeddings
+
+        try:
+            embedding = load_onnx_embeddings(
+                EMBEDDING_MODEL_NAME,
+                EMBEDDING_ONNX_DIR / EMBEDDING_MODEL_NAME.split("/")[-1],
+                quantized=backend == "onnx-int8",
+                intra_op_threads=EMBEDDING_ONNX_THREADS or None,
+            )
+            return embedding, backend
+        except (ImportError, ValueError) as exc:
+            LOGGER.error("Backend de embeddings '%s' no disponible, usando torch: %s", backend, exc)
+    elif backend != "torch":
+        LOGGER.warning(
+            "EMBEDDING_BACKEND '%s' desconocido (opciones: %s), usando torch",
+            backend, ", ".join(EMBEDDING_BACKENDS),
+        )
+
+    # dynamically load the HuggingFaceEmbeddings class
+    HuggingFaceEmbeddings = _load_hf_embeddings()
+    # create the embedding model instance
+    # this will download the model on first use (can take 30-60 seconds)
+    return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME), "torch"
+
+
+def get_embedding_model(force_reload: bool = False, backend: Optional[str] = None) -> EmbeddingConfig:
+    """
+    Get the configured embedding model (cached for performance).
+
+    Args:
+        force_reload: Build the model again even if it is cached
+        backend: Override EMBEDDING_BACKEND (implies a reload when it differs)
+    """
+    global _cached_embedding_config, _cached_backend_request
+    backend = backend or EMBEDDING_BACKEND
+
+    # reload if cache is empty, force_reload is True or another backend is requested
+    if _cached_embedding_config is None or force_reload or _cached_backend_request != backend:
+        _cached_backend_request = backend
+        embedding, backend = _load_model(backend)
+        # every backend computes the same model, so collections stay compatible
+        identifier = "paraphrase-multilingual-mpnet-base-v2"
+        # consult the on-disk cache before running the model on document chunks
+        # (one namespace per backend: int8 vectors differ slightly from fp32 ones)
+        if EMBEDDING_CACHE_ENABLED:
+            namespace = identifier if backend == "torch" else f"{identifier}@{backend}"
+            embedding = CachedEmbeddings(
+                embedding,
+                EmbeddingDiskCache(EMBEDDING_CACHE_DIR, namespace=namespace),
+            )
         # cache the configuration for reuse
-        _cached_embedding_config = EmbeddingConfig(embedding=embedding, identifier="paraphrase-multilingual-mpnet-base-v2")
+        _cached_embedding_config = EmbeddingConfig(
+            embedding=embedding, identifier=identifier, backend=backend
+        )
+        # embeddings from a previous model are no longer valid
+        _query_embedding_memo.clear()
     
     return _cached_embedding_config
 
+
+def get_embedding_cache_stats() -> Optional[Dict[str, int]]:
+    """Return the disk cache counters of the loaded model (None if not loaded or uncached)."""
+    config = _cached_embedding_config
+    if config is None or not isinstance(config.embedding, CachedEmbeddings):
+        return None
+    return config.embedding.cache.stats()
+
+
+async def aembed_query(text: str) -> List[float]:
+    """
+    Embed a query without blocking the event loop.
+
+    The transformer forward pass (and the model load on a cold cache) is
+    CPU-bound, so it runs on a worker thread while the event loop keeps
+    serving other requests. Concurrent queries are micro-batched into a
+    single forward pass, and recent queries are memoized, so the answer
+    cache and the retriever share a single embedding per question.
+    """
+    cached = _query_embedding_memo.get(text)
+    if cached is not None:
+        _query_embedding_memo.move_to_end(text)
+        return cached
+
+    if QUERY_BATCHING_ENABLED:
+        embedding = await _query_batcher.embed(text)
+    else:
+        embedding = await asyncio.to_thread(_embed_query_sync, text)
+    _memoize_query_embedding(text, embedding)
+    return embedding
+
+
+async def aembed_queries(texts: List[str]) -> List[List[float]]:
+    """
+    Embed several queries in a single forward pass without blocking the event loop.
+
+    Memoized queries are reused and repeated ones embedded once; the rest go
+    to the model together on a worker thread.
+    """
+    embeddings: Dict[str, List[float]] = {}
+    for text in texts:
+        cached = _query_embedding_memo.get(text)
+        if cached is not None:
+            embeddings[text] = cached
+    missing = [text for text in dict.fromkeys(texts) if text not in embeddings]
+    if missing:
+        vectors = await asyncio.to_thread(_embed_queries_sync, missing)
+        for text, vector in zip(missing, vectors):
+            embeddings[text] = vector
+            _memoize_query_embedding(text, vector)
+    return [embeddings[text] for text in texts]
+
+
+def _memoize_query_embedding(text: str, embedding: List[float]) -> None:
+    """Remember a query embedding, evicting the least recently used ones."""
+    _query_embedding_memo[text] = embedding
+    while len(_query_embedding_memo) > QUERY_EMBEDDING_CACHE_SIZE:
+        _query_embedding_memo.popitem(last=False)
+
+
+def _embed_query_sync(text: str) -> List[float]:
+    """Embed a single query with the cached embedding model."""
+    return get_embedding_model().embedding.embed_query(text)
+
+
+def _embed_queries_sync(texts: List[str]) -> List[List[float]]:
+    """
+    Embed a batch of queries with the cached embedding model.
+
+    Calls the model directly (bypassing the document disk cache). For the
+    sentence-transformers model a query embedding is the same as a
+    one-document embedding, so batching does not change the vectors.
+    """
+    embedding = get_embedding_model().embedding
+    if isinstance(embedding, CachedEmbeddings):
+        embedding = embedding.embedding
+    return embedding.embed_documents(texts)
+
+
+# process-wide batcher of query embeddings
+_query_batcher = QueryEmbeddingBatcher(_embed_queries_sync)
+
+
+def get_query_batcher() -> QueryEmbeddingBatcher:
+    """Get the process-wide query embedding batcher."""
+    return _query_batcher
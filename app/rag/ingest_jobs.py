@@ -0,0 +1,289 @@
+"""Background ingestion jobs."""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.concurrency import AdmissionRejected, record_rejection
+from app.core.config import Settings
+from app.core.constants import (
+    INGEST_JOB_HISTORY,
+    INGEST_JOB_NICE,
+    INGEST_MAX_QUEUE_SECONDS,
+    INGEST_MAX_QUEUED_JOBS,
+    INGEST_MAX_RUNNING_JOBS,
+    INGEST_YIELD_MAX_SECONDS,
+)
+from app.core.logger import get_logger
+from app.rag.ingestion import (
+    IngestionCancelled,
+    IngestionResult,
+    IngestProgress,
+    run_ingestion,
+)
+
+LOGGER = get_logger(__name__)
+
+# job states that will not change anymore
+FINISHED_STATUSES = {"completed", "failed", "cancelled"}
+# Retry-After suggested when the ingestion queue is full and no running job has an ETA yet
+DEFAULT_INGEST_RETRY_AFTER = 60
+
+
+class IngestJobConflict(Exception):
+    """Raised when a write job is already running on the collection."""
+
+    def __init__(self, job: "IngestJob"):
+        super().__init__(
+            f"Ya hay una ingesta en curso para la colección '{job.collection_name}' (job {job.job_id})"
+        )
+        self.job = job
+
+
+class IngestJob:
+    """An ingestion run executed in a background thread."""
+
+    def __init__(self, settings: Settings, force: bool, incremental: bool):
+        self.job_id = uuid.uuid4().hex
+        self.settings = settings
+        self.collection_name = settings.chroma_collection
+        self.force = force
+        self.incremental = incremental
+        self.progress = IngestProgress()
+        self.status = "queued"
+        self.created_at = datetime.now(timezone.utc)
+        self.error: Optional[str] = None
+        self.result: Optional[IngestionResult] = None
+        self._started: Optional[float] = None
+        self._finished: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the job state and progress."""
+        end = self._finished if self._finished is not None else time.monotonic()
+        return {
+            "job_id": self.job_id,
+            "collection_name": self.collection_name,
+            "status": self.status,
+            "force": self.force,
+            "incremental": self.incremental,
+            "created_at": self.created_at.isoformat(),
+            "elapsed_seconds": round(end - self._started, 1) if self._started is not None else 0.0,
+            **self.progress.snapshot(),
+            "result": vars(self.result) if self.result is not None else None,
+            "error": self.error,
+        }
+
+    def run(self) -> None:
+        """Run the ingestion (called from the job thread)."""
+        self._started = time.monotonic()
+        self.status = "running"
+        try:
+            self.result = run_ingestion(
+                self.settings,
+                force=self.force,
+                incremental=self.incremental,
+                progress=self.progress,
+            )
+            self.status = "completed"
+        except IngestionCancelled:
+            self.status = "cancelled"
+            self.error = "Ingesta cancelada. Usa incremental=true para reanudarla."
+        except Exception as exc:
+            LOGGER.error("Error durante la ingesta (job %s): %s", self.job_id, exc, exc_info=True)
+            self.status = "failed"
+            self.error = f"Error durante la ingesta: {exc}"
+        finally:
+            self._finished = time.monotonic()
+            LOGGER.info("Job de ingesta %s terminado: %s", self.job_id, self.status)
+
+    def abandon(self, status: str, error: str) -> None:
+        """Finish a job that never ran (cancelled or expired while queued)."""
+        self.status = status
+        self.error = error
+        self._started = self._finished = time.monotonic()
+        LOGGER.info("Job de ingesta %s terminado sin ejecutarse: %s", self.job_id, status)
+
+
+class IngestJobManager:
+    """
+    Runs ingestion jobs in background threads, at most one per collection.
+
+    At most max_running jobs run at once; the others wait (status "queued")
+    for up to max_queue_seconds, and once max_queued jobs are waiting new
+    submissions are rejected. Finished jobs are kept (up to max_history) so
+    clients can poll their final status. Job threads run with a lower CPU
+    priority and pause between batches while /ask requests are queued (see
+    yield_to), so /ask keeps its latency while a corpus is being indexed.
+    """
+
+    def __init__(
+        self,
+        max_history: int = INGEST_JOB_HISTORY,
+        nice: int = INGEST_JOB_NICE,
+        max_running: int = INGEST_MAX_RUNNING_JOBS,
+        max_queued: int = INGEST_MAX_QUEUED_JOBS,
+        max_queue_seconds: float = INGEST_MAX_QUEUE_SECONDS,
+    ):
+        self.max_history = max_history
+        self.nice = nice
+        self.max_running = max(1, max_running)
+        self.max_queued = max_queued
+        self.max_queue_seconds = max_queue_seconds
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._active: Dict[str, IngestJob] = {}
+        self._threads: Dict[str, threading.Thread] = {}
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(self.max_running)
+        self._busy: Optional[Callable[[], bool]] = None
+        self.rejected: Dict[str, int] = {}
+
+    def yield_to(self, busy: Callable[[], bool]) -> None:
+        """Make jobs pause at file/batch boundaries while busy() is true (e.g. /ask requests are queued)."""
+        self._busy = busy
+
+    def submit(self, settings: Settings, force: bool = False, incremental: bool = False) -> IngestJob:
+        """
+        Start an ingestion job.
+
+        Raises:
+            IngestJobConflict: If a job is already writing to the same collection
+            AdmissionRejected: If max_queued jobs are already waiting for a slot
+        """
+        with self._lock:
+            active = self._active.get(settings.chroma_collection)
+            if active is not None:
+                raise IngestJobConflict(active)
+            running = [job for job in self._active.values() if job.status == "running"]
+            queued = len(self._active) - len(running)
+            if len(self._active) >= self.max_running and queued >= self.max_queued:
+                raise self._reject("queue_full", self._retry_after(running))
+            job = IngestJob(settings, force=force, incremental=incremental)
+            if self._busy is not None:
+                job.progress.yield_to(self._busy, INGEST_YIELD_MAX_SECONDS)
+            self._active[job.collection_name] = job
+            self._jobs[job.job_id] = job
+            self._prune()
+            thread = threading.Thread(
+                target=self._run, args=(job,), name=f"ingest-{job.job_id[:8]}", daemon=True
+            )
+            self._threads[job.job_id] = thread
+        thread.start()
+        LOGGER.info("Job de ingesta %s encolado para '%s'", job.job_id, job.collection_name)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[IngestJob]:
+        """Request cancellation of a job; it stops at the next file or batch."""
+        job = self.get(job_id)
+        if job is not None and not job.finished:
+            job.progress.cancel()
+        return job
+
+    def list_jobs(self) -> List[IngestJob]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def shutdown(self, timeout: float = 30.0) -> None:
+        """Cancel running jobs and wait for their threads to stop."""
+        with self._lock:
+            active = list(self._active.values())
+            threads = [self._threads[job.job_id] for job in active if job.job_id in self._threads]
+        for job in active:
+            job.progress.cancel()
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "active": [job.job_id for job in self._active.values()],
+                "running": sum(job.status == "running" for job in self._active.values()),
+                "queued": sum(job.status == "queued" for job in self._active.values()),
+                "max_running": self.max_running,
+                "max_queued": self.max_queued,
+                "rejected": dict(self.rejected),
+                "jobs": len(self._jobs),
+            }
+
+    def _run(self, job: IngestJob) -> None:
+        _lower_thread_priority(self.nice)
+        try:
+            if not self._wait_for_slot(job):
+                return
+            try:
+                job.run()
+            finally:
+                self._slots.release()
+        finally:
+            with self._lock:
+                if self._active.get(job.collection_name) is job:
+                    del self._active[job.collection_name]
+                self._threads.pop(job.job_id, None)
+
+    def _wait_for_slot(self, job: IngestJob) -> bool:
+        """Wait until the job may run; False if it was cancelled or expired while queued."""
+        deadline = time.monotonic() + self.max_queue_seconds
+        while not self._slots.acquire(timeout=max(0.0, min(0.5, deadline - time.monotonic()))):
+            if job.progress.cancelled:
+                job.abandon("cancelled", "Ingesta cancelada antes de empezar.")
+                return False
+            if time.monotonic() >= deadline:
+                with self._lock:
+                    running = [other for other in self._active.values() if other.status == "running"]
+                    self._reject("queue_timeout", self._retry_after(running))
+                job.abandon(
+                    "failed",
+                    f"Ingesta descartada tras {self.max_queue_seconds:.0f}s en cola. Vuelve a enviarla más tarde.",
+                )
+                return False
+        return True
+
+    def _reject(self, reason: str, retry_after: float) -> AdmissionRejected:
+        """Count a rejection (called with the lock held)."""
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        record_rejection("ingest", reason)
+        return AdmissionRejected("ingest", reason, retry_after)
+
+    @staticmethod
+    def _retry_after(running: List[IngestJob]) -> float:
+        """Time until the first running job is expected to finish."""
+        etas = [job.progress.snapshot()["eta_seconds"] for job in running]
+        etas = [eta for eta in etas if eta is not None]
+        return min(etas) if etas else DEFAULT_INGEST_RETRY_AFTER
+
+    def _prune(self) -> None:
+        """Drop the oldest finished jobs beyond max_history."""
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(self._jobs) - self.max_history)]:
+            del self._jobs[job_id]
+
+
+def _lower_thread_priority(nice: int) -> None:
+    """Lower the CPU priority of the current thread (inherited by its threads and workers)."""
+    if nice <= 0:
+        return
+    try:
+        # on Linux the priority of a thread id only affects that thread
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), os.getpriority(os.PRIO_PROCESS, 0) + nice)
+    except (AttributeError, OSError) as exc:
+        LOGGER.debug("No se pudo bajar la prioridad del job de ingesta: %s", exc)
+
+
+# process-wide job manager
+_job_manager = IngestJobManager()
+
+
+def get_ingest_job_manager() -> IngestJobManager:
+    """Get the process-wide ingestion job manager."""
+    return _job_manager
@@ -0,0 +1,547 @@
+"""Document ingestion pipeline: load, clean, split, embed and index PDFs."""
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from app.core.config import Settings, load_settings
+from app.core.constants import (
+    DEFAULT_CHUNK_OVERLAP,
+    DEFAULT_CHUNK_SIZE,
+    INGEST_EMBED_BATCH_SIZE,
+    INGEST_QUEUE_SIZE,
+    INGEST_UPSERT_BATCH_SIZE,
+)
+from app.core.logger import get_logger
+from app.core.metrics import get_metrics_registry, stage_histogram, stage_timer, timed_iter
+from app.rag.embeddings import EmbeddingConfig, get_embedding_model
+from app.rag.lexical_index import build_lexical_index, lexical_index_path
+from app.rag.local_index import build_vector_index
+from app.rag.loader import iter_pdf_documents, list_pdf_files
+from app.rag.manifest import (
+    IngestManifest,
+    ManifestEntry,
+    chunk_id,
+    hash_file,
+    load_manifest,
+)
+from app.rag.pipeline import batched, threaded
+from app.rag.splitter import clean_documents, split_documents
+from app.rag.vectorstore import bump_collection_generation, get_vector_client
+
+LOGGER = get_logger(__name__)
+
+# max IDs sent to ChromaDB in a single delete call
+DELETE_BATCH_SIZE = 1000
+
+
+@dataclass
+class IngestionResult:
+    """Outcome of an ingestion run."""
+    message: str  # status message
+    documents_indexed: int  # number of chunks in the collection after the run
+    collection_name: str  # name of the ChromaDB collection
+    added: Optional[int] = None  # new files indexed (incremental mode)
+    updated: Optional[int] = None  # modified files re-indexed (incremental mode)
+    removed: Optional[int] = None  # deleted files removed from the index (incremental mode)
+    unchanged: Optional[int] = None  # files left untouched (incremental mode)
+
+
+class IngestionCancelled(Exception):
+    """Raised inside the pipeline when an ingestion run is cancelled."""
+
+
+class IngestProgress:
+    """
+    Progress of an ingestion run, shared with the pipeline threads.
+
+    The pipeline reports its stage, files and chunks here and checks for
+    cancellation between files and batches, where it also pauses while
+    interactive work is waiting (see yield_to); readers get a consistent
+    copy through snapshot().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._busy: Optional[Callable[[], bool]] = None
+        self._max_pause = 0.0
+        self.stage = "queued"
+        self.files_total = 0  # files to index in this run
+        self.files_done = 0  # files whose chunks are all written
+        self.chunks_total: Optional[int] = None  # known once every file is split
+        self.chunks_split = 0  # chunks produced so far
+        self.chunks_done = 0  # chunks written to the collection
+        self.started_at: Optional[float] = None  # monotonic time indexing started
+
+    def set_stage(self, stage: str) -> None:
+        with self._lock:
+            self.stage = stage
+
+    def start_indexing(self, files_total: int) -> None:
+        with self._lock:
+            self.stage = "indexing"
+            self.files_total = files_total
+            self.started_at = time.monotonic()
+
+    def add_split(self, chunks: int) -> None:
+        with self._lock:
+            self.chunks_split += chunks
+
+    def finish_split(self) -> None:
+        with self._lock:
+            self.chunks_total = self.chunks_split
+
+    def add_done(self, chunks: int = 0, files: int = 0) -> None:
+        with self._lock:
+            self.chunks_done += chunks
+            self.files_done += files
+
+    def cancel(self) -> None:
+        """Ask the pipeline to stop at the next file or batch."""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def yield_to(self, busy: Callable[[], bool], max_pause: float) -> None:
+        """Pause at each checkpoint while busy() is true, for at most max_pause seconds."""
+        self._busy = busy
+        self._max_pause = max_pause
+
+    def check_cancelled(self) -> None:
+        """Raise IngestionCancelled if cancellation was requested, after yielding to interactive work."""
+        if self._busy is not None:
+            deadline = time.monotonic() + self._max_pause
+            while self._busy() and time.monotonic() < deadline and not self._cancelled.wait(0.05):
+                pass
+        if self._cancelled.is_set():
+            raise IngestionCancelled("Ingesta cancelada")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the progress with throughput and estimated time remaining."""
+        with self._lock:
+            elapsed = time.monotonic() - self.started_at if self.started_at is not None else 0.0
+            throughput = self.chunks_done / elapsed if elapsed > 0 else 0.0
+            eta: Optional[float] = None
+            if self.stage == "indexing":
+                if self.chunks_total is not None and throughput > 0:
+                    eta = (self.chunks_total - self.chunks_done) / throughput
+                elif 0 < self.files_done < self.files_total:
+                    # extrapolate from the files completed so far
+                    eta = elapsed * (self.files_total / self.files_done - 1)
+            return {
+                "stage": self.stage,
+                "files_total": self.files_total,
+                "files_done": self.files_done,
+                "chunks_total": self.chunks_total,
+                "chunks_done": self.chunks_done,
+                "chunks_per_second": round(throughput, 2),
+                "eta_seconds": round(eta, 1) if eta is not None else None,
+            }
+
+
+def filter_metadata(documents: List[Document]) -> List[Document]:
+    """Keep only metadata values ChromaDB supports (str, int, float, bool, None)."""
+    try:
+        from langchain_community.vectorstores.utils import filter_complex_metadata
+        return filter_complex_metadata(documents)
+    except ImportError:
+        # manual filtering if utility not available
+        filtered_docs = []
+        for doc in documents:
+            clean_meta = {}
+            for k, v in (doc.metadata or {}).items():
+                if isinstance(v, (str, int, float, bool)) or v is None:
+                    clean_meta[k] = v
+            filtered_docs.append(
+                type(doc)(page_content=doc.page_content, metadata=clean_meta)
+            )
+        return filtered_docs
+
+
+def run_ingestion(
+    settings: Optional[Settings] = None,
+    force: bool = False,
+    incremental: bool = False,
+    progress: Optional[IngestProgress] = None,
+) -> IngestionResult:
+    """
+    Index the PDFs of data/pdfs into ChromaDB (or the in-process index).
+
+    If the run fails or is cancelled, the manifest still records the files
+    that were completely written, so a later incremental run resumes from there.
+
+    Args:
+        settings: Application settings
+        force: Delete the collection and re-index everything
+        incremental: Only index new or modified files and remove chunks of
+            deleted or modified files, using the source manifest
+        progress: Optional progress tracker, also used to cancel the run
+
+    Returns:
+        Ingestion result with chunk and file counts
+
+    Raises:
+        FileNotFoundError: If there are no PDF files to index
+        IngestionCancelled: If the run was cancelled through progress
+    """
+    # load settings if not provided
+    settings = settings or load_settings()
+    progress = progress or IngestProgress()
+    progress.set_stage("preparing")
+    # get ChromaDB HTTP client connection (or the in-process index client)
+    client = get_vector_client(settings)
+
+    pdf_paths = list_pdf_files()
+    if not pdf_paths:
+        raise FileNotFoundError("No se encontraron archivos PDF en el directorio data/pdfs")
+
+    # get the embedding model that will convert text chunks to vectors
+    embedding_config = get_embedding_model()
+
+    # store metadata about the ingestion process in the collection
+    # this helps track which embedding model and chunking params were used
+    collection_metadata = {
+        "embedding_model": embedding_config.identifier,
+        "chunk_size": DEFAULT_CHUNK_SIZE,
+        "chunk_overlap": DEFAULT_CHUNK_OVERLAP,
+    }
+
+    # check if collection already exists in ChromaDB
+    collection = client.get_or_create_collection(
+        name=settings.chroma_collection,
+        metadata=collection_metadata,
+    )
+    existing_count = collection.count()
+
+    if incremental and not force:
+        return _run_incremental(
+            client, settings, embedding_config, collection_metadata, pdf_paths, existing_count,
+            progress,
+        )
+
+    # if collection has documents and force is false, return early
+    if existing_count > 0 and not force:
+        # collections indexed before hybrid search existed get their lexical index now
+        if not lexical_index_path(settings.chroma_collection).exists():
+            progress.set_stage("lexical")
+            build_lexical_index(collection, settings.chroma_collection)
+        return IngestionResult(
+            message=f"La colección '{settings.chroma_collection}' ya contiene {existing_count} vectores. "
+                    "Usa force=true para regenerarla o incremental=true para actualizarla.",
+            documents_indexed=existing_count,
+            collection_name=settings.chroma_collection,
+        )
+
+    # if force is true, delete existing collection and create a new one
+    if existing_count > 0:
+        progress.set_stage("removing")
+        _reset_collection(client, settings, collection_metadata)
+
+    manifest = _new_manifest(settings, embedding_config)
+    try:
+        _index_files(
+            client, settings, embedding_config, collection_metadata, pdf_paths, manifest, progress
+        )
+        collection = client.get_collection(settings.chroma_collection)
+        progress.set_stage("lexical")
+        build_lexical_index(collection, settings.chroma_collection)
+        progress.set_stage("vector_index")
+        build_vector_index(collection)
+    finally:
+        manifest.save()
+        # invalidate caches built on the previous contents of the collection
+        bump_collection_generation()
+    progress.set_stage("finished")
+
+    # verify the final count of indexed documents
+    indexed_count = client.get_collection(settings.chroma_collection).count()
+    return IngestionResult(
+        message=f"Ingesta completada exitosamente. {indexed_count} chunks indexados.",
+        documents_indexed=indexed_count,
+        collection_name=settings.chroma_collection,
+    )
+
+
+def _run_incremental(
+    client: Any,
+    settings: Settings,
+    embedding_config: EmbeddingConfig,
+    collection_metadata: Dict[str, Any],
+    pdf_paths: List[Path],
+    existing_count: int,
+    progress: IngestProgress,
+) -> IngestionResult:
+    """Sync the collection with data/pdfs, touching only changed files."""
+    manifest = load_manifest(settings.chroma_collection)
+    compatible = manifest is not None and manifest.is_compatible(
+        embedding_config.identifier, DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP
+    )
+    if not compatible:
+        if existing_count > 0:
+            # chunks indexed without a usable manifest cannot be matched to files
+            LOGGER.warning(
+                "Sin manifest compatible para '%s': se reconstruye la colección completa",
+                settings.chroma_collection,
+            )
+            progress.set_stage("removing")
+            _reset_collection(client, settings, collection_metadata)
+        manifest = _new_manifest(settings, embedding_config)
+    elif existing_count == 0:
+        # the collection was emptied outside of /ingest: nothing in the manifest is indexed
+        manifest.files.clear()
+
+    current_hashes = {path.name: hash_file(path) for path in pdf_paths}
+    removed = sorted(name for name in manifest.files if name not in current_hashes)
+    added = sorted(name for name in current_hashes if name not in manifest.files)
+    updated = sorted(
+        name for name, sha256 in current_hashes.items()
+        if name in manifest.files and manifest.files[name].sha256 != sha256
+    )
+    unchanged = len(current_hashes) - len(added) - len(updated)
+
+    # delete the chunks of removed and modified files
+    progress.set_stage("removing")
+    stale_ids = [
+        chunk
+        for name in removed + updated
+        for chunk in manifest.files.pop(name).chunk_ids
+    ]
+    collection = client.get_collection(settings.chroma_collection)
+    for start in range(0, len(stale_ids), DELETE_BATCH_SIZE):
+        collection.delete(ids=stale_ids[start:start + DELETE_BATCH_SIZE])
+
+    changed = set(added) | set(updated)
+    to_index = [path for path in pdf_paths if path.name in changed]
+    try:
+        if to_index:
+            _index_files(
+                client, settings, embedding_config, collection_metadata, to_index, manifest,
+                progress, file_hashes=current_hashes,
+            )
+        if stale_ids or to_index or not lexical_index_path(settings.chroma_collection).exists():
+            progress.set_stage("lexical")
+            build_lexical_index(collection, settings.chroma_collection)
+        if stale_ids or to_index:
+            progress.set_stage("vector_index")
+            build_vector_index(collection)
+    finally:
+        manifest.save()
+        if stale_ids or to_index:
+            # invalidate caches built on the previous contents of the collection
+            bump_collection_generation()
+    progress.set_stage("finished")
+
+    indexed_count = collection.count()
+    return IngestionResult(
+        message=(
+            f"Ingesta incremental completada. {len(added)} nuevos, {len(updated)} modificados, "
+            f"{len(removed)} eliminados, {unchanged} sin cambios. {indexed_count} chunks indexados."
+        ),
+        documents_indexed=indexed_count,
+        collection_name=settings.chroma_collection,
+        added=len(added),
+        updated=len(updated),
+        removed=len(removed),
+        unchanged=unchanged,
+    )
+
+
+def _new_manifest(settings: Settings, embedding_config: EmbeddingConfig) -> IngestManifest:
+    """Create an empty manifest for the current ingestion parameters."""
+    return IngestManifest(
+        collection=settings.chroma_collection,
+        embedding_model=embedding_config.identifier,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        chunk_overlap=DEFAULT_CHUNK_OVERLAP,
+    )
+
+
+def _reset_collection(client: Any, settings: Settings, collection_metadata: Dict[str, Any]) -> None:
+    """Delete and recreate the collection."""
+    client.delete_collection(settings.chroma_collection)
+    client.create_collection(
+        name=settings.chroma_collection,
+        metadata=collection_metadata,
+    )
+    # cached vectorstores, retrievers and answers now point to stale data
+    bump_collection_generation()
+
+
+def _index_files(
+    client: Any,
+    settings: Settings,
+    embedding_config: EmbeddingConfig,
+    collection_metadata: Dict[str, Any],
+    pdf_paths: List[Path],
+    manifest: IngestManifest,
+    progress: IngestProgress,
+    file_hashes: Optional[Dict[str, str]] = None,
+) -> None:
+    """
+    Stream the given files into the collection, recording them in the manifest.
+
+    Pages flow through load -> clean -> split -> embed -> upsert one file and one
+    batch at a time. Loading/splitting and embedding run in their own threads
+    connected by bounded queues, so peak memory depends on the batch sizes and
+    the largest file rather than on the whole corpus. Only files whose chunks
+    were all written are recorded, even if the run stops half-way.
+    """
+    collection = client.get_or_create_collection(
+        name=settings.chroma_collection,
+        metadata=collection_metadata,
+        embedding_function=None,
+    )
+    tracker = _FileTracker(progress)
+    sink = _ChromaSink(collection, _upsert_batch_size(client), tracker)
+    progress.start_indexing(len(pdf_paths))
+
+    try:
+        chunk_batches = batched(_iter_chunks(pdf_paths, tracker), INGEST_EMBED_BATCH_SIZE)
+        embedded_batches = (
+            _embed_batch(embedding_config.embedding, batch)
+            for batch in threaded(chunk_batches, INGEST_QUEUE_SIZE, name="ingest-split")
+        )
+        for batch in threaded(embedded_batches, INGEST_QUEUE_SIZE, name="ingest-embed"):
+            sink.write(batch)
+        sink.flush()
+    finally:
+        # record the files that were completely written, including files without chunks
+        for path in pdf_paths:
+            if path.name not in tracker.completed:
+                continue
+            sha256 = (file_hashes or {}).get(path.name) or hash_file(path)
+            manifest.files[path.name] = ManifestEntry(
+                sha256=sha256,
+                chunk_ids=tracker.chunk_ids.get(path.name, []),
+            )
+        LOGGER.info("%s chunks escritos en '%s'", sink.written, settings.chroma_collection)
+
+
+def _iter_chunks(pdf_paths: List[Path], tracker: "_FileTracker") -> Iterator[Tuple[str, Document]]:
+    """Yield (chunk ID, chunk) pairs, one file at a time."""
+    pages = get_metrics_registry().counter("ingest_pages_total", "PDF pages loaded by ingestion")
+    # the loader yields one list of pages per file, in order (load time is observed per file)
+    loaded = timed_iter(iter_pdf_documents(pdf_paths), stage_histogram("ingest", "load"))
+    for path, file_docs in zip(pdf_paths, loaded):
+        tracker.progress.check_cancelled()
+        pages.inc(len(file_docs))
+        # clean documents: normalize text, remove headers, combine short pages
+        with stage_timer("ingest", "clean"):
+            cleaned_docs = clean_documents(file_docs)
+
+        # split documents into chunks using RecursiveCharacterTextSplitter
+        # chunks are sized according to DEFAULT_CHUNK_SIZE with DEFAULT_CHUNK_OVERLAP
+        with stage_timer("ingest", "split"):
+            split_docs = split_documents(
+                cleaned_docs,
+                chunk_size=DEFAULT_CHUNK_SIZE,
+                chunk_overlap=DEFAULT_CHUNK_OVERLAP,
+            )
+
+        # filter metadata to ensure ChromaDB compatibility
+        # all chunks come from the same file, so the ordinal counts chunks within it
+        filtered_docs = filter_metadata(split_docs)
+        for ordinal, doc in enumerate(filtered_docs):
+            yield chunk_id(doc, ordinal), doc
+        tracker.split(path.name, len(filtered_docs))
+    tracker.progress.finish_split()
+
+
+def _embed_batch(
+    embedding: Embeddings, batch: List[Tuple[str, Document]]
+) -> List[Tuple[str, Document, List[float]]]:
+    """Embed a batch of chunks."""
+    with stage_timer("ingest", "embed"):
+        vectors = embedding.embed_documents([doc.page_content for _, doc in batch])
+    return [(doc_id, doc, vector) for (doc_id, doc), vector in zip(batch, vectors)]
+
+
+def _upsert_batch_size(client: Any) -> int:
+    """Return the upsert batch size, capped by the server's max batch size."""
+    try:
+        return max(1, min(INGEST_UPSERT_BATCH_SIZE, client.get_max_batch_size()))
+    except Exception:
+        return max(1, INGEST_UPSERT_BATCH_SIZE)
+
+
+class _FileTracker:
+    """
+    Track which files have all their chunks written.
+
+    The split thread reports how many chunks each file produced and the sink
+    reports the chunks it wrote; a file is complete once both counts match.
+    """
+
+    def __init__(self, progress: IngestProgress):
+        self.progress = progress
+        self.chunk_ids: Dict[str, List[str]] = {}
+        self.completed: set = set()
+        self._expected: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def split(self, source: str, chunks: int) -> None:
+        with self._lock:
+            self._expected[source] = chunks
+            self.chunk_ids.setdefault(source, [])
+            self._check(source)
+        self.progress.add_split(chunks)
+
+    def written(self, rows: List[Tuple[str, Document, List[float]]]) -> None:
+        with self._lock:
+            for doc_id, doc, _ in rows:
+                source = doc.metadata.get("source", "unknown")
+                self.chunk_ids.setdefault(source, []).append(doc_id)
+            for source in {doc.metadata.get("source", "unknown") for _, doc, _ in rows}:
+                self._check(source)
+        self.progress.add_done(chunks=len(rows))
+
+    def _check(self, source: str) -> None:
+        if source in self.completed or source not in self._expected:
+            return
+        if len(self.chunk_ids.get(source, [])) >= self._expected[source]:
+            self.completed.add(source)
+            self.progress.add_done(files=1)
+
+
+class _ChromaSink:
+    """Buffer embedded chunks and upsert them into a collection in fixed-size batches."""
+
+    def __init__(self, collection: Any, batch_size: int, tracker: _FileTracker):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.tracker = tracker
+        self.written = 0
+        self._buffer: List[Tuple[str, Document, List[float]]] = []
+
+    def write(self, batch: List[Tuple[str, Document, List[float]]]) -> None:
+        """Add embedded chunks, upserting every full batch."""
+        self._buffer.extend(batch)
+        while len(self._buffer) >= self.batch_size:
+            self.tracker.progress.check_cancelled()
+            self._upsert(self._buffer[:self.batch_size])
+            self._buffer = self._buffer[self.batch_size:]
+
+    def flush(self) -> None:
+        """Upsert the remaining chunks."""
+        if self._buffer:
+            self._upsert(self._buffer)
+            self._buffer = []
+
+    def _upsert(self, rows: List[Tuple[str, Document, List[float]]]) -> None:
+        with stage_timer("ingest", "upsert"):
+            self.collection.upsert(
+                ids=[doc_id for doc_id, _, _ in rows],
+                embeddings=[list(map(float, vector)) for _, _, vector in rows],
+                metadatas=[doc.metadata for _, doc, _ in rows],
+                documents=[doc.page_content for _, doc, _ in rows],
+            )
+        get_metrics_registry().counter("ingest_chunks_total", "Chunks written by ingestion").inc(len(rows))
+        self.tracker.written(rows)
+        self.written += len(rows)
@@ -0,0 +1,251 @@
+"""BM25 inverted index over chunk texts for lexical retrieval."""
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.constants import LEXICAL_INDEX_DIR
+from app.core.logger import get_logger
+from app.core.metrics import stage_timer
+from app.rag.embedding_cache import _safe_name
+
+LOGGER = get_logger(__name__)
+
+INDEX_VERSION = 1
+# chunks read from the collection per request while building the index
+READ_BATCH_SIZE = 1000
+
+# BM25 parameters (standard Okapi defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# numbers (with a decimal part) and words are separate tokens, so "500mg"
+# matches "500 mg" and "0,5" matches "0.5"
+_TOKEN_PATTERN = re.compile(r"\d+(?:[.,]\d+)?|[a-z]+")
+
+# common Spanish function words, accent-folded
+SPANISH_STOPWORDS = frozenset(
+    """
+    a al algo algun alguna algunas alguno algunos ante antes como con contra cual cuales
+    cuando de del desde donde durante e el ella ellas ellos en entre era eran es esa esas
+    ese eso esos esta estan estas este esto estos fue fueron ha han hasta hay la las le les
+    lo los mas me mi mis mucho muy ni no nos o os otra otras otro otros para pero poco por
+    porque que quien se sea sean ser si sin sobre su sus tambien tan te tiene tienen todo
+    todos tu tus u un una unas uno unos y ya yo
+    """.split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split Spanish text into index terms.
+
+    Text is lowercased and accent-folded (so "lesión" matches "lesion"),
+    stopwords are dropped and plural endings are stripped ("quemaduras" ->
+    "quemadura", "lesiones" -> "lesion"). Numbers keep their decimal part.
+    """
+    folded = unicodedata.normalize("NFKD", text.lower())
+    folded = "".join(char for char in folded if not unicodedata.combining(char))
+    terms = []
+    for token in _TOKEN_PATTERN.findall(folded):
+        if token[0].isdigit():
+            terms.append(token.replace(",", "."))
+            continue
+        if token in SPANISH_STOPWORDS:
+            continue
+        terms.append(_stem(token))
+    return terms
+
+
+def _stem(token: str) -> str:
+    """Strip Spanish plural endings from a word."""
+    if len(token) > 5 and token.endswith("es") and token[-3] not in "aeiou":
+        return token[:-2]
+    if len(token) > 3 and token.endswith("s"):
+        return token[:-1]
+    return token
+
+
+class LexicalIndex:
+    """
+    Read-only BM25 index of a collection.
+
+    Postings are stored as flat arrays sorted by term: the postings of term t
+    are docs[offsets[t]:offsets[t + 1]] with their term frequencies in tfs.
+    A search scores only the postings of the query terms, with NumPy.
+    """
+
+    def __init__(
+        self,
+        ids: List[str],
+        terms: List[str],
+        offsets: np.ndarray,
+        docs: np.ndarray,
+        tfs: np.ndarray,
+        doc_lengths: np.ndarray,
+    ):
+        self.ids = ids  # chunk ID of each document
+        self.terms = {term: index for index, term in enumerate(terms)}
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.average_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        # BM25 length normalization of every document, shared by all queries
+        self._norms = BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths / max(self.average_length, 1e-9))
+
+    @classmethod
+    def build(cls, chunks: Iterable[Tuple[str, str]]) -> "LexicalIndex":
+        """Build the index from (chunk ID, text) pairs."""
+        ids: List[str] = []
+        lengths: List[int] = []
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        for doc_index, (doc_id, text) in enumerate(chunks):
+            counts = Counter(tokenize(text))
+            ids.append(doc_id)
+            lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                postings.setdefault(term, []).append((doc_index, count))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[term]) for term in terms])
+        docs = np.empty(int(offsets[-1]), dtype=np.uint32)
+        tfs = np.empty(int(offsets[-1]), dtype=np.uint16)
+        for index, term in enumerate(terms):
+            entries = np.asarray(postings[term], dtype=np.int64)
+            docs[offsets[index]:offsets[index + 1]] = entries[:, 0]
+            tfs[offsets[index]:offsets[index + 1]] = np.minimum(entries[:, 1], np.iinfo(np.uint16).max)
+        return cls(ids, terms, offsets, docs, tfs, np.asarray(lengths, dtype=np.uint32))
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """Return the k best (chunk ID, BM25 score) pairs for a query."""
+        query_terms = [self.terms[term] for term in set(tokenize(query)) if term in self.terms]
+        if not query_terms or k <= 0:
+            return []
+
+        total = len(self.ids)
+        norms = self._norms
+        scores = np.zeros(total, dtype=np.float32)
+        for term in query_terms:
+            start, end = self.offsets[term], self.offsets[term + 1]
+            docs, tfs = self.docs[start:end], self.tfs[start:end].astype(np.float32)
+            idf = np.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += idf * tfs * (BM25_K1 + 1) / (tfs + norms[docs])
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(self.ids[index], float(scores[index])) for index in matched]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": len(self.ids),
+            "terms": len(self.terms),
+            "postings": len(self.docs),
+        }
+
+    def save(self, path: Path) -> None:
+        """Write the index atomically as a compressed .npz file."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        terms = sorted(self.terms, key=self.terms.get)
+        tmp_path = path.with_name(f".{path.stem}.tmp.npz")
+        np.savez_compressed(
+            tmp_path,
+            version=np.array(INDEX_VERSION),
+            ids=_encode_strings(self.ids),
+            terms=_encode_strings(terms),
+            offsets=self.offsets,
+            docs=self.docs,
+            tfs=self.tfs,
+            doc_lengths=self.doc_lengths,
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["LexicalIndex"]:
+        """Load an index (None if missing, unreadable or from another version)."""
+        if not path.exists():
+            return None
+        try:
+            with np.load(path) as data:
+                if int(data["version"]) != INDEX_VERSION:
+                    return None
+                return cls(
+                    ids=_decode_strings(data["ids"]),
+                    terms=_decode_strings(data["terms"]),
+                    offsets=data["offsets"],
+                    docs=data["docs"],
+                    tfs=data["tfs"],
+                    doc_lengths=data["doc_lengths"],
+                )
+        except (OSError, KeyError, ValueError) as exc:
+            LOGGER.warning("Índice léxico ilegible (%s), se ignorará: %s", path, exc)
+            return None
+
+
+def lexical_index_path(collection: str, directory: Path = LEXICAL_INDEX_DIR) -> Path:
+    """Return the index path of a collection."""
+    return directory / f"{_safe_name(collection)}.npz"
+
+
+def build_lexical_index(collection: Any, name: str, directory: Path = LEXICAL_INDEX_DIR) -> LexicalIndex:
+    """
+    Build and save the BM25 index of every chunk in a collection.
+
+    Reads the chunk texts back from the collection (ChromaDB or the in-process
+    index), so full and incremental ingestion runs produce the same index.
+    """
+    def iter_chunks() -> Iterable[Tuple[str, str]]:
+        offset = 0
+        while True:
+            page = collection.get(include=["documents"], limit=READ_BATCH_SIZE, offset=offset)
+            if not page["ids"]:
+                return
+            yield from zip(page["ids"], page["documents"])
+            offset += len(page["ids"])
+
+    with stage_timer("ingest", "lexical"):
+        index = LexicalIndex.build(iter_chunks())
+        index.save(lexical_index_path(name, directory))
+    LOGGER.info("Índice léxico de '%s': %s", name, index.stats())
+    return index
+
+
+# loaded indexes by collection, with the file mtime they were read at
+_loaded: Dict[str, Tuple[float, LexicalIndex]] = {}
+_loaded_lock = threading.Lock()
+
+
+def get_lexical_index(collection: str, directory: Path = LEXICAL_INDEX_DIR) -> Optional[LexicalIndex]:
+    """Get the index of a collection, reloading it after /ingest rewrote it (None if missing)."""
+    path = lexical_index_path(collection, directory)
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    with _loaded_lock:
+        cached = _loaded.get(str(path))
+        if cached is None or cached[0] != mtime:
+            index = LexicalIndex.load(path)
+            if index is None:
+                return None
+            cached = (mtime, index)
+            _loaded[str(path)] = cached
+        return cached[1]
+
+
+def _encode_strings(values: List[str]) -> np.ndarray:
+    """Pack strings into a uint8 array (newline-separated UTF-8)."""
+    return np.frombuffer("\n".join(values).encode("utf-8"), dtype=np.uint8)
+
+
+def _decode_strings(data: np.ndarray) -> List[str]:
+    text = data.tobytes().decode("utf-8")
+    return text.split("\n") if text else []
@@ -1,13 +1,23 @@
 """LLM chain configuration and prompt engineering."""
+import threading
+import time
 from enum import Enum
-from typing import Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from uuid import UUID
 
 # langchain imports - compatible with multiple versions
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.documents import Document
+from langchain_core.messages import BaseMessage
+from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import PromptTemplate
 
 # for LangChain 1.0+, chains are imported from langchain.chains directly
 # LangChain 1.0+ uses a different structure - chains are in langchain.chains
 from langchain.chains import ConversationalRetrievalChain, RetrievalQA
+from langchain.chains.conversational_retrieval.prompts import CONDENSE_QUESTION_PROMPT
+from langchain.chains.llm import LLMChain
+from langchain.chains.question_answering import load_qa_chain
 
 try:
     from langchain_google_genai import ChatGoogleGenerativeAI
@@ -16,8 +26,14 @@ except ImportError as exc:
         "langchain-google-genai no está instalado. Ejecuta: pip install langchain-google-genai"
     ) from exc
 
-from app.core.config import Settings, load_settings
+from app.core.config import Settings, get_settings
+from app.core.constants import CONDENSE_MODEL_NAME, LLM_FALLBACK_MODEL_NAME, LLM_TIMEOUT_SECONDS
+from app.core.metrics import get_metrics_registry, stage_histogram
+from app.rag.condense import StandaloneQuestionGenerator
+from app.rag.context_packing import ContextPackingRetriever, pack_documents
 from app.rag.memory import build_memory, get_memory
+from app.rag.resilient_llm import ResilientChatModel
+from app.rag.vectorstore import get_collection_generation
 from app.core.logger import get_logger
 
 LOGGER = get_logger(__name__)
@@ -340,13 +356,77 @@ Sub-problema 2: [Sub-pregunta 2]
 """.strip()
 
 
-def get_llm(model_name: Optional[str] = None, temperature: float = 0.2, settings: Optional[Settings] = None) -> ChatGoogleGenerativeAI:
-    """Initialize and return Gemini LLM client."""
-    # load settings if not provided
-    settings = settings or load_settings()
-    # use provided model name or fall back to settings default
-    resolved_model = model_name or settings.llm_model_name
-    
+class StageTimer(BaseCallbackHandler):
+    """
+    Callback observing the duration of a chain in the stage latency histogram.
+
+    Attached to a chain (not passed at invocation), so it only sees that
+    chain's own runs and not the runs of its children.
+    """
+
+    run_inline = True  # record timings in the calling task, not an executor
+
+    def __init__(self, stage: str, pipeline: str = "ask"):
+        self.histogram = stage_histogram(pipeline, stage)
+        self._started: Dict[UUID, float] = {}
+
+    def on_chain_start(self, serialized: Any, inputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id)
+
+    def _finish(self, run_id: UUID) -> None:
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            self.histogram.observe(time.perf_counter() - started)
+
+
+class LLMUsageRecorder(BaseCallbackHandler):
+    """Callback recording the latency and reported token usage of every LLM call."""
+
+    run_inline = True
+
+    def __init__(self, model: str):
+        metrics = get_metrics_registry()
+        self.latency = metrics.histogram("llm_call_duration_seconds", "Latency of LLM calls", model=model)
+        self.prompt_tokens = metrics.counter(
+            "llm_usage_tokens_total", "Tokens billed by the LLM provider", model=model, kind="prompt"
+        )
+        self.completion_tokens = metrics.counter(
+            "llm_usage_tokens_total", "Tokens billed by the LLM provider", model=model, kind="completion"
+        )
+        self._started: Dict[UUID, float] = {}
+
+    def on_chat_model_start(self, serialized: Any, messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized: Any, prompts: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id)
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    self.prompt_tokens.inc(usage.get("input_tokens", 0))
+                    self.completion_tokens.inc(usage.get("output_tokens", 0))
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id)
+
+    def _finish(self, run_id: UUID) -> None:
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            self.latency.observe(time.perf_counter() - started)
+
+
+def _create_llm(resolved_model: str, temperature: float, settings: Settings) -> ChatGoogleGenerativeAI:
+    """Create a new Gemini LLM client."""
     # validate that API key is configured
     if not settings.llm_api_key:
         raise RuntimeError(
@@ -362,10 +442,18 @@ def get_llm(model_name: Optional[str] = None, temperature: float = 0.2, settings
         
         # create the Gemini LLM client with specified model and temperature
         # temperature controls randomness: lower = more deterministic, higher = more creative
+        # the client timeout bounds sync calls; retries are done by ResilientChatModel,
+        # so the client's own retries are turned off instead of multiplying with them
+        client_kwargs: Dict[str, Any] = {"timeout": LLM_TIMEOUT_SECONDS, "max_retries": 1}
+        if settings.llm_api_base:
+            # custom endpoint (e.g. the latency-injecting stub in benchmarks/llm_stub.py)
+            client_kwargs.update(client_options={"api_endpoint": settings.llm_api_base}, transport="rest")
         llm = ChatGoogleGenerativeAI(
             model=model_to_use,
             temperature=temperature,
             google_api_key=settings.llm_api_key,
+            callbacks=[LLMUsageRecorder(model_to_use)],
+            **client_kwargs,
         )
         
         return llm
@@ -383,8 +471,8 @@ def get_llm(model_name: Optional[str] = None, temperature: float = 0.2, settings
         ) from exc
 
 
-def get_prompt(prompt_type: PromptType = PromptType.DEFAULT) -> PromptTemplate:
-    """Get the configured prompt template for the LLM based on prompt type."""
+def _compile_prompt(prompt_type: PromptType) -> PromptTemplate:
+    """Build the prompt template for a prompt type."""
     # select template based on prompt type
     template_map = {
         PromptType.DEFAULT: DEFAULT_TEMPLATE,
@@ -408,6 +496,240 @@ def get_prompt(prompt_type: PromptType = PromptType.DEFAULT) -> PromptTemplate:
     )
 
 
+class ChainRegistry:
+    """
+    Process-wide cache of LLM clients, prompts and prebuilt chains.
+
+    Creating a ChatGoogleGenerativeAI opens its own transport and compiling a
+    PromptTemplate parses the template, so both are done once and shared.
+    Stateless pieces (the "stuff" documents chain, the condense-question chain
+    and RetrievalQA chains) are reused as-is; conversational chains only need
+    a cheap wrapper per request because each one carries its own memory.
+
+    Chains built on a retriever are dropped when the collection generation
+    changes: /ingest makes the resource registry build a new retriever, and
+    the cached chains would otherwise keep every old retriever (and its
+    vectorstore and index handles) alive.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # one client per (model, temperature, api key)
+        self._llms: Dict[Tuple[str, float, Optional[str]], ResilientChatModel] = {}
+        # prompts are immutable, so every prompt type is compiled up front
+        self._prompts: Dict[PromptType, PromptTemplate] = {
+            prompt_type: _compile_prompt(prompt_type) for prompt_type in PromptType
+        }
+        self._combine_docs_chains: Dict[tuple, Any] = {}
+        self._question_generators: Dict[tuple, StandaloneQuestionGenerator] = {}
+        # chains holding a retriever, valid for one collection generation
+        self._retrieval_qa_chains: Dict[tuple, RetrievalQA] = {}
+        self._packing_retrievers: Dict[tuple, ContextPackingRetriever] = {}
+        self._generation = get_collection_generation()
+        self._runnables: Dict[tuple, Any] = {}
+        # counters reported by stats()
+        self._llm_hits = 0
+        self._llm_misses = 0
+        self._chain_hits = 0
+        self._chain_misses = 0
+        self._setup_count = 0
+        self._setup_seconds_total = 0.0
+        self._setup_seconds_max = 0.0
+
+    def get_llm(
+        self,
+        model_name: Optional[str] = None,
+        temperature: float = 0.2,
+        settings: Optional[Settings] = None,
+    ) -> ResilientChatModel:
+        """Return the shared LLM client for a model and temperature (with deadlines, retries and fallback)."""
+        settings = settings or get_settings()
+        # use provided model name or fall back to settings default
+        resolved_model = model_name or settings.llm_model_name
+        key = (resolved_model, temperature, settings.llm_api_key)
+
+        with self._lock:
+            llm = self._llms.get(key)
+            if llm is not None:
+                self._llm_hits += 1
+                return llm
+            self._llm_misses += 1
+            fallback = None
+            if LLM_FALLBACK_MODEL_NAME and LLM_FALLBACK_MODEL_NAME != resolved_model.replace("models/", ""):
+                fallback = _create_llm(LLM_FALLBACK_MODEL_NAME, temperature, settings)
+            llm = ResilientChatModel(primary=_create_llm(resolved_model, temperature, settings), fallback=fallback)
+            self._llms[key] = llm
+            LOGGER.info(
+                "Cliente LLM creado: model=%s fallback=%s temperature=%s",
+                resolved_model, LLM_FALLBACK_MODEL_NAME if fallback is not None else None, temperature,
+            )
+            return llm
+
+    def get_prompt(self, prompt_type: PromptType = PromptType.DEFAULT) -> PromptTemplate:
+        """Return the precompiled prompt for a prompt type."""
+        return self._prompts.get(prompt_type, self._prompts[PromptType.DEFAULT])
+
+    def _get_or_build(self, cache: Dict[tuple, Any], key: tuple, build) -> Any:
+        """Return a cached chain or build and store it."""
+        with self._lock:
+            self._check_generation()
+            chain = cache.get(key)
+            if chain is not None:
+                self._chain_hits += 1
+                return chain
+        # build outside the lock: it may create an LLM client
+        chain = build()
+        with self._lock:
+            self._check_generation()
+            self._chain_misses += 1
+            return cache.setdefault(key, chain)
+
+    def _check_generation(self) -> None:
+        """Drop the chains built on retrievers of an older collection (called with the lock held)."""
+        generation = get_collection_generation()
+        if generation != self._generation:
+            self._generation = generation
+            self._retrieval_qa_chains.clear()
+            self._packing_retrievers.clear()
+
+    def combine_docs_chain(self, llm: ResilientChatModel, prompt_type: PromptType) -> Any:
+        """Return the shared "stuff" chain for an LLM and prompt type."""
+        # chain_type="stuff" means all retrieved documents are concatenated into the prompt
+        return self._get_or_build(
+            self._combine_docs_chains,
+            (id(llm), prompt_type),
+            lambda: load_qa_chain(
+                llm,
+                chain_type="stuff",
+                prompt=self.get_prompt(prompt_type),
+                callbacks=[StageTimer("generate")],
+            ),
+        )
+
+    def question_generator(self, settings: Optional[Settings] = None) -> StandaloneQuestionGenerator:
+        """
+        Return the shared chain that condenses follow-ups into standalone questions.
+
+        Self-contained questions skip the LLM call; the rewrites still needed
+        run on CONDENSE_MODEL_NAME (temperature 0, so they can be cached).
+        """
+        llm = self.get_llm(model_name=CONDENSE_MODEL_NAME or None, temperature=0.0, settings=settings)
+        return self._get_or_build(
+            self._question_generators,
+            (id(llm),),
+            lambda: StandaloneQuestionGenerator(
+                llm_chain=LLMChain(llm=llm, prompt=CONDENSE_QUESTION_PROMPT, callbacks=[StageTimer("condense")])
+            ),
+        )
+
+    def answer_runnable(self, llm: ResilientChatModel, prompt_type: PromptType) -> Any:
+        """Return the shared prompt | llm | parser runnable used for streaming answers."""
+        return self._get_or_build(
+            self._runnables,
+            ("answer", id(llm), prompt_type),
+            lambda: self.get_prompt(prompt_type) | llm | StrOutputParser(),
+        )
+
+    def packing_retriever(self, retriever) -> ContextPackingRetriever:
+        """Return the shared wrapper that packs a retriever's chunks before the "stuff" chain."""
+        return self._get_or_build(
+            self._packing_retrievers,
+            (id(retriever),),
+            lambda: ContextPackingRetriever(retriever=retriever),
+        )
+
+    def retrieval_qa_chain(
+        self,
+        retriever,
+        model_name: Optional[str] = None,
+        settings: Optional[Settings] = None,
+        prompt_type: PromptType = PromptType.DEFAULT,
+    ) -> RetrievalQA:
+        """Return a RetrievalQA chain, reused across requests (it holds no state)."""
+        started = time.perf_counter()
+        llm = self.get_llm(model_name=model_name, settings=settings)
+        combine_docs_chain = self.combine_docs_chain(llm, prompt_type)
+        # the retriever is kept in the chain, so its id cannot be reused while cached;
+        # entries are dropped with the collection generation that retriever was built for
+        chain = self._get_or_build(
+            self._retrieval_qa_chains,
+            (id(retriever), id(llm), prompt_type),
+            lambda: RetrievalQA(
+                combine_documents_chain=combine_docs_chain,
+                retriever=self.packing_retriever(retriever),
+                return_source_documents=True,
+            ),
+        )
+        self._record_setup(time.perf_counter() - started)
+        return chain
+
+    def conversational_chain(
+        self,
+        retriever,
+        memory,
+        model_name: Optional[str] = None,
+        verbose: bool = True,
+        settings: Optional[Settings] = None,
+        prompt_type: PromptType = PromptType.DEFAULT,
+    ) -> ConversationalRetrievalChain:
+        """Assemble a ConversationalRetrievalChain from shared sub-chains."""
+        started = time.perf_counter()
+        llm = self.get_llm(model_name=model_name, settings=settings)
+        chain = ConversationalRetrievalChain(
+            retriever=self.packing_retriever(retriever),
+            memory=memory,
+            combine_docs_chain=self.combine_docs_chain(llm, prompt_type),
+            question_generator=self.question_generator(settings),
+            return_source_documents=True,
+            verbose=verbose,
+        )
+        self._record_setup(time.perf_counter() - started)
+        return chain
+
+    def _record_setup(self, seconds: float) -> None:
+        """Record the time spent handing out a chain for a request."""
+        with self._lock:
+            self._setup_count += 1
+            self._setup_seconds_total += seconds
+            self._setup_seconds_max = max(self._setup_seconds_max, seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache counters and per-request chain setup timings."""
+        with self._lock:
+            return {
+                "llm_clients": len(self._llms),
+                "llm_client_hits": self._llm_hits,
+                "llm_client_misses": self._llm_misses,
+                "chain_cache_hits": self._chain_hits,
+                "chain_cache_misses": self._chain_misses,
+                "setup_count": self._setup_count,
+                "setup_seconds_total": self._setup_seconds_total,
+                "setup_seconds_avg": (
+                    self._setup_seconds_total / self._setup_count if self._setup_count else 0.0
+                ),
+                "setup_seconds_max": self._setup_seconds_max,
+            }
+
+
+# process-wide registry shared by every request
+_chain_registry = ChainRegistry()
+
+
+def get_chain_registry() -> ChainRegistry:
+    """Get the process-wide chain registry."""
+    return _chain_registry
+
+
+def get_llm(model_name: Optional[str] = None, temperature: float = 0.2, settings: Optional[Settings] = None) -> ResilientChatModel:
+    """Return the shared Gemini LLM client for a model and temperature."""
+    return _chain_registry.get_llm(model_name=model_name, temperature=temperature, settings=settings)
+
+
+def get_prompt(prompt_type: PromptType = PromptType.DEFAULT) -> PromptTemplate:
+    """Get the configured prompt template for the LLM based on prompt type."""
+    return _chain_registry.get_prompt(prompt_type)
+
+
 def build_retrieval_qa_chain(
     retriever, 
     model_name: Optional[str] = None, 
@@ -415,20 +737,13 @@ def build_retrieval_qa_chain(
     prompt_type: PromptType = PromptType.DEFAULT,
 ) -> RetrievalQA:
     """Build a RetrievalQA chain without memory for stateless question answering."""
-    # get the LLM instance (Gemini)
-    llm = get_llm(model_name=model_name, settings=settings)
-    # get the prompt template based on prompt type
-    prompt = get_prompt(prompt_type=prompt_type)
-    
-    # create a RetrievalQA chain that combines retriever + LLM
-    # chain_type="stuff" means all retrieved documents are concatenated into the prompt
-    # return_source_documents=True includes source docs in the response
-    return RetrievalQA.from_chain_type(
-        llm=llm,
+    # RetrievalQA combines retriever + LLM; return_source_documents=True includes
+    # source docs in the response. The chain is stateless, so it is reused.
+    return _chain_registry.retrieval_qa_chain(
         retriever=retriever,
-        chain_type="stuff",
-        chain_type_kwargs={"prompt": prompt},
-        return_source_documents=True,
+        model_name=model_name,
+        settings=settings,
+        prompt_type=prompt_type,
     )
 
 
@@ -443,25 +758,110 @@ def build_conversational_chain(
     """
     Build a ConversationalRetrievalChain with memory for multi-turn conversations.
     
-    If memory is not provided, uses the cached global memory to maintain
-    conversation continuity across requests.
+    If memory is not provided, uses the memory of the default conversation
+    to maintain conversation continuity across requests.
     """
-    # get the LLM instance (Gemini)
-    llm = get_llm(model_name=model_name, settings=settings)
-    # get the prompt template based on prompt type
-    prompt = get_prompt(prompt_type=prompt_type)
-    # use provided memory or get cached global memory for conversation continuity
-    # this ensures all requests share the same conversation history
+    # use provided memory or the default conversation memory for continuity
     memory = memory or get_memory()
     
-    # create a ConversationalRetrievalChain that combines retriever + LLM + memory
-    # this chain can handle follow-up questions by maintaining conversation context
-    return ConversationalRetrievalChain.from_llm(
-        llm=llm,
+    # the chain combines retriever + LLM + memory and can handle follow-up
+    # questions; only this thin wrapper is created per request
+    return _chain_registry.conversational_chain(
         retriever=retriever,
         memory=memory,
-        combine_docs_chain_kwargs={"prompt": prompt},
-        return_source_documents=True,
+        model_name=model_name,
         verbose=verbose,
+        settings=settings,
+        prompt_type=prompt_type,
     )
 
+
+async def agenerate_answer(
+    question: str,
+    documents: List[Document],
+    model_name: Optional[str] = None,
+    settings: Optional[Settings] = None,
+    prompt_type: PromptType = PromptType.DEFAULT,
+) -> str:
+    """Answer a question from already retrieved documents with the shared "stuff" chain."""
+    llm = get_llm(model_name=model_name, settings=settings)
+    chain = _chain_registry.combine_docs_chain(llm, prompt_type)
+    response = await chain.ainvoke({"input_documents": documents, "question": question})
+    return response.get(chain.output_key) or ""
+
+
+def _format_chat_history(messages: List[BaseMessage]) -> str:
+    """Format chat history the same way ConversationalRetrievalChain does."""
+    role_prefixes = {"human": "Human: ", "ai": "Assistant: "}
+    buffer = ""
+    for message in messages:
+        if message.content:
+            prefix = role_prefixes.get(message.type, f"{message.type}: ")
+            buffer += f"\n{prefix}{message.content}"
+    return buffer
+
+
+def _format_context(documents: List[Document]) -> str:
+    """Concatenate retrieved documents as the "stuff" chain does."""
+    return "\n\n".join(doc.page_content for doc in documents)
+
+
+async def astream_answer(
+    retriever,
+    question: str,
+    model_name: Optional[str] = None,
+    memory=None,
+    use_memory: bool = True,
+    settings: Optional[Settings] = None,
+    prompt_type: PromptType = PromptType.DEFAULT,
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Answer a question streaming LLM tokens as they are generated.
+
+    Follows the same steps as the chains above (condense with chat history,
+    retrieve, pack and "stuff" the context into the prompt) but yields events
+    instead of returning the full answer:
+
+    - ("sources", documents) once retrieval finishes
+    - ("token", text) for every chunk produced by the LLM
+    - ("end", answer) with the full answer, after it was saved to memory
+    """
+    llm = get_llm(model_name=model_name, settings=settings)
+
+    # rephrase follow-up questions into standalone ones, as ConversationalRetrievalChain does
+    # (self-contained questions skip the LLM call)
+    standalone_question = question
+    if use_memory:
+        memory = memory or get_memory()
+        chat_history = memory.load_memory_variables({}).get(memory.memory_key, [])
+        if chat_history:
+            question_generator = _chain_registry.question_generator(settings)
+            standalone_question = await question_generator.arun(
+                question=question, chat_history=_format_chat_history(chat_history)
+            )
+
+    # merge overlapping chunks and fit them in the context token budget
+    documents = pack_documents(await retriever.ainvoke(standalone_question))
+    LOGGER.info("Contexto empaquetado: %s", documents.report.as_dict())
+    yield "sources", documents
+
+    # stream the answer generated from the stuffed context
+    answer_chain = _chain_registry.answer_runnable(llm, prompt_type)
+    answer_parts: List[str] = []
+    # time spent yielding to the client is included, as in a non-streamed chain call
+    started = time.perf_counter()
+    async for token in answer_chain.astream(
+        {"context": _format_context(documents), "question": standalone_question}
+    ):
+        if token:
+            if not answer_parts:
+                stage_histogram("ask", "first_token").observe(time.perf_counter() - started)
+            answer_parts.append(token)
+            yield "token", token
+    stage_histogram("ask", "generate").observe(time.perf_counter() - started)
+
+    answer = "".join(answer_parts)
+    # store the original question, as the conversational chain memory does
+    if use_memory:
+        memory.save_context({"question": question}, {"answer": answer})
+    yield "end", answer
@@ -1,37 +1,247 @@
 """Document loading from PDFs."""
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List
+from typing import Deque, Iterable, Iterator, List, Optional, Tuple, cast
 
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_core.documents import Document
 
-from app.core.constants import PDFS_DIR
+from app.core.constants import LOADER_PAGES_PER_TASK, LOADER_WORKERS, PDFS_DIR
 from app.core.logger import get_logger
 
+# metadata helpers of PyPDFParser, used to parse page ranges with identical output
+# (older langchain_community versions lack them: large files are then parsed whole)
+try:
+    from langchain_community.document_loaders.parsers.pdf import (
+        _purge_metadata,
+        _validate_metadata,
+    )
+except ImportError:
+    _purge_metadata = None
+    _validate_metadata = None
+
 LOGGER = get_logger(__name__)
 
 
-def load_pdf_documents(pdfs_dir: Path = None) -> List[Document]:
-    """Load all PDF documents from the specified directory."""
+@dataclass
+class FileTiming:
+    """Parsing time of one PDF file."""
+    source: str  # file name
+    pages: int  # pages parsed
+    tasks: int  # tasks the file was split into
+    seconds: float  # parse time summed over its tasks
+
+
+@dataclass(frozen=True)
+class _ParseTask:
+    """A PDF file, or a page range [start, end) of it, parsed by one worker."""
+    path: Path
+    start: Optional[int] = None
+    end: Optional[int] = None
+
+
+def list_pdf_files(pdfs_dir: Path = None) -> List[Path]:
+    """List the PDF files of a directory, sorted by name."""
     # use default PDFs directory if not provided
     if pdfs_dir is None:
         pdfs_dir = PDFS_DIR
-    
+
     # create directory if it doesn't exist
     pdfs_dir.mkdir(parents=True, exist_ok=True)
-    
+    return sorted(pdfs_dir.glob("*.pdf"))
+
+
+def load_pdf_documents(
+    pdfs_dir: Path = None,
+    paths: Optional[Iterable[Path]] = None,
+    workers: Optional[int] = None,
+    timings: Optional[List[FileTiming]] = None,
+) -> List[Document]:
+    """
+    Load PDF documents from the specified directory (or only the given files).
+
+    Files are parsed in parallel by a pool of worker processes; files with more
+    than LOADER_PAGES_PER_TASK pages are split into page ranges. Documents are
+    returned in the same order as a sequential load (file by file, page by page).
+
+    Args:
+        pdfs_dir: Directory to scan (data/pdfs by default)
+        paths: Explicit list of files to load instead of scanning pdfs_dir
+        workers: Number of worker processes (LOADER_WORKERS by default, 1 parses in-process)
+        timings: Optional list that receives the parse time of each file
+
+    Returns:
+        One document per PDF page
+    """
+    if paths is None:
+        paths = list_pdf_files(pdfs_dir)
+
     # load all PDF files from the directory
     docs: List[Document] = []
-    for pdf_path in pdfs_dir.glob("*.pdf"):
-        # use PyPDFLoader to extract text from PDF
-        loader = PyPDFLoader(str(pdf_path))
-        pdf_docs = loader.load()
+    for file_docs in iter_pdf_documents(paths, workers=workers, timings=timings):
+        docs.extend(file_docs)
+    return docs
+
+
+def iter_pdf_documents(
+    paths: Iterable[Path],
+    workers: Optional[int] = None,
+    timings: Optional[List[FileTiming]] = None,
+) -> Iterator[List[Document]]:
+    """
+    Yield the pages of each PDF, one file at a time and in order.
+
+    Only a bounded number of parse tasks run ahead of the consumer, so memory
+    depends on the size of the largest file rather than on the whole corpus.
+
+    Args:
+        paths: Files to load
+        workers: Number of worker processes (LOADER_WORKERS by default, 1 parses in-process)
+        timings: Optional list that receives the parse time of each file
+    """
+    paths = list(paths)
+    workers = LOADER_WORKERS if workers is None else workers
+    tasks = _plan_tasks(paths, split=workers > 1)
+
+    file_docs: List[Document] = []
+    timing: Optional[FileTiming] = None
+    for task, (task_docs, seconds) in _iter_task_results(tasks, workers):
+        if timing is not None and timing.source != task.path.name:
+            yield _finish_file(file_docs, timing, timings)
+            file_docs = []
+            timing = None
+        if timing is None:
+            timing = FileTiming(source=task.path.name, pages=0, tasks=0, seconds=0.0)
+
         # update metadata to include source file name
-        for doc in pdf_docs:
+        for doc in task_docs:
             metadata = doc.metadata.copy()
-            metadata["source"] = pdf_path.name
+            metadata["source"] = task.path.name
             doc.metadata = metadata
-        docs.extend(pdf_docs)
-    
-    return docs
+        file_docs.extend(task_docs)
+        timing.pages += len(task_docs)
+        timing.tasks += 1
+        timing.seconds += seconds
+
+    if timing is not None:
+        yield _finish_file(file_docs, timing, timings)
+
+
+def _finish_file(
+    file_docs: List[Document],
+    timing: FileTiming,
+    timings: Optional[List[FileTiming]],
+) -> List[Document]:
+    """Report the parse time of a completed file and return its pages."""
+    LOGGER.info(
+        "PDF '%s' parseado: %s páginas en %.2fs (%s tareas)",
+        timing.source, timing.pages, timing.seconds, timing.tasks,
+    )
+    if timings is not None:
+        timings.append(timing)
+    return file_docs
+
+
+def _plan_tasks(paths: List[Path], split: bool) -> List[_ParseTask]:
+    """Split the files into parse tasks, in document order."""
+    if not split or _purge_metadata is None or LOADER_PAGES_PER_TASK <= 0:
+        return [_ParseTask(path) for path in paths]
+
+    import pypdf
+
+    tasks: List[_ParseTask] = []
+    for path in paths:
+        try:
+            # opening the reader only parses the xref table, not the page content
+            total_pages = len(pypdf.PdfReader(str(path)).pages)
+        except Exception as exc:
+            LOGGER.warning("No se pudo contar las páginas de '%s': %s", path.name, exc)
+            total_pages = 0
+        if total_pages <= LOADER_PAGES_PER_TASK:
+            tasks.append(_ParseTask(path))
+            continue
+        for start in range(0, total_pages, LOADER_PAGES_PER_TASK):
+            tasks.append(_ParseTask(path, start, min(start + LOADER_PAGES_PER_TASK, total_pages)))
+    return tasks
+
+
+def _iter_task_results(
+    tasks: List[_ParseTask], workers: int
+) -> Iterator[Tuple[_ParseTask, Tuple[List[Document], float]]]:
+    """Run the parse tasks in order, in a process pool when there is more than one."""
+    if workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield task, _parse_task(task)
+        return
 
+    remaining = deque(tasks)
+    pending: Deque[Tuple[_ParseTask, Future]] = deque()
+    try:
+        # spawn keeps workers free of the server's threads and loaded models
+        executor = ProcessPoolExecutor(
+            max_workers=min(workers, len(tasks)),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    except OSError as exc:
+        LOGGER.warning("Pool de procesos no disponible (%s), parseando PDFs secuencialmente", exc)
+        for task in tasks:
+            yield task, _parse_task(task)
+        return
+
+    try:
+        # keep a bounded window of tasks in flight, consumed in submission order
+        while remaining or pending:
+            while remaining and len(pending) < 2 * workers:
+                pending.append((remaining[0], executor.submit(_parse_task, remaining[0])))
+                remaining.popleft()
+            task, future = pending[0]
+            result = future.result()
+            pending.popleft()
+            yield task, result
+    except BrokenProcessPool as exc:
+        LOGGER.warning("Pool de procesos caído (%s), parseando el resto de PDFs secuencialmente", exc)
+        for task in [task for task, _ in pending] + list(remaining):
+            yield task, _parse_task(task)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _parse_task(task: _ParseTask) -> Tuple[List[Document], float]:
+    """Parse a file or page range, returning its documents and the elapsed time."""
+    started = time.perf_counter()
+    if task.start is None:
+        # use PyPDFLoader to extract text from PDF
+        docs = PyPDFLoader(str(task.path)).load()
+    else:
+        docs = _parse_page_range(task.path, task.start, task.end)
+    return docs, time.perf_counter() - started
+
+
+def _parse_page_range(path: Path, start: int, end: int) -> List[Document]:
+    """Parse pages [start, end) of a PDF exactly as PyPDFLoader would."""
+    import pypdf
+
+    reader = pypdf.PdfReader(str(path))
+    doc_metadata = _purge_metadata(
+        {"producer": "PyPDF", "creator": "PyPDF", "creationdate": ""}
+        | cast(dict, reader.metadata or {})
+        | {"source": str(path), "total_pages": len(reader.pages)}
+    )
+    docs: List[Document] = []
+    for page_number in range(start, end):
+        text = reader.pages[page_number].extract_text(extraction_mode="plain")
+        docs.append(
+            Document(
+                page_content=text.strip(),
+                metadata=_validate_metadata(
+                    doc_metadata
+                    | {"page": page_number, "page_label": reader.page_labels[page_number]}
+                ),
+            )
+        )
+    return docs
@@ -0,0 +1,831 @@
+"""In-process vector index stored in memory-mapped files (VECTOR_BACKEND=local)."""
+import argparse
+import json
+import math
+import os
+import shutil
+import threading
+import uuid
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from app.core.constants import (
+    VECTOR_INDEX_DIR,
+    VECTOR_INDEX_IVF_MIN_ROWS,
+    VECTOR_INDEX_IVF_NLIST,
+    VECTOR_INDEX_IVF_NPROBE,
+)
+from app.core.logger import get_logger
+from app.core.metrics import stage_timer
+from app.rag.embedding_cache import _FileLock, _safe_name
+
+LOGGER = get_logger(__name__)
+
+# no server limit applies, this only keeps upsert requests reasonably sized
+MAX_BATCH_SIZE = 5000
+# rows appended after the IVF index was built are scanned exactly until they
+# exceed this fraction of the indexed rows, then the index is rebuilt (in the
+# background when a search notices it, while the previous index keeps serving)
+IVF_REBUILD_FRACTION = 0.1
+IVF_KMEANS_ITERATIONS = 10
+IVF_TRAINING_ROWS_PER_LIST = 256
+
+
+@dataclass
+class SearchHits:
+    """Nearest rows of a query, read from a consistent snapshot of the collection."""
+    records: List[Tuple[str, str, Dict[str, Any]]]  # (id, text, metadata) of each hit
+    scores: List[float]  # cosine similarities, best first
+    vectors: np.ndarray  # normalized vectors of the hits
+
+    def documents(self) -> List[Document]:
+        """Return the hits as LangChain documents."""
+        return [
+            Document(page_content=text, metadata=dict(metadata), id=doc_id)
+            for doc_id, text, metadata in self.records
+        ]
+
+
+class LocalCollection:
+    """
+    One collection of the in-process vector index.
+
+    The collection is a directory with files versioned by an epoch number:
+
+    - meta.json: collection metadata, vector dimension and current epoch
+    - vectors-<epoch>.f32: L2-normalized float32 rows, read through a memory map
+    - records-<epoch>.jsonl: append-only log; one line per row with its ID,
+      text and metadata, plus {"delete": id} lines for removed IDs
+    - ivf-<epoch>.npz: IVF lists of the first rows (large collections only)
+
+    The IVF index is never built on the query path: ingestion and export
+    build it once they finish writing (build_ivf), and a search that finds
+    it missing or stale starts a background rebuild and keeps using the
+    previous index, or an exact scan, until the new one is swapped in.
+
+    Writers append vectors before their records, so a crash mid-write leaves
+    at most some unreferenced rows and a partial last line in the log; the
+    next writer cuts both off before appending. Upserting an existing ID appends a new row
+    and hides the old one; once dead rows outnumber live ones the collection is
+    compacted into a new epoch. Readers replay the log incrementally, so other
+    worker processes pick up new rows on their next query.
+    """
+
+    def __init__(self, directory: Path, name: str):
+        self.name = name
+        self.directory = directory
+        self._meta_path = directory / "meta.json"
+        self._lock = threading.RLock()
+        self._ivf_building = False  # a background IVF build is running
+        self._reset_state()
+
+    # ------------------------------------------------------------------
+    # Chroma-compatible collection API used by the ingestion pipeline
+    # ------------------------------------------------------------------
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refresh()
+            return dict(self._metadata)
+
+    def count(self) -> int:
+        """Return the number of live vectors."""
+        with self._lock:
+            self._refresh()
+            return len(self._id_rows)
+
+    def upsert(
+        self,
+        ids: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+        metadatas: Optional[Sequence[Optional[Dict[str, Any]]]] = None,
+        documents: Optional[Sequence[str]] = None,
+    ) -> None:
+        """Insert or replace vectors with their text and metadata."""
+        if not ids:
+            return
+        matrix = _normalize(np.asarray(embeddings, dtype=np.float32))
+        if matrix.ndim != 2 or matrix.shape[0] != len(ids):
+            raise ValueError("Se esperaba un embedding por ID para el índice local")
+        metadatas = metadatas or [None] * len(ids)
+        documents = documents or [""] * len(ids)
+
+        with self._lock, _FileLock(self.directory / ".lock"):
+            self._refresh()
+            if self._dim is None:
+                self._dim = matrix.shape[1]
+                self._write_meta()
+            elif matrix.shape[1] != self._dim:
+                raise ValueError(
+                    f"Dimensión de embedding {matrix.shape[1]} incompatible con el índice ({self._dim})"
+                )
+
+            self._truncate_partial_records()
+            first_row = self._rows
+            # keep both files aligned even if a previous writer crashed mid-way
+            if self._vectors_path.stat().st_size != first_row * 4 * self._dim:
+                with open(self._vectors_path, "r+b") as handle:
+                    handle.truncate(first_row * 4 * self._dim)
+            with open(self._vectors_path, "ab") as handle:
+                handle.write(np.ascontiguousarray(matrix).tobytes())
+                handle.flush()
+                os.fsync(handle.fileno())
+            self._append_records(
+                {"row": first_row + offset, "id": doc_id, "document": document, "metadata": metadata or {}}
+                for offset, (doc_id, document, metadata) in enumerate(zip(ids, documents, metadatas))
+            )
+            self._refresh()
+            self._maybe_compact()
+
+    def delete(self, ids: Sequence[str]) -> None:
+        """Remove vectors by ID (unknown IDs are ignored)."""
+        with self._lock, _FileLock(self.directory / ".lock"):
+            self._refresh()
+            known = [doc_id for doc_id in ids if doc_id in self._id_rows]
+            if not known:
+                return
+            self._truncate_partial_records()
+            self._append_records({"delete": doc_id} for doc_id in known)
+            self._refresh()
+            self._maybe_compact()
+
+    def get(
+        self,
+        ids: Optional[Sequence[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        include: Sequence[str] = ("documents", "metadatas"),
+    ) -> Dict[str, Any]:
+        """Return live rows by ID or page through the collection, as Chroma does."""
+        with self._lock:
+            self._refresh()
+            if ids is not None:
+                rows = [self._id_rows[doc_id] for doc_id in ids if doc_id in self._id_rows]
+            else:
+                rows = sorted(self._id_rows.values())
+            if where:
+                rows = [row for row in rows if _matches(self._records[row][2], where)]
+            rows = rows[offset:offset + limit if limit is not None else None]
+            return self._format_rows(rows, include)
+
+    def query(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        include: Sequence[str] = ("documents", "metadatas", "distances"),
+    ) -> Dict[str, Any]:
+        """Return the nearest rows of each query, with cosine distances, as Chroma does."""
+        results: Dict[str, List[Any]] = {"ids": []}
+        for field in include:
+            results[field] = []
+        for embedding in query_embeddings:
+            hits = self.search(embedding, n_results, where=where)
+            results["ids"].append([doc_id for doc_id, _, _ in hits.records])
+            for field in include:
+                if field == "documents":
+                    results[field].append([text for _, text, _ in hits.records])
+                elif field == "metadatas":
+                    results[field].append([dict(metadata) for _, _, metadata in hits.records])
+                elif field == "embeddings":
+                    results[field].append(hits.vectors)
+                elif field == "distances":
+                    results[field].append([1.0 - score for score in hits.scores])
+        return results
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+
+    def search(
+        self, embedding: Sequence[float], k: int, where: Optional[Dict[str, Any]] = None
+    ) -> "SearchHits":
+        """
+        Return the k most similar rows, best first.
+
+        Small collections are scanned exactly. Collections with an IVF index
+        only score the rows of the VECTOR_INDEX_IVF_NPROBE closest lists, plus
+        the rows appended since the index was built; until a large collection
+        has its first index it is scanned exactly too. Scoring runs outside the
+        lock on a snapshot of the collection.
+        """
+        query = _normalize(np.asarray(embedding, dtype=np.float32).reshape(1, -1))[0]
+        with self._lock:
+            self._refresh()
+            # a compaction replaces these objects, so the snapshot stays consistent
+            vectors, live, records, rows = self._get_mmap(), self._live, self._records, self._rows
+            ivf = self._get_ivf()
+            candidates: Optional[np.ndarray] = None
+            if ivf is not None:
+                candidates = self._ivf_candidates(ivf, query, rows)
+        if where:
+            allowed = np.fromiter(
+                (_matches(record[2], where) for record in records[:rows]), dtype=bool, count=rows
+            )
+            live = live & allowed
+
+        if rows == 0 or k <= 0:
+            return SearchHits([], [], np.zeros((0, self._dim or 0), dtype=np.float32))
+        if candidates is None:
+            scores = vectors @ query
+            scores[~live[:rows]] = -np.inf
+            candidate_rows = np.arange(rows)
+        else:
+            candidate_rows = candidates[live[candidates]]
+            scores = vectors[candidate_rows] @ query
+
+        valid = np.isfinite(scores)
+        candidate_rows, scores = candidate_rows[valid], scores[valid]
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        hit_rows = candidate_rows[top]
+        return SearchHits(
+            records=[records[row] for row in hit_rows],
+            scores=scores[top].tolist(),
+            vectors=np.asarray(vectors[hit_rows]),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Return vector counts, dimension and whether the IVF index is active."""
+        with self._lock:
+            self._refresh()
+            return {
+                "vectors": len(self._id_rows),
+                "rows": self._rows,
+                "dim": self._dim or 0,
+                "epoch": self._epoch,
+                "ivf_lists": 0 if self._ivf is None else len(self._ivf["centroids"]),
+            }
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+
+    @property
+    def _vectors_path(self) -> Path:
+        return self.directory / f"vectors-{self._epoch}.f32"
+
+    @property
+    def _records_path(self) -> Path:
+        return self.directory / f"records-{self._epoch}.jsonl"
+
+    @property
+    def _ivf_path(self) -> Path:
+        return self.directory / f"ivf-{self._epoch}.npz"
+
+    def _reset_state(self) -> None:
+        self._uid: Optional[str] = None  # changes when the collection is recreated
+        self._epoch = 0
+        self._dim: Optional[int] = None
+        self._metadata: Dict[str, Any] = {}
+        self._records: List[Tuple[str, str, Dict[str, Any]]] = []  # (id, text, metadata) per row
+        self._id_rows: Dict[str, int] = {}  # live ID -> row
+        self._live = np.zeros(0, dtype=bool)
+        self._rows = 0
+        self._records_offset = 0  # bytes of the records log already replayed
+        self._mmap: Optional[np.memmap] = None
+        self._ivf: Optional[Dict[str, np.ndarray]] = None
+
+    def create(self, metadata: Optional[Dict[str, Any]]) -> None:
+        """Create the collection files."""
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._reset_state()
+            self._uid = uuid.uuid4().hex
+            self._metadata = dict(metadata or {})
+            self._vectors_path.write_bytes(b"")
+            self._records_path.write_bytes(b"")
+            self._write_meta()
+
+    def exists(self) -> bool:
+        return self._meta_path.exists()
+
+    def _write_meta(self) -> None:
+        """Write meta.json atomically."""
+        payload = {
+            "name": self.name,
+            "uid": self._uid,
+            "epoch": self._epoch,
+            "dim": self._dim,
+            "metadata": self._metadata,
+        }
+        tmp_path = self._meta_path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, self._meta_path)
+
+    def _refresh(self) -> None:
+        """Replay records appended since the last refresh (reloading after a compaction)."""
+        if not self._meta_path.exists():
+            # deleted (possibly by another process): behave as an empty collection
+            if self._rows or self._dim is not None:
+                self._reset_state()
+            return
+        meta = json.loads(self._meta_path.read_text(encoding="utf-8"))
+        if (meta["uid"], meta["epoch"]) != (self._uid, self._epoch):
+            self._reset_state()
+            self._uid, self._epoch = meta["uid"], meta["epoch"]
+        self._metadata = meta.get("metadata") or {}
+        self._dim = meta["dim"]
+        if self._dim is None or not self._records_path.exists():
+            return
+        if self._records_path.stat().st_size <= self._records_offset:
+            return
+
+        with open(self._records_path, "rb") as handle:
+            handle.seek(self._records_offset)
+            data = handle.read()
+        # only replay complete lines, a writer may be appending the rest
+        complete = data[:data.rfind(b"\n") + 1]
+        new_live: List[int] = []
+        dead: List[int] = []
+        for line in complete.splitlines():
+            entry = json.loads(line)
+            if "delete" in entry:
+                row = self._id_rows.pop(entry["delete"], None)
+                if row is not None:
+                    dead.append(row)
+                continue
+            row = entry["row"]
+            if row != len(self._records):
+                raise ValueError(f"Registro inconsistente en el índice local '{self.name}'")
+            self._records.append((entry["id"], entry["document"], entry["metadata"]))
+            previous = self._id_rows.get(entry["id"])
+            if previous is not None:
+                dead.append(previous)
+            self._id_rows[entry["id"]] = row
+            new_live.append(row)
+        self._records_offset += len(complete)
+
+        # copy on write: searches running outside the lock keep their own mask
+        live = np.zeros(len(self._records), dtype=bool)
+        live[:len(self._live)] = self._live
+        live[new_live] = True
+        live[dead] = False
+        self._live = live
+        self._rows = len(self._records)
+        self._mmap = None
+
+    def _truncate_partial_records(self) -> None:
+        """
+        Drop a partial last line left in the log by a writer that crashed.
+
+        Must be called with the file lock held, right after _refresh(): the
+        replayed offset is then the end of the last complete line, and no
+        other writer can be appending.
+        """
+        if self._records_path.stat().st_size > self._records_offset:
+            LOGGER.warning("Registro incompleto en el índice local '%s': se descarta", self.name)
+            with open(self._records_path, "r+b") as handle:
+                handle.truncate(self._records_offset)
+
+    def _append_records(self, entries: Iterable[Dict[str, Any]]) -> None:
+        lines = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+        with open(self._records_path, "ab") as handle:
+            handle.write(lines.encode("utf-8"))
+            handle.flush()
+
+    def _get_mmap(self) -> np.ndarray:
+        """Return a read-only memory map over the rows replayed so far."""
+        if self._rows == 0 or self._dim is None:
+            return np.zeros((0, self._dim or 0), dtype=np.float32)
+        if self._mmap is None:
+            self._mmap = np.memmap(
+                self._vectors_path, dtype=np.float32, mode="r", shape=(self._rows, self._dim)
+            )
+        return self._mmap
+
+    def _maybe_compact(self) -> None:
+        """Rewrite live rows into a new epoch once dead rows outnumber them."""
+        live_rows = len(self._id_rows)
+        dead_rows = self._rows - live_rows
+        if dead_rows <= max(live_rows, 1000):
+            return
+
+        old_files = [self._vectors_path, self._records_path, self._ivf_path]
+        rows = sorted(self._id_rows.values())
+        vectors = np.asarray(self._get_mmap()[rows]) if rows else np.zeros((0, self._dim), np.float32)
+        records = [self._records[row] for row in rows]
+        uid, epoch, metadata, dim = self._uid, self._epoch + 1, self._metadata, self._dim
+
+        self._reset_state()
+        self._uid, self._epoch, self._metadata, self._dim = uid, epoch, metadata, dim
+        with open(self._vectors_path, "wb") as handle:
+            handle.write(np.ascontiguousarray(vectors).tobytes())
+            handle.flush()
+            os.fsync(handle.fileno())
+        self._records_path.write_bytes(b"")
+        self._append_records(
+            {"row": row, "id": doc_id, "document": text, "metadata": meta}
+            for row, (doc_id, text, meta) in enumerate(records)
+        )
+        # readers switch to the new files when they see the new epoch
+        self._write_meta()
+        for path in old_files:
+            path.unlink(missing_ok=True)
+        self._refresh()
+        LOGGER.info(
+            "Índice local '%s' compactado: %s filas muertas eliminadas", self.name, dead_rows
+        )
+
+    # ------------------------------------------------------------------
+    # IVF index
+    # ------------------------------------------------------------------
+
+    def build_ivf(self) -> bool:
+        """
+        Build the IVF index if the collection needs one and it is missing or stale.
+
+        k-means runs outside the lock on a snapshot of the rows, so searches
+        and writes go on meanwhile with the previous index (or an exact
+        scan). The new index is swapped in unless the collection was
+        compacted or recreated in the meantime. Returns whether it was.
+        """
+        with self._lock:
+            self._refresh()
+            if not self._needs_ivf():
+                return False
+            self._load_ivf()
+            if self._ivf is not None and not self._ivf_stale():
+                return False
+            uid, epoch, rows = self._uid, self._epoch, self._rows
+            vectors, live, live_count = self._get_mmap(), self._live, len(self._id_rows)
+
+        ivf = _build_ivf(vectors, live, rows, live_count)
+
+        with self._lock:
+            if (self._uid, self._epoch) != (uid, epoch):
+                return False
+            if self._ivf is not None and int(self._ivf["rows"]) >= rows:
+                return False
+            tmp_path = self.directory / f".ivf-{epoch}.tmp.npz"
+            np.savez(tmp_path, **ivf)
+            os.replace(tmp_path, self._ivf_path)
+            self._ivf = ivf
+        LOGGER.info("Índice IVF de '%s' construido: %s listas, %s filas", self.name, len(ivf["centroids"]), rows)
+        return True
+
+    def _needs_ivf(self) -> bool:
+        return 0 < VECTOR_INDEX_IVF_MIN_ROWS <= len(self._id_rows)
+
+    def _ivf_stale(self) -> bool:
+        """Whether more rows were appended since the IVF index was built than it may scan exactly."""
+        indexed = int(self._ivf["rows"])
+        return self._rows - indexed > IVF_REBUILD_FRACTION * indexed
+
+    def _load_ivf(self) -> None:
+        """Load the IVF index written by another process or an earlier run, if any."""
+        if self._ivf is None and self._ivf_path.exists():
+            with np.load(self._ivf_path) as data:
+                loaded = {key: data[key] for key in data.files}
+            if int(loaded["rows"]) <= self._rows:
+                self._ivf = loaded
+
+    def _get_ivf(self) -> Optional[Dict[str, np.ndarray]]:
+        """Return the IVF index to search with (None: exact scan), rebuilding it in the background if stale."""
+        if not self._needs_ivf():
+            return None
+        self._load_ivf()
+        if (self._ivf is None or self._ivf_stale()) and not self._ivf_building:
+            self._ivf_building = True
+            threading.Thread(
+                target=self._build_ivf_in_background, name=f"ivf-{self.name}", daemon=True
+            ).start()
+        return self._ivf
+
+    def _build_ivf_in_background(self) -> None:
+        try:
+            self.build_ivf()
+        except Exception:
+            LOGGER.exception("Error construyendo el índice IVF de '%s'", self.name)
+        finally:
+            with self._lock:
+                self._ivf_building = False
+
+    def _ivf_candidates(self, ivf: Dict[str, np.ndarray], query: np.ndarray, rows: int) -> np.ndarray:
+        """Rows in the closest IVF lists plus the rows appended after the index was built."""
+        centroids, order, offsets = ivf["centroids"], ivf["order"], ivf["offsets"]
+        nprobe = min(max(1, VECTOR_INDEX_IVF_NPROBE), len(centroids))
+        lists = np.argpartition(-(centroids @ query), nprobe - 1)[:nprobe]
+        parts = [order[offsets[index]:offsets[index + 1]] for index in lists]
+        parts.append(np.arange(int(ivf["rows"]), rows))
+        return np.concatenate(parts)
+
+    def _format_rows(self, rows: Sequence[int], include: Sequence[str]) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"ids": [self._records[row][0] for row in rows]}
+        if "documents" in include:
+            result["documents"] = [self._records[row][1] for row in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [dict(self._records[row][2]) for row in rows]
+        if "embeddings" in include:
+            result["embeddings"] = np.asarray(self._get_mmap()[list(rows)])
+        return result
+
+
+class LocalIndexClient:
+    """
+    Chroma-like client over the collections of the in-process index.
+
+    Implements the subset of the chromadb client API used by the ingestion
+    pipeline, so /ingest writes to either backend unchanged. Collections are
+    shared by every client of the same directory in the process.
+    """
+
+    def __init__(self, directory: Path = VECTOR_INDEX_DIR):
+        self.directory = Path(directory)
+        self._collections: Dict[str, LocalCollection] = {}
+        self._lock = threading.Lock()
+
+    def _collection(self, name: str) -> LocalCollection:
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = LocalCollection(self.directory / _safe_name(name), name)
+            return self._collections[name]
+
+    def get_collection(self, name: str, **kwargs: Any) -> LocalCollection:
+        """Return an existing collection (FileNotFoundError if missing)."""
+        collection = self._collection(name)
+        if not collection.exists():
+            raise FileNotFoundError(f"No existe la colección local '{name}'")
+        return collection
+
+    def create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> LocalCollection:
+        """Create a collection (ValueError if it already exists)."""
+        collection = self._collection(name)
+        if collection.exists():
+            raise ValueError(f"La colección local '{name}' ya existe")
+        collection.create(metadata)
+        return collection
+
+    def get_or_create_collection(
+        self, name: str, metadata: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> LocalCollection:
+        """Return a collection, creating it if missing."""
+        collection = self._collection(name)
+        if not collection.exists():
+            collection.create(metadata)
+        return collection
+
+    def delete_collection(self, name: str) -> None:
+        """Delete a collection and its files."""
+        collection = self._collection(name)
+        with collection._lock:
+            shutil.rmtree(collection.directory, ignore_errors=True)
+            collection._reset_state()
+
+    def get_max_batch_size(self) -> int:
+        return MAX_BATCH_SIZE
+
+
+@lru_cache()
+def get_local_client(directory: Path = VECTOR_INDEX_DIR) -> LocalIndexClient:
+    """Get the process-wide client of an index directory (cached)."""
+    return LocalIndexClient(directory)
+
+
+class LocalVectorStore(VectorStore):
+    """
+    LangChain vector store backed by a LocalCollection.
+
+    Search runs in-process with NumPy against the memory-mapped vectors, so
+    there is no network round-trip and MMR reads candidate vectors straight
+    from the map instead of receiving them serialized as JSON. Scores are
+    cosine distances (1 - cosine similarity).
+    """
+
+    def __init__(self, collection: LocalCollection, embedding_function: Embeddings):
+        self.collection = collection
+        self._embedding_function = embedding_function
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding_function
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        if ids is None:
+            ids = [str(uuid.uuid4()) for _ in texts]
+        vectors = self._embedding_function.embed_documents(texts)
+        self.collection.upsert(ids=ids, embeddings=vectors, metadatas=metadatas, documents=texts)
+        return list(ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if ids:
+            self.collection.delete(ids)
+        return True
+
+    def similarity_search(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Document]:
+        embedding = self._embedding_function.embed_query(query)
+        return self.similarity_search_by_vector(embedding, k=k, filter=filter)
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Document]:
+        return self.collection.search(embedding, k, where=filter).documents()
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        embedding = self._embedding_function.embed_query(query)
+        hits = self.collection.search(embedding, k, where=filter)
+        return [(doc, 1.0 - score) for doc, score in zip(hits.documents(), hits.scores)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        return self._cosine_relevance_score_fn
+
+    def max_marginal_relevance_search(
+        self,
+        query: str,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        embedding = self._embedding_function.embed_query(query)
+        return self.max_marginal_relevance_search_by_vector(
+            embedding, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult, filter=filter
+        )
+
+    def max_marginal_relevance_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        from app.rag.retriever import mmr_select
+
+        hits = self.collection.search(embedding, fetch_k, where=filter)
+        if not hits.records:
+            return []
+        selected = set(
+            mmr_select(
+                embedding,
+                hits.vectors,
+                k=k,
+                lambda_mult=lambda_mult,
+            )
+        )
+        # keep candidate order, as the LangChain Chroma wrapper does
+        return [doc for i, doc in enumerate(hits.documents()) if i in selected]
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        collection_name: str = "langchain",
+        directory: Path = VECTOR_INDEX_DIR,
+        **kwargs: Any,
+    ) -> "LocalVectorStore":
+        collection = get_local_client(Path(directory)).get_or_create_collection(collection_name)
+        store = cls(collection, embedding)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
+
+
+def export_chroma_collection(settings: Any = None, batch_size: int = 1000) -> int:
+    """
+    Copy a ChromaDB collection into the local index, keeping IDs and vectors.
+
+    The chunk IDs are preserved, so the source manifest stays valid and
+    incremental ingestion can continue on the local backend.
+
+    Returns:
+        Number of vectors exported
+    """
+    from app.core.config import get_chroma_client, load_settings
+    from app.rag.lexical_index import build_lexical_index
+    from app.rag.vectorstore import bump_collection_generation
+
+    settings = settings or load_settings()
+    source = get_chroma_client(settings).get_collection(settings.chroma_collection)
+    client = get_local_client()
+    client.delete_collection(settings.chroma_collection)
+    target = client.create_collection(settings.chroma_collection, metadata=source.metadata or {})
+
+    exported = 0
+    while True:
+        page = source.get(
+            include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=exported
+        )
+        if not page["ids"]:
+            break
+        target.upsert(
+            ids=page["ids"],
+            embeddings=page["embeddings"],
+            metadatas=page["metadatas"],
+            documents=page["documents"],
+        )
+        exported += len(page["ids"])
+    build_lexical_index(target, settings.chroma_collection)
+    build_vector_index(target)
+    bump_collection_generation()
+    LOGGER.info("Colección '%s' exportada al índice local: %s vectores", settings.chroma_collection, exported)
+    return exported
+
+
+def _build_ivf(vectors: np.ndarray, live: np.ndarray, rows: int, live_count: int) -> Dict[str, np.ndarray]:
+    """Cluster the first rows with spherical k-means and store them by list."""
+    nlist = VECTOR_INDEX_IVF_NLIST or max(1, int(math.sqrt(live_count)))
+    rng = np.random.default_rng(0)
+
+    live_rows = np.flatnonzero(live[:rows])
+    sample_size = min(len(live_rows), nlist * IVF_TRAINING_ROWS_PER_LIST)
+    sample = np.asarray(vectors[np.sort(rng.choice(live_rows, sample_size, replace=False))])
+    centroids = sample[rng.choice(len(sample), min(nlist, len(sample)), replace=False)]
+    for _ in range(IVF_KMEANS_ITERATIONS):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        empty = ~np.any(sums, axis=1)
+        # reseed empty lists with random sample rows
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = _normalize(sums)
+
+    # assign every row (dead rows included, they are masked at query time)
+    assignment = np.empty(rows, dtype=np.int32)
+    for start in range(0, rows, 8192):
+        block = np.asarray(vectors[start:start + 8192])
+        assignment[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    order = np.argsort(assignment, kind="stable").astype(np.int64)
+    offsets = np.searchsorted(assignment[order], np.arange(len(centroids) + 1))
+    return {"centroids": centroids, "order": order, "offsets": offsets, "rows": np.array(rows)}
+
+
+def build_vector_index(collection: Any) -> None:
+    """Build or refresh the IVF index of a local collection once a write finished (ChromaDB indexes itself)."""
+    if isinstance(collection, LocalCollection):
+        with stage_timer("ingest", "vector_index"):
+            collection.build_ivf()
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize the rows of a matrix (zero rows are left as-is)."""
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return (matrix / np.where(norms == 0, 1.0, norms)).astype(np.float32)
+
+
+def _matches(metadata: Dict[str, Any], where: Dict[str, Any]) -> bool:
+    """Evaluate a Chroma `where` filter (equality, $eq/$ne/$in/$nin, $and/$or)."""
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(_matches(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(_matches(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if operator == "$eq" and value != operand:
+                    return False
+                if operator == "$ne" and value == operand:
+                    return False
+                if operator == "$in" and value not in operand:
+                    return False
+                if operator == "$nin" and value in operand:
+                    return False
+                if operator not in {"$eq", "$ne", "$in", "$nin"}:
+                    raise ValueError(f"Operador de filtro no soportado por el índice local: {operator}")
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Herramientas del índice vectorial local")
+    parser.add_argument(
+        "command", choices=["export", "stats"],
+        help="export: copiar la colección de ChromaDB al índice local; stats: mostrar su estado",
+    )
+    args = parser.parse_args()
+    if args.command == "export":
+        print(f"{export_chroma_collection()} vectores exportados")
+    else:
+        from app.core.config import load_settings
+        print(json.dumps(get_local_client().get_collection(load_settings().chroma_collection).stats()))
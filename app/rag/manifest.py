@@ -0,0 +1,119 @@
+"""Source manifest and deterministic chunk IDs for incremental ingestion."""
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from langchain_core.documents import Document
+
+from app.core.constants import CACHE_DIR
+from app.core.logger import get_logger
+
+LOGGER = get_logger(__name__)
+
+MANIFESTS_DIR = CACHE_DIR / "manifests"
+MANIFEST_VERSION = 1
+
+
+def hash_file(path: Path, block_size: int = 1 << 20) -> str:
+    """Return the SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(chunk: Document, ordinal: int) -> str:
+    """
+    Build a deterministic ID for a chunk.
+
+    The ID combines the source file, the page range, the position of the chunk
+    within its file and a hash of its text, so re-indexing the same file with
+    the same chunking parameters always produces the same IDs.
+    """
+    metadata = chunk.metadata or {}
+    text_hash = hashlib.sha1(chunk.page_content.encode("utf-8")).hexdigest()[:16]
+    pages = f"{metadata.get('page_start', '')}-{metadata.get('page_end', '')}"
+    return f"{metadata.get('source', 'unknown')}:{pages}:{ordinal}:{text_hash}"
+
+
+@dataclass
+class ManifestEntry:
+    """Indexed state of one source file."""
+    sha256: str  # content hash of the PDF when it was indexed
+    chunk_ids: List[str] = field(default_factory=list)  # IDs of its chunks in the collection
+
+
+@dataclass
+class IngestManifest:
+    """Per-file content hashes and chunk IDs of an indexed collection."""
+    collection: str
+    embedding_model: str
+    chunk_size: int
+    chunk_overlap: int
+    files: Dict[str, ManifestEntry] = field(default_factory=dict)
+
+    def is_compatible(self, embedding_model: str, chunk_size: int, chunk_overlap: int) -> bool:
+        """Whether chunks in this manifest were built with the same parameters."""
+        return (
+            self.embedding_model == embedding_model
+            and self.chunk_size == chunk_size
+            and self.chunk_overlap == chunk_overlap
+        )
+
+    def save(self, manifests_dir: Path = MANIFESTS_DIR) -> None:
+        """Write the manifest atomically."""
+        manifests_dir.mkdir(parents=True, exist_ok=True)
+        path = manifest_path(self.collection, manifests_dir)
+        payload = {
+            "version": MANIFEST_VERSION,
+            "collection": self.collection,
+            "embedding_model": self.embedding_model,
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "files": {
+                name: {"sha256": entry.sha256, "chunk_ids": entry.chunk_ids}
+                for name, entry in sorted(self.files.items())
+            },
+        }
+        tmp_path = path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        # replace in one step so a crash never leaves a half-written manifest
+        os.replace(tmp_path, path)
+
+
+def manifest_path(collection: str, manifests_dir: Path = MANIFESTS_DIR) -> Path:
+    """Return the manifest path of a collection."""
+    return manifests_dir / f"{collection}.json"
+
+
+def load_manifest(collection: str, manifests_dir: Path = MANIFESTS_DIR) -> Optional[IngestManifest]:
+    """Load the manifest of a collection (None if missing or unreadable)."""
+    path = manifest_path(collection, manifests_dir)
+    if not path.exists():
+        return None
+    try:
+        payload = json.loads(path.read_text(encoding="utf-8"))
+        if payload.get("version") != MANIFEST_VERSION:
+            return None
+        return IngestManifest(
+            collection=payload["collection"],
+            embedding_model=payload["embedding_model"],
+            chunk_size=int(payload["chunk_size"]),
+            chunk_overlap=int(payload["chunk_overlap"]),
+            files={
+                name: ManifestEntry(sha256=entry["sha256"], chunk_ids=list(entry["chunk_ids"]))
+                for name, entry in payload["files"].items()
+            },
+        )
+    except (ValueError, KeyError) as exc:
+        LOGGER.warning("Manifest de ingesta ilegible (%s), se ignorará: %s", path, exc)
+        return None
+
+
+def delete_manifest(collection: str, manifests_dir: Path = MANIFESTS_DIR) -> None:
+    """Delete the manifest of a collection if it exists."""
+    manifest_path(collection, manifests_dir).unlink(missing_ok=True)
@@ -1,82 +1,218 @@
 """Conversational memory management."""
-from typing import Optional
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
 
 # langchain 0.3.0+ import for conversation buffer memory
 from langchain.memory.buffer import ConversationBufferMemory
 
+from app.core.constants import (
+    MEMORY_MAX_SESSIONS,
+    MEMORY_MAX_TOKENS,
+    MEMORY_MAX_TURNS,
+    MEMORY_SESSION_TTL_SECONDS,
+)
 from app.core.logger import get_logger
+from app.rag.tokens import count_tokens
 
 LOGGER = get_logger(__name__)
 
-# global cache for conversational memory (single conversation across all requests)
-# this allows maintaining conversation context across multiple API calls
-_cached_memory: Optional[ConversationBufferMemory] = None
+# conversation used by requests that do not send a conversation_id
+DEFAULT_CONVERSATION_ID = "default"
+
+
+class WindowedConversationMemory(ConversationBufferMemory):
+    """
+    Conversation buffer that only keeps the most recent turns.
+
+    After every saved turn the oldest messages are dropped until the history
+    fits both max_turns (question/answer pairs) and max_tokens, so the chat
+    history injected into prompts stays bounded. The latest turn is always kept.
+    """
+
+    max_turns: Optional[int] = None  # max question/answer pairs kept
+    max_tokens: Optional[int] = None  # max tokens kept across all messages
+
+    def save_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        super().save_context(inputs, outputs)
+        self._trim()
+
+    async def asave_context(self, inputs: Dict[str, Any], outputs: Dict[str, str]) -> None:
+        await super().asave_context(inputs, outputs)
+        self._trim()
+
+    def _trim(self) -> None:
+        """Drop the oldest turns that exceed the turn or token window."""
+        messages = list(self.chat_memory.messages)
+        original_length = len(messages)
+
+        # each turn is a human message followed by an AI message
+        if self.max_turns is not None and len(messages) > 2 * self.max_turns:
+            messages = messages[-2 * self.max_turns:]
+
+        if self.max_tokens is not None:
+            total = sum(count_tokens(str(message.content)) for message in messages)
+            while total > self.max_tokens and len(messages) > 2:
+                dropped = messages[:2]
+                messages = messages[2:]
+                total -= sum(count_tokens(str(message.content)) for message in dropped)
+
+        if len(messages) != original_length:
+            self.chat_memory.messages = messages
 
 
 def build_memory(
     memory_key: str = "chat_history",
     return_messages: bool = True,
     k: Optional[int] = None,
-) -> ConversationBufferMemory:
+    max_tokens: Optional[int] = None,
+) -> WindowedConversationMemory:
     """
     Build a new conversational memory buffer.
-    
+
     Args:
         memory_key: Key for storing chat history in the memory object
         return_messages: Whether to return messages as objects or strings
-        k: Optional limit (not implemented in ConversationBufferMemory)
-    
+        k: Optional limit of question/answer turns kept (None keeps all)
+        max_tokens: Optional limit of tokens kept in the history (None keeps all)
+
     Returns:
         Configured memory instance
     """
     # create a new conversation buffer memory instance
-    # this stores the full conversation history in memory
-    memory = ConversationBufferMemory(
+    # the window limits how much history is injected into prompts
+    return WindowedConversationMemory(
         memory_key=memory_key,
         return_messages=return_messages,
         output_key="answer",
+        max_turns=k,
+        max_tokens=max_tokens,
     )
-    
-    # warn if k limit is requested (not supported by ConversationBufferMemory)
-    if k is not None:
-        LOGGER.warning(
-            "ConversationBufferMemory no implementa recortes por k=%s. "
-            "Considera un buffer window si necesitas limitación.",
-            k,
-        )
-    
-    return memory
-
-
-def get_memory() -> ConversationBufferMemory:
+
+
+@dataclass
+class _Session:
+    """A conversation memory and the last time it was used."""
+    memory: WindowedConversationMemory
+    last_access: float
+
+
+class ConversationMemoryStore:
     """
-    Get or create the cached conversational memory.
-    
-    Returns the same memory instance across all requests to maintain
-    conversation continuity. This implements a single global conversation.
-    
+    Conversation memories keyed by conversation_id.
+
+    Sessions are kept in least-recently-used order: idle sessions expire after
+    ttl_seconds and the least recently used one is evicted when max_sessions
+    is exceeded. The store lock only guards the session map; each conversation
+    has its own memory object, so requests on different conversations never
+    share state.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = MEMORY_MAX_SESSIONS,
+        ttl_seconds: float = MEMORY_SESSION_TTL_SECONDS,
+        max_turns: Optional[int] = MEMORY_MAX_TURNS,
+        max_tokens: Optional[int] = MEMORY_MAX_TOKENS,
+    ):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted_lru = 0
+        self.evicted_ttl = 0
+
+    def get(self, conversation_id: str) -> WindowedConversationMemory:
+        """Get the memory of a conversation, creating it if needed."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            session = self._sessions.get(conversation_id)
+            if session is None:
+                session = _Session(
+                    memory=build_memory(k=self.max_turns, max_tokens=self.max_tokens),
+                    last_access=now,
+                )
+                self._sessions[conversation_id] = session
+                # evict the least recently used sessions beyond the cap
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evicted_lru += 1
+            else:
+                self._sessions.move_to_end(conversation_id)
+                session.last_access = now
+            return session.memory
+
+    def clear(self, conversation_id: str) -> None:
+        """Forget a conversation."""
+        with self._lock:
+            self._sessions.pop(conversation_id, None)
+
+    def clear_all(self) -> None:
+        """Forget every conversation."""
+        with self._lock:
+            self._sessions.clear()
+
+    def _evict_expired(self, now: float) -> None:
+        """Drop sessions idle for longer than the TTL (oldest are first)."""
+        while self._sessions:
+            conversation_id, session = next(iter(self._sessions.items()))
+            if now - session.last_access <= self.ttl_seconds:
+                break
+            del self._sessions[conversation_id]
+            self.evicted_ttl += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of live sessions and eviction counters."""
+        with self._lock:
+            self._evict_expired(time.monotonic())
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "messages": sum(
+                    len(session.memory.chat_memory.messages) for session in self._sessions.values()
+                ),
+                "evicted_lru": self.evicted_lru,
+                "evicted_ttl": self.evicted_ttl,
+            }
+
+
+# process-wide store of conversation memories
+_memory_store = ConversationMemoryStore()
+
+
+def get_memory_store() -> ConversationMemoryStore:
+    """Get the process-wide conversation memory store."""
+    return _memory_store
+
+
+def get_memory(conversation_id: Optional[str] = None) -> WindowedConversationMemory:
+    """
+    Get or create the memory of a conversation.
+
+    Requests without a conversation_id share the default conversation,
+    which keeps the behavior of clients that never send one.
+
+    Args:
+        conversation_id: Conversation identifier sent by the client
+
     Returns:
-        Cached ConversationBufferMemory instance
+        Memory instance of the conversation
     """
-    global _cached_memory
-    
-    # create memory on first call, then reuse the same instance
-    # this ensures all requests share the same conversation history
-    if _cached_memory is None:
-        _cached_memory = build_memory()
-    
-    return _cached_memory
+    return _memory_store.get(conversation_id or DEFAULT_CONVERSATION_ID)
 
 
-def clear_memory() -> None:
+def clear_memory(conversation_id: Optional[str] = None) -> None:
     """
-    Clear the cached conversational memory.
-    
+    Clear the memory of a conversation.
+
     This will reset the conversation history. Useful for starting a new conversation.
-    """
-    global _cached_memory
-    
-    # clear the memory if it exists
-    if _cached_memory is not None:
-        _cached_memory.clear()
 
+    Args:
+        conversation_id: Conversation to clear (the default conversation if None)
+    """
+    _memory_store.clear(conversation_id or DEFAULT_CONVERSATION_ID)
@@ -0,0 +1,251 @@
+"""ONNX Runtime backend for the sentence-transformers embedding model."""
+import inspect
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.core.logger import get_logger
+from app.rag.embedding_cache import _FileLock
+
+LOGGER = get_logger(__name__)
+
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+META_FILE = "export.json"
+ONNX_OPSET = 14
+
+# sentences used to compare ONNX vectors against the PyTorch model
+PARITY_SENTENCES = [
+    "¿Qué hacer en caso de quemadura de segundo grado?",
+    "Aplique presión directa sobre la herida para detener la hemorragia.",
+    "La reanimación cardiopulmonar combina compresiones torácicas y ventilaciones.",
+    "Si la persona está inconsciente pero respira, colóquela en posición lateral de seguridad.",
+    "Signos de hipotermia: temblores, confusión y piel fría y pálida.",
+    "Never give food or drink to an unconscious casualty.",
+]
+
+# minimum cosine similarity against PyTorch accepted for each precision
+PARITY_MIN_COSINE = {"fp32": 0.999, "int8": 0.98}
+
+
+def _import_onnxruntime():
+    try:
+        import onnxruntime
+    except ImportError as exc:
+        raise ImportError(
+            "onnxruntime no está instalado. Ejecuta `pip install onnxruntime` "
+            "o usa EMBEDDING_BACKEND=torch."
+        ) from exc
+    return onnxruntime
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence embeddings computed with ONNX Runtime.
+
+    Reproduces the sentence-transformers pipeline of the exported model
+    (tokenize with the same tokenizer and max_seq_length, run the transformer,
+    mean-pool over the attention mask), so vectors match the PyTorch backend.
+    """
+
+    def __init__(
+        self,
+        model_dir: Path,
+        quantized: bool = False,
+        batch_size: int = 32,
+        intra_op_threads: Optional[int] = None,
+    ):
+        ort = _import_onnxruntime()
+        from transformers import AutoTokenizer
+
+        self.model_dir = Path(model_dir)
+        self.quantized = quantized
+        self.batch_size = batch_size
+        meta = json.loads((self.model_dir / META_FILE).read_text(encoding="utf-8"))
+        self.max_seq_length = int(meta["max_seq_length"])
+        self.normalize = bool(meta.get("normalize", False))
+        self.tokenizer = AutoTokenizer.from_pretrained(str(self.model_dir))
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        model_path = self.model_dir / (INT8_FILE if quantized else FP32_FILE)
+        self.session = ort.InferenceSession(
+            str(model_path), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {node.name for node in self.session.get_inputs()}
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # same preprocessing as HuggingFaceEmbeddings
+        texts = [text.replace("\n", " ") for text in texts]
+        vectors: List[List[float]] = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self._encode(texts[start:start + self.batch_size]).tolist())
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def _encode(self, texts: Sequence[str]) -> np.ndarray:
+        encoded = self.tokenizer(
+            list(texts),
+            padding=True,
+            truncation=True,
+            max_length=self.max_seq_length,
+            return_tensors="np",
+        )
+        inputs = {
+            name: encoded[name].astype(np.int64)
+            for name in ("input_ids", "attention_mask", "token_type_ids")
+            if name in self._input_names and name in encoded
+        }
+        hidden = self.session.run(None, inputs)[0]
+        # mean pooling over real tokens, as the sentence-transformers Pooling layer
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled
+
+
+def export_onnx_model(model_name: str, model_dir: Path, quantize: bool = True) -> Dict[str, Any]:
+    """
+    Export a sentence-transformers model to ONNX (and optionally int8).
+
+    The export uses the same weights, tokenizer and max_seq_length as the
+    PyTorch backend, then compares both backends on PARITY_SENTENCES. The
+    result is stored next to the model in export.json.
+
+    Returns:
+        Export metadata, including the parity report of each precision
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model_dir = Path(model_dir)
+    model_dir.mkdir(parents=True, exist_ok=True)
+    LOGGER.info("Exportando '%s' a ONNX en %s", model_name, model_dir)
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0]
+    pooling = next((module for module in st_model if type(module).__name__ == "Pooling"), None)
+    if pooling is not None and getattr(pooling, "pooling_mode_mean_tokens", True) is not True:
+        raise ValueError(f"El modelo '{model_name}' no usa mean pooling; no se puede exportar a ONNX")
+
+    class _Encoder(torch.nn.Module):
+        """Return only the token embeddings of the transformer."""
+
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, input_ids, attention_mask):
+            return self.auto_model(input_ids=input_ids, attention_mask=attention_mask)[0]
+
+    sample = transformer.tokenizer(["hola"], return_tensors="pt")
+    dynamic_axes = {"input_ids": {0: "batch", 1: "sequence"}, "attention_mask": {0: "batch", 1: "sequence"}}
+    fp32_path = model_dir / FP32_FILE
+    export_kwargs: Dict[str, Any] = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        # recent torch versions default to the dynamo exporter, which ignores dynamic_axes
+        export_kwargs["dynamo"] = False
+    with torch.no_grad():
+        torch.onnx.export(
+            _Encoder(transformer.auto_model.eval()),
+            (sample["input_ids"], sample["attention_mask"]),
+            str(fp32_path),
+            input_names=["input_ids", "attention_mask"],
+            output_names=["token_embeddings"],
+            dynamic_axes={**dynamic_axes, "token_embeddings": {0: "batch", 1: "sequence"}},
+            opset_version=ONNX_OPSET,
+            **export_kwargs,
+        )
+    transformer.tokenizer.save_pretrained(str(model_dir))
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        # weights become int8, activations are quantized on the fly
+        quantize_dynamic(str(fp32_path), str(model_dir / INT8_FILE), weight_type=QuantType.QInt8)
+
+    meta: Dict[str, Any] = {
+        "model_name": model_name,
+        "max_seq_length": int(st_model.max_seq_length),
+        "normalize": any(type(module).__name__ == "Normalize" for module in st_model),
+        "parity": {},
+    }
+    (model_dir / META_FILE).write_text(json.dumps(meta, indent=2), encoding="utf-8")
+
+    # compare against the PyTorch vectors before anyone relies on the export
+    reference = st_model.encode([text.replace("\n", " ") for text in PARITY_SENTENCES])
+    for precision, quantized in (("fp32", False), ("int8", True)):
+        if quantized and not quantize:
+            continue
+        candidate = OnnxEmbeddings(model_dir, quantized=quantized).embed_documents(PARITY_SENTENCES)
+        meta["parity"][precision] = parity_report(reference, candidate, PARITY_MIN_COSINE[precision])
+    (model_dir / META_FILE).write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    return meta
+
+
+def parity_report(
+    reference: Sequence[Sequence[float]],
+    candidate: Sequence[Sequence[float]],
+    min_cosine: float,
+) -> Dict[str, Any]:
+    """Compare two sets of vectors row by row with cosine similarity."""
+    ref = np.asarray(reference, dtype=np.float32)
+    cand = np.asarray(candidate, dtype=np.float32)
+    cosine = (ref * cand).sum(axis=1) / (
+        np.linalg.norm(ref, axis=1) * np.linalg.norm(cand, axis=1) + 1e-12
+    )
+    return {
+        "min_cosine": float(cosine.min()),
+        "mean_cosine": float(cosine.mean()),
+        "max_abs_diff": float(np.abs(ref - cand).max()),
+        "threshold": min_cosine,
+        "passed": bool(cosine.min() >= min_cosine),
+    }
+
+
+def load_onnx_embeddings(
+    model_name: str,
+    model_dir: Path,
+    quantized: bool,
+    intra_op_threads: Optional[int] = None,
+) -> OnnxEmbeddings:
+    """
+    Load the ONNX export of a model, exporting it on first use.
+
+    Raises:
+        ImportError: If onnxruntime is not installed
+        ValueError: If the export does not match the PyTorch vectors
+    """
+    _import_onnxruntime()
+    model_dir = Path(model_dir)
+    model_file = model_dir / (INT8_FILE if quantized else FP32_FILE)
+    meta_path = model_dir / META_FILE
+    model_dir.parent.mkdir(parents=True, exist_ok=True)
+    # several server workers may start at once: only one of them exports
+    with _FileLock(model_dir.parent / f".{model_dir.name}.lock"):
+        if not model_file.exists() or not meta_path.exists():
+            # exporting needs PyTorch once; afterwards only onnxruntime is loaded
+            export_onnx_model(model_name, model_dir, quantize=True)
+
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    precision = "int8" if quantized else "fp32"
+    report = meta.get("parity", {}).get(precision)
+    if report is not None:
+        LOGGER.info(
+            "Paridad ONNX %s vs PyTorch: coseno mínimo %.5f (umbral %.3f)",
+            precision, report["min_cosine"], report["threshold"],
+        )
+        if not report["passed"]:
+            raise ValueError(
+                f"El modelo ONNX {precision} no coincide con PyTorch "
+                f"(coseno mínimo {report['min_cosine']:.5f} < {report['threshold']})"
+            )
+    return OnnxEmbeddings(model_dir, quantized=quantized, intra_op_threads=intra_op_threads)
@@ -0,0 +1,82 @@
+"""Generator helpers for the streaming ingestion pipeline."""
+import queue
+import threading
+from typing import Iterable, Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+# marks the end of a stage's output
+_DONE = object()
+
+
+class _StageError:
+    """An exception raised by a producer stage, forwarded to the consumer."""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def batched(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """Group items into lists of at most size elements."""
+    batch: List[T] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def threaded(items: Iterable[T], maxsize: int, name: str = "ingest-stage") -> Iterator[T]:
+    """
+    Consume an iterable in a background thread, through a bounded queue.
+
+    The producer thread blocks once maxsize items are waiting, so a slow
+    consumer applies backpressure to the stages upstream instead of letting
+    their output pile up in memory. Exceptions raised by the producer are
+    re-raised in the consumer, and closing the returned generator stops the
+    producer.
+    """
+    buffer: "queue.Queue[object]" = queue.Queue(maxsize=max(1, maxsize))
+    stopped = threading.Event()
+
+    def _put(item: object) -> bool:
+        # retry with a timeout so the producer notices when the consumer is gone
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce() -> None:
+        iterator = iter(items)
+        try:
+            for item in iterator:
+                if not _put(item):
+                    return
+        except BaseException as exc:
+            _put(_StageError(exc))
+            return
+        finally:
+            # propagate the shutdown to upstream generator stages
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+        _put(_DONE)
+
+    producer = threading.Thread(target=_produce, name=name, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _StageError):
+                raise item.error
+            yield item
+    finally:
+        stopped.set()
+        producer.join()
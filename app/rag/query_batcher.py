@@ -0,0 +1,114 @@
+"""Micro-batching of concurrent query embeddings."""
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.core.constants import QUERY_BATCH_MAX_SIZE, QUERY_BATCH_MAX_WAIT_MS
+from app.core.logger import get_logger
+from app.core.metrics import Histogram
+
+LOGGER = get_logger(__name__)
+
+# a queued query: text, future resolved with its vector, enqueue time
+_Pending = Tuple[str, "asyncio.Future[List[float]]", float]
+
+
+class QueryEmbeddingBatcher:
+    """
+    Groups concurrent query embeddings into a single model call.
+
+    The first queued query opens a window of max_wait_ms; every query that
+    arrives before it closes (up to max_batch_size) is embedded with the same
+    embed_documents call on a worker thread, and each caller gets its own
+    vector back. While a batch runs, new queries keep queueing, so batches
+    grow with load and stay at size one when the service is idle.
+    """
+
+    def __init__(
+        self,
+        embed_batch: Callable[[List[str]], List[List[float]]],
+        max_batch_size: int = QUERY_BATCH_MAX_SIZE,
+        max_wait_ms: float = QUERY_BATCH_MAX_WAIT_MS,
+    ):
+        self.embed_batch = embed_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.batch_size = Histogram(
+            "query_embedding_batch_size",
+            buckets=[1, 2, 4, 8, 16, 32, 64, 128],
+            description="Queries embedded per model call",
+        )
+        self.queue_wait = Histogram(
+            "query_embedding_queue_wait_ms",
+            buckets=[0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000],
+            description="Time a query waited before its batch started (ms)",
+        )
+        self._queue: Optional["asyncio.Queue[_Pending]"] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._worker: Optional["asyncio.Task[None]"] = None
+
+    async def embed(self, text: str) -> List[float]:
+        """Embed a query, batched with the other queries in flight."""
+        queue = self._ensure_worker()
+        future: "asyncio.Future[List[float]]" = asyncio.get_running_loop().create_future()
+        queue.put_nowait((text, future, time.perf_counter()))
+        return await future
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batch_size": self.batch_size.snapshot(),
+            "queue_wait_ms": self.queue_wait.snapshot(),
+        }
+
+    def _ensure_worker(self) -> "asyncio.Queue[_Pending]":
+        """Start the collector task on the running loop (again if the loop changed)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._collect(self._queue))
+        return self._queue
+
+    async def _collect(self, queue: "asyncio.Queue[_Pending]") -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                # take what is already queued, then wait for the rest of the window
+                if not queue.empty():
+                    batch.append(queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            await self._run_batch(batch)
+
+    async def _run_batch(self, batch: List[_Pending]) -> None:
+        started = time.perf_counter()
+        for _, _, enqueued in batch:
+            self.queue_wait.observe((started - enqueued) * 1000)
+
+        # identical questions in the same window share one vector
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        self.batch_size.observe(len(texts))
+        try:
+            vectors = await asyncio.to_thread(self.embed_batch, texts)
+        except Exception as exc:
+            LOGGER.error("Error embebiendo un lote de %s preguntas: %s", len(texts), exc)
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        by_text = dict(zip(texts, vectors))
+        for text, future, _ in batch:
+            # callers that gave up (cancelled requests) are skipped
+            if not future.done():
+                future.set_result(list(by_text[text]))
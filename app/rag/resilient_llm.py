@@ -0,0 +1,322 @@
+"""Resilient LLM invocation: per-call deadlines, hedged requests, bounded retries and a fallback model."""
+import asyncio
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+
+from app.core.constants import (
+    LLM_BREAKER_FAILURES,
+    LLM_BREAKER_RESET_SECONDS,
+    LLM_HEDGE_MIN_DELAY,
+    LLM_HEDGE_PERCENTILE,
+    LLM_HEDGING_ENABLED,
+    LLM_RETRY_ATTEMPTS,
+    LLM_RETRY_BASE_DELAY,
+    LLM_RETRY_MAX_DELAY,
+    LLM_TIMEOUT_SECONDS,
+)
+from app.core.logger import get_logger
+from app.core.metrics import get_metrics_registry
+from app.core.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    LatencyWindow,
+    acall_with_retry,
+    ahedged,
+    call_with_retry,
+    get_circuit_breaker,
+    is_transient_error,
+)
+
+LOGGER = get_logger(__name__)
+
+
+class LLMDeadlineExceeded(TimeoutError):
+    """Raised when an LLM call does not answer within its deadline."""
+
+    def __init__(self, model: str, deadline: float):
+        super().__init__(f"El LLM '{model}' no respondió en {deadline:.1f}s")
+        self.model = model
+        self.deadline = deadline
+
+
+class LLMCallStats:
+    """Counters of deadlines, hedged requests and fallbacks, reported by /health."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: Dict[str, Dict[str, int]] = {}
+        self._latencies: Dict[str, LatencyWindow] = {}
+
+    def latency(self, model: str) -> LatencyWindow:
+        """Latency window of a model's successful non-streaming calls, which sets its hedging delay."""
+        with self._lock:
+            window = self._latencies.get(model)
+            if window is None:
+                window = self._latencies[model] = LatencyWindow()
+            return window
+
+    def record(self, model: str, event: str, **labels: str) -> None:
+        """Count a deadline, hedge or fallback event of a model."""
+        with self._lock:
+            counters = self._models.setdefault(model, {"deadlines": 0, "hedges": 0, "fallbacks": 0})
+            counters[event] += 1
+        get_metrics_registry().counter(
+            f"llm_{event}_total",
+            _EVENT_DESCRIPTIONS[event],
+            model=model,
+            **labels,
+        ).inc()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = {model: dict(counters) for model, counters in self._models.items()}
+            windows = dict(self._latencies)
+        for model in set(models) | set(windows):
+            counters = models.setdefault(model, {"deadlines": 0, "hedges": 0, "fallbacks": 0})
+            counters["hedge_after_seconds"] = _hedge_delay(windows[model]) if model in windows else None
+        return {
+            "timeout_seconds": LLM_TIMEOUT_SECONDS,
+            "retry_attempts": LLM_RETRY_ATTEMPTS,
+            "hedging_enabled": LLM_HEDGING_ENABLED,
+            "models": models,
+        }
+
+
+_EVENT_DESCRIPTIONS = {
+    "deadlines": "LLM calls that exceeded their deadline",
+    "hedges": "Hedged (duplicate) LLM requests sent after the p95 delay",
+    "fallbacks": "LLM calls answered by the fallback model",
+}
+
+
+class ResilientChatModel(BaseChatModel):
+    """
+    Chat model that guards every call to a primary model.
+
+    Each attempt has a deadline (timeout). When hedging is on and the
+    attempt is still running after the model's observed p95 latency, an
+    identical request is sent and the first answer wins. Transient errors
+    (deadlines, 5xx, 429, transport errors) are retried with jittered
+    backoff under a per-model circuit breaker; once the primary model's
+    attempts are spent, or its circuit is open, the call goes to the
+    fallback model. Streams get the deadline on every chunk and only fall
+    back before the first token was sent. Sync calls have no hedging and
+    rely on the client timeout for their deadline.
+
+    Callers' callbacks see one run per call; the wrapped clients report each
+    attempt to their own callbacks (LLMUsageRecorder), hedged ones included.
+    """
+
+    primary: BaseChatModel
+    fallback: Optional[BaseChatModel] = None
+    timeout: float = LLM_TIMEOUT_SECONDS
+    attempts: int = LLM_RETRY_ATTEMPTS
+    hedging: bool = LLM_HEDGING_ENABLED
+
+    @property
+    def _llm_type(self) -> str:
+        return "resilient_chat_model"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {
+            "primary": model_name(self.primary),
+            "fallback": model_name(self.fallback) if self.fallback is not None else None,
+        }
+
+    def _candidates(self) -> List[BaseChatModel]:
+        return [self.primary] if self.fallback is None else [self.primary, self.fallback]
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        candidates = self._candidates()
+        for index, model in enumerate(candidates):
+            name = model_name(model)
+            try:
+                result = call_with_retry(
+                    lambda: model.generate([messages], stop=stop, **kwargs),
+                    breaker=_breaker(name),
+                    attempts=self.attempts,
+                    base_delay=LLM_RETRY_BASE_DELAY,
+                    max_delay=LLM_RETRY_MAX_DELAY,
+                )
+            except Exception as exc:
+                if index + 1 >= len(candidates) or not _should_fall_back(exc):
+                    raise
+                self._fall_back(name, candidates[index + 1], exc)
+                continue
+            return ChatResult(generations=result.generations[0], llm_output=result.llm_output)
+        raise AssertionError("unreachable")
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        candidates = self._candidates()
+        for index, model in enumerate(candidates):
+            name = model_name(model)
+
+            async def call(model: BaseChatModel = model) -> ChatResult:
+                result = await model.agenerate([messages], stop=stop, **kwargs)
+                return ChatResult(generations=result.generations[0], llm_output=result.llm_output)
+
+            try:
+                return await acall_with_retry(
+                    lambda: self._attempt(name, call),
+                    breaker=_breaker(name),
+                    attempts=self.attempts,
+                    base_delay=LLM_RETRY_BASE_DELAY,
+                    max_delay=LLM_RETRY_MAX_DELAY,
+                )
+            except Exception as exc:
+                if index + 1 >= len(candidates) or not _should_fall_back(exc):
+                    raise
+                self._fall_back(name, candidates[index + 1], exc)
+        raise AssertionError("unreachable")
+
+    async def _attempt(self, name: str, call: Callable[[], Awaitable[ChatResult]]) -> ChatResult:
+        """One attempt against a model: hedged after its p95 latency, bounded by the deadline."""
+        window = _stats.latency(name)
+        hedge_after = _hedge_delay(window) if self.hedging else None
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(
+                ahedged(call, hedge_after, on_hedge=lambda: _stats.record(name, "hedges")),
+                self.timeout,
+            )
+        except asyncio.TimeoutError:
+            _stats.record(name, "deadlines")
+            raise LLMDeadlineExceeded(name, self.timeout) from None
+        window.observe(time.perf_counter() - started)
+        return result
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        candidates = self._candidates()
+        for index, model in enumerate(candidates):
+            name = model_name(model)
+            breaker = _breaker(name)
+            try:
+                breaker.before_call()
+            except CircuitOpenError as exc:
+                if index + 1 >= len(candidates):
+                    raise
+                self._fall_back(name, candidates[index + 1], exc)
+                continue
+
+            # the breaker sees one call per model, as with call_with_retry; streams are not
+            # sampled in the latency window, whose p95 is the delay of a full answer
+            ended = sent = False
+            try:
+                for attempt in range(max(1, self.attempts)):
+                    stream = model.astream(messages, stop=stop, **kwargs).__aiter__()
+                    try:
+                        while True:
+                            try:
+                                chunk = await asyncio.wait_for(stream.__anext__(), self.timeout)
+                            except StopAsyncIteration:
+                                break
+                            except asyncio.TimeoutError:
+                                _stats.record(name, "deadlines")
+                                raise LLMDeadlineExceeded(name, self.timeout) from None
+                            sent = True
+                            yield ChatGenerationChunk(message=_as_chunk(chunk))
+                    except Exception as exc:
+                        # tokens already reached the client: the answer cannot be restarted
+                        if sent or not is_transient_error(exc) or attempt + 1 >= self.attempts:
+                            raise
+                        breaker.record_retry()
+                        LOGGER.debug("Error transitorio del LLM '%s' (%s), reintentando", name, exc)
+                        continue
+                    finally:
+                        await _aclose(stream)
+                    ended = True
+                    breaker.record_success()
+                    return
+            except Exception as exc:
+                ended = True
+                if not is_transient_error(exc):
+                    breaker.record_ignored()
+                    raise
+                breaker.record_failure()
+                if sent or index + 1 >= len(candidates):
+                    raise
+                self._fall_back(name, candidates[index + 1], exc)
+            finally:
+                # the consumer stopped the stream (client disconnect, cancellation): end the
+                # call without judging the model, so a half-open trial does not stay pending
+                if not ended:
+                    breaker.record_ignored()
+
+    @staticmethod
+    def _fall_back(name: str, fallback: BaseChatModel, exc: BaseException) -> None:
+        reason = "circuit_open" if isinstance(exc, CircuitOpenError) else (
+            "deadline" if isinstance(exc, TimeoutError) else "error"
+        )
+        _stats.record(name, "fallbacks", reason=reason)
+        LOGGER.warning(
+            "LLM '%s' no disponible (%s), respondiendo con el modelo de respaldo '%s'",
+            name, exc, model_name(fallback),
+        )
+
+
+def model_name(model: BaseChatModel) -> str:
+    """Model name of a chat model client (without the models/ prefix)."""
+    name = getattr(model, "model", None) or getattr(model, "model_name", None) or type(model).__name__
+    return str(name).replace("models/", "")
+
+
+def _breaker(name: str) -> CircuitBreaker:
+    return get_circuit_breaker(f"llm:{name}", LLM_BREAKER_FAILURES, LLM_BREAKER_RESET_SECONDS)
+
+
+def _hedge_delay(window: LatencyWindow) -> Optional[float]:
+    """Delay before a hedged request: the window's p95, never below LLM_HEDGE_MIN_DELAY."""
+    percentile = window.percentile(LLM_HEDGE_PERCENTILE)
+    return None if percentile is None else max(LLM_HEDGE_MIN_DELAY, percentile)
+
+
+def _should_fall_back(exc: BaseException) -> bool:
+    return isinstance(exc, CircuitOpenError) or is_transient_error(exc)
+
+
+def _as_chunk(message: BaseMessage) -> AIMessageChunk:
+    if isinstance(message, AIMessageChunk):
+        return message
+    return AIMessageChunk(content=message.content)
+
+
+async def _aclose(stream: Any) -> None:
+    aclose = getattr(stream, "aclose", None)
+    if aclose is not None:
+        try:
+            await aclose()
+        except Exception:
+            pass
+
+
+_stats = LLMCallStats()
+
+
+def get_llm_call_stats() -> Dict[str, Any]:
+    """Return deadline, hedge and fallback counters and the current hedging delays per model."""
+    return _stats.stats()
@@ -0,0 +1,223 @@
+"""Process-wide registry of the resources used to answer questions."""
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.core.config import Settings, get_settings
+from app.core.constants import WARMUP_LLM_ENABLED
+from app.core.logger import get_logger
+from app.rag.embeddings import EmbeddingConfig, get_embedding_model
+from app.rag.llm_chain import build_retrieval_qa_chain, get_llm
+from app.rag.retriever import get_retriever
+from app.rag.vectorstore import get_collection_generation, get_vector_client, load_vectorstore
+
+LOGGER = get_logger(__name__)
+
+# question sent through the embedding model and the retriever during warmup
+WARMUP_QUESTION = "¿Qué hacer ante una quemadura?"
+# prompt sent to the LLM during warmup (WARMUP_LLM_ENABLED)
+WARMUP_PROMPT = "Responde únicamente: OK"
+
+
+@dataclass
+class ComponentStatus:
+    """Readiness of one resource."""
+    ready: bool = False
+    error: Optional[str] = None  # last load or warmup error
+    warmup_ms: Optional[float] = None  # duration of the last successful warmup
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "error": self.error,
+            "warmup_ms": round(self.warmup_ms, 1) if self.warmup_ms is not None else None,
+        }
+
+
+class ResourceRegistry:
+    """
+    Owner of the embedding model, vector client, vectorstore, retriever and LLM client.
+
+    The application lifespan starts a warmup that loads each resource and runs
+    a real call through it (a query embedding, a retrieval, a one-line prompt),
+    so the first user does not pay for connections and lazy initialization.
+    Request dependencies read the resources from here; if a resource failed to
+    warm up it is loaded on demand, as before. The vectorstore and retriever
+    are rebuilt when /ingest bumps the collection generation.
+    """
+
+    COMPONENTS = ("embedding_model", "vector_client", "vectorstore", "retriever", "llm")
+
+    def __init__(self, settings: Optional[Settings] = None):
+        self._settings = settings
+        self._lock = threading.RLock()
+        self.embedding_config: Optional[EmbeddingConfig] = None
+        self.vector_client: Optional[Any] = None
+        self._vectorstore: Optional[Any] = None
+        self._retriever: Optional[Any] = None
+        # collection generation the vectorstore and retriever were built for
+        self._generation: Optional[int] = None
+        self.status: Dict[str, ComponentStatus] = {name: ComponentStatus() for name in self.COMPONENTS}
+        self._warmup_task: Optional["asyncio.Task[bool]"] = None
+
+    @property
+    def settings(self) -> Settings:
+        return self._settings or get_settings()
+
+    def get_embedding_config(self) -> EmbeddingConfig:
+        """Return the embedding model."""
+        with self._lock:
+            if self.embedding_config is None:
+                self.embedding_config = self._track("embedding_model", get_embedding_model)
+            return self.embedding_config
+
+    def get_vector_client(self) -> Any:
+        """Return the client of the configured vector backend."""
+        with self._lock:
+            if self.vector_client is None:
+                self.vector_client = self._track("vector_client", lambda: get_vector_client(self.settings))
+            return self.vector_client
+
+    def get_vectorstore(self) -> Any:
+        """Return the vectorstore, reloaded after /ingest rewrote the collection."""
+        generation = get_collection_generation()
+        with self._lock:
+            if self._vectorstore is None or self._generation != generation:
+                client = self.get_vector_client()
+                self._vectorstore = self._track(
+                    "vectorstore", lambda: load_vectorstore(settings=self.settings, client=client)
+                )
+                self._retriever = None
+                self._generation = generation
+            return self._vectorstore
+
+    def get_retriever(self) -> Any:
+        """Return the retriever over the current vectorstore."""
+        with self._lock:
+            vectorstore = self.get_vectorstore()
+            if self._retriever is None:
+                self._retriever = self._track(
+                    "retriever", lambda: get_retriever(vectorstore=vectorstore, settings=self.settings)
+                )
+            return self._retriever
+
+    def get_llm(self) -> Any:
+        """Return the default LLM client (shared through the chain registry)."""
+        return self._track("llm", lambda: get_llm(settings=self.settings))
+
+    def _track(self, name: str, load: Callable[[], Any]) -> Any:
+        """Load a resource, recording its readiness."""
+        status = self.status[name]
+        try:
+            resource = load()
+        except Exception as exc:
+            status.ready = False
+            status.error = str(exc)
+            raise
+        status.ready = True
+        status.error = None
+        return resource
+
+    async def warmup(self) -> bool:
+        """Load every resource not yet ready and run a warmup call through it."""
+        started = time.perf_counter()
+        await self._warm("embedding_model", self._warm_embeddings)
+        await self._warm("vector_client", self._warm_vector_client)
+        await self._warm("vectorstore", lambda: asyncio.to_thread(self.get_vectorstore))
+        await self._warm("retriever", self._warm_retriever)
+        await self._warm("llm", self._warm_llm)
+        LOGGER.info(
+            "Warmup terminado en %.2fs: %s",
+            time.perf_counter() - started,
+            {name: status.ready for name, status in self.status.items()},
+        )
+        return self.ready
+
+    async def _warm(self, name: str, warm: Callable[[], Awaitable[Any]]) -> None:
+        status = self.status[name]
+        if status.ready and status.warmup_ms is not None:
+            return
+        started = time.perf_counter()
+        try:
+            await warm()
+        except Exception as exc:
+            status.ready = False
+            status.error = str(exc)
+            LOGGER.warning("Warmup de '%s' falló (se cargará bajo demanda): %s", name, exc)
+            return
+        status.ready = True
+        status.error = None
+        status.warmup_ms = (time.perf_counter() - started) * 1000
+
+    async def _warm_embeddings(self) -> None:
+        # the first forward pass initializes the model's kernels
+        config = await asyncio.to_thread(self.get_embedding_config)
+        await asyncio.to_thread(config.embedding.embed_query, WARMUP_QUESTION)
+
+    async def _warm_vector_client(self) -> None:
+        client = await asyncio.to_thread(self.get_vector_client)
+        heartbeat = getattr(client, "heartbeat", None)
+        if heartbeat is not None:
+            await asyncio.to_thread(heartbeat)
+
+    async def _warm_retriever(self) -> None:
+        retriever = await asyncio.to_thread(self.get_retriever)
+        # runs on the server loop, so the async ChromaDB handle is opened for it
+        await retriever.ainvoke(WARMUP_QUESTION)
+
+    async def _warm_llm(self) -> None:
+        llm = self.get_llm()
+        # prebuild the stateless chain for the default prompt
+        if self._retriever is not None:
+            build_retrieval_qa_chain(self._retriever, settings=self.settings)
+        if WARMUP_LLM_ENABLED:
+            await llm.ainvoke(WARMUP_PROMPT)
+
+    def start_warmup(self) -> "asyncio.Task[bool]":
+        """Start a warmup in the background unless one is already running."""
+        if self._warmup_task is None or self._warmup_task.done():
+            self._warmup_task = asyncio.get_running_loop().create_task(self.warmup())
+        return self._warmup_task
+
+    @property
+    def warming_up(self) -> bool:
+        return self._warmup_task is not None and not self._warmup_task.done()
+
+    @property
+    def ready(self) -> bool:
+        return all(status.ready for status in self.status.values())
+
+    def readiness(self) -> Dict[str, Any]:
+        """Return overall readiness and the status of every resource."""
+        return {
+            "ready": self.ready,
+            "warming_up": self.warming_up,
+            "components": {name: status.as_dict() for name, status in self.status.items()},
+        }
+
+    async def close(self) -> None:
+        """Stop a running warmup and release the resources."""
+        if self.warming_up:
+            self._warmup_task.cancel()
+            try:
+                await self._warmup_task
+            except (asyncio.CancelledError, Exception):
+                pass
+        with self._lock:
+            self._retriever = None
+            self._vectorstore = None
+            self.vector_client = None
+            self._generation = None
+            for status in self.status.values():
+                status.ready = False
+
+
+# process-wide registry, started and closed by the application lifespan
+_resource_registry = ResourceRegistry()
+
+
+def get_resource_registry() -> ResourceRegistry:
+    """Get the process-wide resource registry."""
+    return _resource_registry
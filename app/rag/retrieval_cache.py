@@ -0,0 +1,165 @@
+"""LRU cache of retrieval results keyed by normalized question and search parameters."""
+import json
+import re
+import sys
+import threading
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from app.core.constants import RETRIEVAL_CACHE_MAX_ENTRIES, RETRIEVAL_CACHE_MAX_MB
+from app.core.logger import get_logger
+from app.rag.vectorstore import get_collection_generation
+
+LOGGER = get_logger(__name__)
+
+# punctuation around a question that does not change what is retrieved
+_EDGE_PUNCTUATION = "¿?¡!.,;: \t\n\"'"
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Normalize a question for cache lookups: Unicode form, case, whitespace and edge punctuation."""
+    text = unicodedata.normalize("NFKC", question).casefold()
+    return _WHITESPACE.sub(" ", text).strip(_EDGE_PUNCTUATION)
+
+
+def retrieval_cache_key(question: str, search_type: str, search_kwargs: Dict[str, Any], *scope: Any) -> tuple:
+    """
+    Build the cache key of a retrieval.
+
+    scope holds whatever else selects the results (collection, lexical index),
+    so retrievers over different collections never share entries.
+    """
+    kwargs = json.dumps(search_kwargs, sort_keys=True, default=str)
+    return (normalize_question(question), search_type, kwargs, *scope)
+
+
+@dataclass(frozen=True)
+class _CachedRetrieval:
+    ids: Tuple[Optional[str], ...]  # chunk IDs, in retrieval order
+    documents: Tuple[Document, ...]
+    size: int  # approximate bytes held by the entry
+
+
+class RetrievalCache:
+    """
+    LRU cache of the documents a retriever returned for a question.
+
+    Questions are normalized, so repeated and trivially different questions
+    (case, spacing, ¿?) skip the query embedding and the vector search. Entries
+    keep the ordered chunk IDs and documents, bounded by count and by
+    approximate size. The cache is versioned by the collection generation:
+    everything is dropped once /ingest changes the collection, and results
+    retrieved against an older generation are never stored.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RETRIEVAL_CACHE_MAX_ENTRIES,
+        max_bytes: int = int(RETRIEVAL_CACHE_MAX_MB * 1024 * 1024),
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, _CachedRetrieval]" = OrderedDict()
+        self._bytes = 0
+        self._generation = get_collection_generation()
+        # counters reported by stats()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def lookup(self, key: tuple) -> Optional[List[Document]]:
+        """Return the cached documents of a retrieval, or None."""
+        with self._lock:
+            self._check_generation()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry.documents)
+
+    def store(self, key: tuple, documents: List[Document], generation: int) -> None:
+        """
+        Store the documents of a retrieval.
+
+        Args:
+            key: Key built by retrieval_cache_key
+            documents: Retrieved documents, in order
+            generation: Collection generation read before retrieval
+        """
+        entry = _CachedRetrieval(
+            ids=tuple(doc.id for doc in documents),
+            documents=tuple(documents),
+            size=_key_size(key) + sum(_document_size(doc) for doc in documents),
+        )
+        with self._lock:
+            self._check_generation()
+            if generation != self._generation or entry.size > self.max_bytes:
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.size
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop every cached retrieval."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _check_generation(self) -> None:
+        """Invalidate the cache if the collection changed since it was filled."""
+        generation = get_collection_generation()
+        if generation != self._generation:
+            self._generation = generation
+            self._entries.clear()
+            self._bytes = 0
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters, the number of entries and their approximate size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def _document_size(doc: Document) -> int:
+    """Approximate bytes held by a document (text, ID and metadata)."""
+    metadata = sum(sys.getsizeof(key) + sys.getsizeof(value) for key, value in (doc.metadata or {}).items())
+    return sys.getsizeof(doc.page_content) + sys.getsizeof(doc.id or "") + metadata
+
+
+def _key_size(key: tuple) -> int:
+    return sum(sys.getsizeof(part) for part in key)
+
+
+# process-wide retrieval cache
+_retrieval_cache = RetrievalCache()
+
+
+def get_retrieval_cache() -> RetrievalCache:
+    """Get the process-wide retrieval cache."""
+    return _retrieval_cache
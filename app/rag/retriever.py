@@ -1,31 +1,510 @@
 """Retriever configuration for semantic search."""
-from typing import Any, Dict, Optional
+import asyncio
+from typing import Any, Dict, List, Optional, Sequence
 
-from app.rag.vectorstore import load_vectorstore
+import numpy as np
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict, Field, PrivateAttr
+
+from app.core.chroma_client import is_missing_collection_error
+from app.core.config import Settings, get_async_chroma_client, load_settings
+from app.core.constants import (
+    HYBRID_LEXICAL_K,
+    HYBRID_RRF_K,
+    HYBRID_SEARCH_ENABLED,
+    RETRIEVAL_CACHE_ENABLED,
+)
+from app.core.metrics import stage_timer
+from app.rag.embeddings import aembed_query, get_embedding_model
+from app.rag.lexical_index import get_lexical_index
+from app.rag.local_index import LocalVectorStore
+from app.rag.retrieval_cache import get_retrieval_cache, retrieval_cache_key
+from app.rag.vectorstore import get_collection_generation, load_vectorstore
 from app.core.logger import get_logger
 
 LOGGER = get_logger(__name__)
 
 
+class AsyncVectorStoreRetriever(BaseRetriever):
+    """
+    Vectorstore retriever with a native async path.
+
+    Similarity and MMR searches query the vectorstore's collection by vector
+    and select MMR results with the vectorized mmr_select. The async path
+    embeds the query on a worker thread and queries ChromaDB through its
+    async HTTP client, so a slow retrieval never blocks the event loop.
+    Vectorstores without an async client run the by-vector search on a
+    worker thread instead. Threshold search uses the regular LangChain
+    VectorStoreRetriever.
+
+    With a lexical index, the BM25 search of the question runs concurrently
+    with the dense search and both rankings are merged by reciprocal-rank
+    fusion, so exact terms (drug names, dosages) are found without raising k.
+
+    Results are kept in the retrieval cache (use_cache), so a repeated
+    question skips the embedding and the searches until /ingest changes
+    the collection.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectorstore: Any  # LangChain vectorstore used for the sync path
+    search_type: str = "mmr"
+    search_kwargs: Dict[str, Any] = Field(default_factory=dict)
+    collection_name: Optional[str] = None  # ChromaDB collection for the async client
+    settings: Optional[Settings] = None
+    # collection whose BM25 index is fused with the dense results (None: dense only)
+    lexical_index: Optional[str] = None
+    lexical_k: int = HYBRID_LEXICAL_K  # lexical candidates entering the fusion
+    rrf_k: int = HYBRID_RRF_K  # reciprocal-rank fusion constant
+    use_cache: bool = RETRIEVAL_CACHE_ENABLED  # serve repeated questions from the retrieval cache
+
+    _delegate: Any = PrivateAttr(default=None)
+    _async_collection: Any = PrivateAttr(default=None)
+    _async_loop: Any = PrivateAttr(default=None)
+    _async_lock: Optional[asyncio.Lock] = PrivateAttr(default=None)
+    _async_disabled: bool = PrivateAttr(default=False)
+
+    def model_post_init(self, __context: Any) -> None:
+        # the stock retriever handles the sync path and every search type
+        self._delegate = self.vectorstore.as_retriever(
+            search_type=self.search_type,
+            search_kwargs=self.search_kwargs,
+        )
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        with stage_timer("ask", "retrieve"):
+            cached = self._cache_lookup(query)
+            if cached is not None:
+                return cached
+            generation = get_collection_generation()
+            documents = self._retrieve_sync(query, run_manager)
+            self._cache_store(query, documents, generation)
+            return documents
+
+    def _retrieve_sync(self, query: str, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        # threshold search has no by-vector variant, use the stock retriever
+        if self.search_type not in ("mmr", "similarity"):
+            return self._delegate.invoke(query, config={"callbacks": run_manager.get_child()})
+        with stage_timer("ask", "embed_query"):
+            embedding = get_embedding_model().embedding.embed_query(query)
+        with stage_timer("ask", "vector_search"):
+            dense = self._search_by_vector_sync(embedding)
+        if self.lexical_index is None:
+            return dense
+        ranked_ids = self._fuse(dense, self._lexical_search(query))
+        missing = [doc_id for doc_id in ranked_ids if doc_id not in _by_id(dense)]
+        with stage_timer("ask", "fetch_documents"):
+            fetched = self._fetch_documents_sync(missing)
+        return _ordered(ranked_ids, dense, fetched)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        with stage_timer("ask", "retrieve"):
+            cached = self._cache_lookup(query)
+            if cached is not None:
+                return cached
+            generation = get_collection_generation()
+            documents = await self._aretrieve(query)
+            self._cache_store(query, documents, generation)
+            return documents
+
+    def _cache_key(self, query: str) -> tuple:
+        return retrieval_cache_key(
+            query, self.search_type, self.search_kwargs, self.collection_name, self.lexical_index
+        )
+
+    def _cache_lookup(self, query: str) -> Optional[List[Document]]:
+        """Documents cached for the query (None on a miss or with the cache disabled)."""
+        if not self.use_cache:
+            return None
+        return get_retrieval_cache().lookup(self._cache_key(query))
+
+    def _cache_store(self, query: str, documents: List[Document], generation: int) -> None:
+        if self.use_cache:
+            get_retrieval_cache().store(self._cache_key(query), documents, generation)
+
+    async def _aretrieve(self, query: str) -> List[Document]:
+        # threshold search has no by-vector variant, run the stock path off the loop
+        if self.search_type not in ("mmr", "similarity"):
+            return await asyncio.to_thread(self._delegate.invoke, query)
+
+        # lexical search runs on a worker thread while the query is embedded and searched
+        async def dense_search() -> List[Document]:
+            with stage_timer("ask", "embed_query"):
+                embedding = await aembed_query(query)
+            with stage_timer("ask", "vector_search"):
+                return await self.asearch_by_vector(embedding)
+
+        if self.lexical_index is None:
+            return await dense_search()
+
+        dense, lexical = await asyncio.gather(
+            dense_search(), asyncio.to_thread(self._lexical_search, query)
+        )
+        ranked_ids = self._fuse(dense, lexical)
+        missing = [doc_id for doc_id in ranked_ids if doc_id not in _by_id(dense)]
+        with stage_timer("ask", "fetch_documents"):
+            fetched = await self._afetch_documents(missing)
+        return _ordered(ranked_ids, dense, fetched)
+
+    async def aretrieve_many(self, queries: List[str], embeddings: List[List[float]]) -> List[List[Document]]:
+        """
+        Retrieve the documents of several queries whose embeddings are already computed.
+
+        Queries missing from the retrieval cache are searched together: the
+        dense searches go to the collection as a single multi-query request
+        and the chunks found only by the lexical searches are fetched in one
+        call, so a batch of questions costs the round trips of a single one.
+        """
+        results: List[Optional[List[Document]]] = [self._cache_lookup(query) for query in queries]
+        missing = [i for i, documents in enumerate(results) if documents is None]
+        if missing:
+            generation = get_collection_generation()
+            retrieved = await self._aretrieve_many(
+                [queries[i] for i in missing], [embeddings[i] for i in missing]
+            )
+            for i, documents in zip(missing, retrieved):
+                results[i] = documents
+                self._cache_store(queries[i], documents, generation)
+        return results
+
+    async def _aretrieve_many(self, queries: List[str], embeddings: List[List[float]]) -> List[List[Document]]:
+        # threshold search has no by-vector variant, retrieve each query on its own
+        if self.search_type not in ("mmr", "similarity"):
+            return list(await asyncio.gather(*(self._aretrieve(query) for query in queries)))
+
+        async def dense_search() -> List[List[Document]]:
+            with stage_timer("ask", "vector_search"):
+                return await self.asearch_by_vectors(embeddings)
+
+        if self.lexical_index is None:
+            return await dense_search()
+
+        dense, lexical = await asyncio.gather(
+            dense_search(),
+            asyncio.to_thread(lambda: [self._lexical_search(query) for query in queries]),
+        )
+        rankings = [self._fuse(documents, ids) for documents, ids in zip(dense, lexical)]
+        missing = list(dict.fromkeys(
+            doc_id
+            for documents, ranked_ids in zip(dense, rankings)
+            for doc_id in ranked_ids
+            if doc_id not in _by_id(documents)
+        ))
+        with stage_timer("ask", "fetch_documents"):
+            fetched = await self._afetch_documents(missing)
+        return [_ordered(ranked_ids, documents, fetched) for ranked_ids, documents in zip(rankings, dense)]
+
+    async def asearch_by_vector(self, embedding: List[float]) -> List[Document]:
+        """Run the configured search for a precomputed query embedding."""
+        return (await self.asearch_by_vectors([embedding]))[0]
+
+    async def asearch_by_vectors(self, embeddings: List[List[float]]) -> List[List[Document]]:
+        """Run the configured search for several precomputed query embeddings in one request."""
+        collection = await self._get_async_collection()
+        if collection is None:
+            return await asyncio.to_thread(self._search_by_vectors_sync, embeddings)
+
+        try:
+            return await self._aquery_collection(collection, embeddings)
+        except Exception as exc:
+            # the collection may have been recreated by /ingest: refresh the handle once
+            # (transport errors and an open circuit are raised as they are, to fail fast)
+            if not is_missing_collection_error(exc):
+                raise
+            LOGGER.warning("Colección de Chroma no encontrada, recargando el handle: %s", exc)
+            self._async_collection = None
+            collection = await self._get_async_collection()
+            if collection is None:
+                return await asyncio.to_thread(self._search_by_vectors_sync, embeddings)
+            return await self._aquery_collection(collection, embeddings)
+
+    def _sync_collection(self) -> Any:
+        """Collection behind the vectorstore (Chroma wrapper or in-process index), if any."""
+        collection = getattr(self.vectorstore, "collection", None)
+        if collection is None:
+            collection = getattr(self.vectorstore, "_collection", None)
+        return collection
+
+    def _search_by_vector_sync(self, embedding: List[float]) -> List[Document]:
+        """Search the vectorstore by vector using its blocking API."""
+        # query the underlying collection directly
+        collection = self._sync_collection()
+        if collection is not None:
+            results = collection.query(query_embeddings=[embedding], **self._query_params())
+            return self._select_documents(results, embedding)
+
+        kwargs = dict(self.search_kwargs)
+        if self.search_type == "mmr":
+            return self.vectorstore.max_marginal_relevance_search_by_vector(embedding, **kwargs)
+        kwargs.pop("fetch_k", None)
+        kwargs.pop("lambda_mult", None)
+        return self.vectorstore.similarity_search_by_vector(embedding, **kwargs)
+
+    def _search_by_vectors_sync(self, embeddings: List[List[float]]) -> List[List[Document]]:
+        """Search the vectorstore for several vectors using its blocking API."""
+        collection = self._sync_collection()
+        if collection is None:
+            return [self._search_by_vector_sync(embedding) for embedding in embeddings]
+        results = collection.query(query_embeddings=embeddings, **self._query_params())
+        return self._select_many(results, embeddings)
+
+    async def _aquery_collection(self, collection: Any, embeddings: List[List[float]]) -> List[List[Document]]:
+        """Query an async ChromaDB collection and apply MMR if configured."""
+        results = await collection.query(query_embeddings=embeddings, **self._query_params())
+        return self._select_many(results, embeddings)
+
+    def _select_many(self, results: Dict[str, Any], embeddings: List[List[float]]) -> List[List[Document]]:
+        """Select the documents of each query of a multi-query collection result."""
+        return [
+            self._select_documents(query_results, embedding)
+            for query_results, embedding in zip(_split_query_results(results, len(embeddings)), embeddings)
+        ]
+
+    def _query_params(self) -> Dict[str, Any]:
+        """Collection query arguments for the configured search type."""
+        if self.search_type != "mmr":
+            return {
+                "n_results": self.search_kwargs.get("k", 4),
+                "where": self.search_kwargs.get("filter"),
+                "include": ["documents", "metadatas"],
+            }
+        # MMR needs the candidate vectors to measure redundancy
+        return {
+            "n_results": self.search_kwargs.get("fetch_k", 20),
+            "where": self.search_kwargs.get("filter"),
+            "include": ["documents", "metadatas", "embeddings"],
+        }
+
+    def _select_documents(self, results: Dict[str, Any], embedding: List[float]) -> List[Document]:
+        """Turn a collection query result into documents, applying MMR if configured."""
+        candidates = _results_to_documents(results)
+        if self.search_type != "mmr" or not candidates:
+            return candidates
+
+        selected = set(
+            mmr_select(
+                embedding,
+                results["embeddings"][0],
+                k=self.search_kwargs.get("k", 4),
+                lambda_mult=self.search_kwargs.get("lambda_mult", 0.5),
+            )
+        )
+        # keep candidate order, as the LangChain wrapper does
+        return [doc for i, doc in enumerate(candidates) if i in selected]
+
+    def _lexical_search(self, query: str) -> List[str]:
+        """Chunk IDs of the best BM25 matches (empty if the collection has no lexical index)."""
+        index = get_lexical_index(self.lexical_index)
+        if index is None:
+            return []
+        with stage_timer("ask", "lexical_search"):
+            return [doc_id for doc_id, _ in index.search(query, self.lexical_k)]
+
+    def _fuse(self, dense: List[Document], lexical_ids: List[str]) -> List[str]:
+        """
+        Combine dense and lexical rankings with reciprocal-rank fusion.
+
+        Each chunk scores the sum of 1 / (rrf_k + rank) over the rankings it
+        appears in; the IDs of the k best chunks are returned, best first.
+        """
+        scores: Dict[str, float] = {}
+        for ranking in ([_document_key(doc) for doc in dense], lexical_ids):
+            for rank, doc_id in enumerate(ranking, start=1):
+                scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (self.rrf_k + rank)
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        return ranked[:self.search_kwargs.get("k", 4)]
+
+    def _fetch_documents_sync(self, ids: List[str]) -> List[Document]:
+        """Load chunks found only by the lexical search."""
+        if not ids:
+            return []
+        collection = self._sync_collection()
+        if collection is None:
+            return self.vectorstore.get_by_ids(ids)
+        results = collection.get(
+            ids=ids, where=self.search_kwargs.get("filter"), include=["documents", "metadatas"]
+        )
+        return _get_results_to_documents(results)
+
+    async def _afetch_documents(self, ids: List[str]) -> List[Document]:
+        """Load chunks found only by the lexical search without blocking the event loop."""
+        if not ids:
+            return []
+        collection = await self._get_async_collection()
+        if collection is None:
+            return await asyncio.to_thread(self._fetch_documents_sync, ids)
+        results = await collection.get(
+            ids=ids, where=self.search_kwargs.get("filter"), include=["documents", "metadatas"]
+        )
+        return _get_results_to_documents(results)
+
+    async def _get_async_collection(self) -> Any:
+        """Return an async collection handle for the running loop (None if unavailable)."""
+        if self.collection_name is None or self._async_disabled:
+            return None
+
+        loop = asyncio.get_running_loop()
+        if self._async_collection is not None and self._async_loop is loop:
+            return self._async_collection
+
+        if self._async_lock is None or self._async_loop is not loop:
+            self._async_lock = asyncio.Lock()
+            self._async_loop = loop
+            self._async_collection = None
+
+        async with self._async_lock:
+            if self._async_collection is None:
+                try:
+                    client = await get_async_chroma_client(self.settings)
+                    self._async_collection = await client.get_collection(self.collection_name)
+                except ImportError as exc:
+                    # old chromadb without async client: use worker threads from now on
+                    LOGGER.warning("Cliente async de Chroma no disponible: %s", exc)
+                    self._async_disabled = True
+                    return None
+        return self._async_collection
+
+
+def mmr_select(
+    query_embedding: Sequence[float],
+    candidate_embeddings: Sequence[Sequence[float]],
+    k: int = 4,
+    lambda_mult: float = 0.5,
+) -> List[int]:
+    """
+    Select candidates by maximal marginal relevance, vectorized with NumPy.
+
+    Query-candidate and candidate-candidate cosine similarities are computed
+    up front (the latter in a single matrix product), so each greedy step only
+    updates every candidate's max similarity to the selection. Selections match
+    LangChain's maximal_marginal_relevance, which recomputes similarities on
+    every step and dominates retrieval time for large fetch_k pools.
+
+    Args:
+        query_embedding: Query vector (reused from the query embedding step)
+        candidate_embeddings: Vectors of the fetch_k candidates, by relevance
+        k: Number of candidates to select
+        lambda_mult: Balance between relevance (1.0) and diversity (0.0)
+
+    Returns:
+        Indexes of the selected candidates, in selection order
+    """
+    candidates = np.asarray(candidate_embeddings, dtype=np.float32)
+    if candidates.ndim != 2 or len(candidates) == 0 or k <= 0:
+        return []
+    query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+    candidates = candidates / _safe_norms(candidates)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = candidates @ query
+    similarity = candidates @ candidates.T
+
+    first = int(np.argmax(relevance))
+    selected = [first]
+    redundancy = similarity[first].copy()  # max similarity to any selected candidate
+    available = np.ones(len(candidates), dtype=bool)
+    available[first] = False
+    while len(selected) < min(k, len(candidates)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        chosen = int(np.argmax(scores))
+        selected.append(chosen)
+        available[chosen] = False
+        np.maximum(redundancy, similarity[chosen], out=redundancy)
+    return selected
+
+
+def _safe_norms(matrix: np.ndarray) -> np.ndarray:
+    """Row norms of a matrix, with zero rows left unscaled."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.where(norms == 0, 1.0, norms)
+
+
+def _document_key(doc: Document) -> str:
+    """Identify a retrieved chunk by its ID (its text for stores without IDs)."""
+    return doc.id or doc.page_content
+
+
+def _by_id(documents: List[Document]) -> Dict[str, Document]:
+    return {_document_key(doc): doc for doc in documents}
+
+
+def _ordered(ranked_ids: List[str], *sources: List[Document]) -> List[Document]:
+    """Return the documents of ranked_ids in order, skipping IDs that could not be loaded."""
+    documents: Dict[str, Document] = {}
+    for source in sources:
+        documents.update(_by_id(source))
+    return [documents[doc_id] for doc_id in ranked_ids if doc_id in documents]
+
+
+def _get_results_to_documents(results: Dict[str, Any]) -> List[Document]:
+    """Convert a ChromaDB get() result (flat lists) into LangChain documents."""
+    documents = results.get("documents") or []
+    metadatas = results.get("metadatas") or [None] * len(documents)
+    return [
+        Document(page_content=text, metadata=metadata or {}, id=doc_id)
+        for doc_id, text, metadata in zip(results.get("ids") or [], documents, metadatas)
+    ]
+
+
+# per-query fields of a ChromaDB query result
+QUERY_RESULT_FIELDS = ("ids", "documents", "metadatas", "embeddings", "distances")
+
+
+def _split_query_results(results: Dict[str, Any], count: int) -> List[Dict[str, Any]]:
+    """Split a multi-query ChromaDB result into single-query results."""
+    return [
+        {field: [results[field][i]] for field in QUERY_RESULT_FIELDS if results.get(field) is not None}
+        for i in range(count)
+    ]
+
+
+def _results_to_documents(results: Dict[str, Any]) -> List[Document]:
+    """Convert a single-query ChromaDB result into LangChain documents."""
+    documents = results.get("documents") or [[]]
+    metadatas = results.get("metadatas") or [[None] * len(documents[0])]
+    ids = results.get("ids") or [[None] * len(documents[0])]
+    return [
+        Document(page_content=text, metadata=metadata or {}, id=doc_id)
+        for text, metadata, doc_id in zip(documents[0], metadatas[0], ids[0])
+    ]
+
+
 def get_retriever(
     search_kwargs: Optional[Dict[str, Any]] = None,
     search_type: str = "mmr",
     vectorstore: Optional[Any] = None,
+    settings: Optional[Settings] = None,
+    hybrid: Optional[bool] = None,
 ) -> Any:
     """
     Create a retriever with MMR (Maximum Marginal Relevance) for diversity.
-    
+
     Args:
         search_kwargs: Custom search parameters to override defaults
         search_type: Type of search ("mmr", "similarity", "similarity_score_threshold")
         vectorstore: Optional vectorstore instance (loads if not provided)
-    
+        settings: Application settings (used to open the async ChromaDB client)
+        hybrid: Fuse BM25 lexical results with the dense ones (defaults to
+            HYBRID_SEARCH_ENABLED; ignored for threshold search)
+
     Returns:
         Configured retriever instance
     """
+    settings = settings or load_settings()
     # load vectorstore if not provided
-    vectorstore = vectorstore or load_vectorstore()
-    
+    vectorstore = vectorstore or load_vectorstore(settings=settings)
+
     # MMR parameters for better diversity and coverage
     # MMR balances relevance with diversity to avoid redundant results
     kwargs = {
@@ -36,6 +515,17 @@ def get_retriever(
     # override with custom parameters if provided
     if search_kwargs:
         kwargs.update(search_kwargs)
-    
-    # convert vectorstore to retriever with specified search type and parameters
-    return vectorstore.as_retriever(search_type=search_type, search_kwargs=kwargs)
\ No newline at end of file
+
+    if hybrid is None:
+        hybrid = HYBRID_SEARCH_ENABLED
+
+    # wrap the vectorstore in a retriever that also supports non-blocking async calls
+    # the in-process index has no async client: its searches run on worker threads
+    return AsyncVectorStoreRetriever(
+        vectorstore=vectorstore,
+        search_type=search_type,
+        search_kwargs=kwargs,
+        collection_name=None if isinstance(vectorstore, LocalVectorStore) else settings.chroma_collection,
+        settings=settings,
+        lexical_index=settings.chroma_collection if hybrid else None,
+    )
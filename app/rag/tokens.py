@@ -0,0 +1,36 @@
+"""Token counting helpers for prompt budgeting."""
+from typing import Any, Optional
+
+from app.core.logger import get_logger
+
+LOGGER = get_logger(__name__)
+
+# cl100k_base is not Gemini's tokenizer, but it is a close enough estimate for budgeting
+ENCODING_NAME = "cl100k_base"
+
+# global cache for the tiktoken encoding (None until first use, False if unavailable)
+_cached_encoding: Optional[Any] = None
+
+
+def _get_encoding() -> Any:
+    """Load the tiktoken encoding once, falling back to a character estimate."""
+    global _cached_encoding
+    if _cached_encoding is None:
+        try:
+            import tiktoken
+            _cached_encoding = tiktoken.get_encoding(ENCODING_NAME)
+        except Exception as exc:
+            # tiktoken downloads the BPE file on first use, which fails offline
+            LOGGER.warning("tiktoken no disponible, se estiman tokens por caracteres: %s", exc)
+            _cached_encoding = False
+    return _cached_encoding
+
+
+def count_tokens(text: str) -> int:
+    """Count the tokens of a text (roughly 4 characters per token without tiktoken)."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is False:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
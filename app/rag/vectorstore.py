@@ -1,4 +1,5 @@
-"""Vector store management with ChromaDB."""
+"""Vector store management with ChromaDB or the in-process index."""
+import threading
 from typing import Any, Optional
 
 # try to import from langchain_chroma first (recommended), fallback to langchain_community
@@ -13,13 +14,66 @@ from app.core.logger import get_logger
 
 LOGGER = get_logger(__name__)
 
+VECTOR_BACKENDS = ("chroma", "local")
 
-def load_vectorstore(settings: Optional[Settings] = None) -> Any:
-    """Load the vector store from ChromaDB and create LangChain wrapper."""
+# generation counter of the indexed collection, bumped whenever /ingest changes it
+# caches built on top of retrieval results compare it to detect stale entries
+_collection_generation = 0
+_generation_lock = threading.Lock()
+
+
+def get_collection_generation() -> int:
+    """Return the current generation of the indexed collection."""
+    return _collection_generation
+
+
+def bump_collection_generation() -> int:
+    """Mark the indexed collection as changed and return the new generation."""
+    global _collection_generation
+    with _generation_lock:
+        _collection_generation += 1
+        LOGGER.info("Colección modificada, nueva generación: %s", _collection_generation)
+        return _collection_generation
+
+
+def uses_local_index(settings: Settings) -> bool:
+    """Whether settings select the in-process vector index instead of ChromaDB."""
+    if settings.vector_backend not in VECTOR_BACKENDS:
+        LOGGER.warning(
+            "VECTOR_BACKEND '%s' desconocido (opciones: %s), usando chroma",
+            settings.vector_backend, ", ".join(VECTOR_BACKENDS),
+        )
+    return settings.vector_backend == "local"
+
+
+def get_vector_client(settings: Optional[Settings] = None) -> Any:
+    """
+    Return the client of the configured vector backend.
+
+    Both clients expose the same collection API (get/create/delete collections,
+    count, upsert, delete, query), so ingestion works with either of them.
+    """
+    settings = settings or load_settings()
+    if uses_local_index(settings):
+        from app.rag.local_index import get_local_client
+        return get_local_client()
+    return get_chroma_client(settings)
+
+
+def load_vectorstore(settings: Optional[Settings] = None, client: Optional[Any] = None) -> Any:
+    """
+    Load the vector store of the configured backend and create LangChain wrapper.
+
+    Args:
+        settings: Application settings
+        client: Client of the configured backend to reuse (a new one is opened if None)
+    """
     # load settings if not provided
     settings = settings or load_settings()
+    if uses_local_index(settings):
+        return _load_local_vectorstore(settings, client)
     # get ChromaDB HTTP client connection
-    client = get_chroma_client(settings)
+    client = client or get_chroma_client(settings)
 
     # handle NotFoundError import for different ChromaDB versions
     try:
@@ -62,3 +116,24 @@ def load_vectorstore(settings: Optional[Settings] = None) -> Any:
     )
     return vectorstore
 
+
+
+def _load_local_vectorstore(settings: Settings, client: Optional[Any] = None) -> Any:
+    """Open the collection of the in-process vector index."""
+    from app.rag.local_index import LocalVectorStore, get_local_client
+
+    try:
+        collection = (client or get_local_client()).get_collection(settings.chroma_collection)
+    except FileNotFoundError as exc:
+        raise FileNotFoundError(
+            f"No se encontró la colección '{settings.chroma_collection}' en el índice local. "
+            "Ejecuta el endpoint /ingest o exporta la colección de Chroma "
+            "(`python -m app.rag.local_index export`)."
+        ) from exc
+
+    if collection.count() == 0:
+        raise RuntimeError(
+            f"La colección '{settings.chroma_collection}' existe pero no contiene vectores. "
+            "Ejecuta el endpoint /ingest para indexar documentos."
+        )
+    return LocalVectorStore(collection, get_embedding_model().embedding)
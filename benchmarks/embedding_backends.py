@@ -0,0 +1,149 @@
+"""
+Benchmark of the embedding backends (torch, onnx, onnx-int8).
+
+Each backend runs in its own subprocess so load time and resident memory are
+measured in isolation. For every backend the script reports:
+
+- load time and RSS after loading the model
+- query latency (p50/p95 over single-question embeddings, as in /ask)
+- document throughput (chunks per second, as in /ingest)
+- parity with the torch vectors (minimum and mean cosine similarity)
+
+Usage:
+    python benchmarks/embedding_backends.py [--queries 200] [--documents 512] [--backends torch onnx onnx-int8]
+
+The ONNX exports are created under data/cache/onnx on first use, which
+requires PyTorch once. The on-disk embedding cache is disabled while measuring.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+QUERIES = [
+    "¿Qué hacer en caso de quemadura?",
+    "¿Cómo detener una hemorragia nasal?",
+    "Pasos de la reanimación cardiopulmonar en adultos",
+    "¿Cuándo llamar a emergencias por una convulsión?",
+    "Tratamiento inicial de una fractura expuesta",
+    "¿Cómo reconocer un golpe de calor?",
+    "Primeros auxilios ante una picadura de abeja",
+    "¿Qué es la posición lateral de seguridad?",
+]
+
+DOCUMENT = (
+    "Ante una quemadura térmica, enfríe la zona con agua corriente a temperatura ambiente "
+    "durante al menos diez minutos. No aplique hielo, pomadas ni remedios caseros. Retire "
+    "anillos, relojes y prendas que no estén adheridas a la piel antes de que aparezca la "
+    "inflamación y cubra la lesión con un apósito estéril o un paño limpio. "
+)
+
+
+def _rss_mb() -> float:
+    """Current resident set size of this process in MB."""
+    try:
+        with open("/proc/self/status", encoding="utf-8") as handle:
+            for line in handle:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    # ru_maxrss is in KB on Linux and bytes on macOS; this is the peak, not the current RSS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_worker(backend: str, queries: int, documents: int) -> dict:
+    """Measure one backend in the current process."""
+    from app.rag.embeddings import get_embedding_model
+    from app.rag.onnx_embeddings import PARITY_SENTENCES
+
+    rss_before = _rss_mb()
+    started = time.perf_counter()
+    config = get_embedding_model(backend=backend)
+    load_seconds = time.perf_counter() - started
+    embedding = config.embedding
+
+    # warm up the session / kernels before timing
+    embedding.embed_query(QUERIES[0])
+
+    latencies = []
+    for index in range(queries):
+        # vary the text so nothing is memoized
+        text = f"{QUERIES[index % len(QUERIES)]} ({index})"
+        started = time.perf_counter()
+        embedding.embed_query(text)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+
+    texts = [f"{DOCUMENT} Sección {index}." for index in range(documents)]
+    started = time.perf_counter()
+    embedding.embed_documents(texts)
+    documents_seconds = time.perf_counter() - started
+
+    return {
+        "backend": config.backend,
+        "load_seconds": round(load_seconds, 2),
+        "rss_mb": round(_rss_mb(), 1),
+        "rss_model_mb": round(_rss_mb() - rss_before, 1),
+        "query_p50_ms": round(statistics.median(latencies), 2),
+        "query_p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 2),
+        "docs_per_second": round(documents / documents_seconds, 1),
+        "parity_vectors": embedding.embed_documents(PARITY_SENTENCES),
+    }
+
+
+def _cosines(reference, candidate):
+    import numpy as np
+
+    ref = np.asarray(reference, dtype=np.float32)
+    cand = np.asarray(candidate, dtype=np.float32)
+    cos = (ref * cand).sum(axis=1) / (np.linalg.norm(ref, axis=1) * np.linalg.norm(cand, axis=1))
+    return float(cos.min()), float(cos.mean())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--documents", type=int, default=512)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.queries, args.documents)))
+        return
+
+    env = {**os.environ, "EMBEDDING_CACHE_ENABLED": "false"}
+    results = []
+    for backend in args.backends:
+        output = subprocess.run(
+            [sys.executable, __file__, "--worker", backend,
+             "--queries", str(args.queries), "--documents", str(args.documents)],
+            env=env, cwd=PROJECT_ROOT, check=True, capture_output=True, text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    reference = next((r["parity_vectors"] for r in results if r["backend"] == "torch"), None)
+    header = f"{'backend':<10} {'load s':>7} {'RSS MB':>8} {'model MB':>9} {'p50 ms':>8} {'p95 ms':>8} {'docs/s':>8} {'cos min':>8} {'cos mean':>9}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        cos_min, cos_mean = _cosines(reference, result["parity_vectors"]) if reference else (float("nan"),) * 2
+        print(
+            f"{result['backend']:<10} {result['load_seconds']:>7} {result['rss_mb']:>8} "
+            f"{result['rss_model_mb']:>9} {result['query_p50_ms']:>8} {result['query_p95_ms']:>8} "
+            f"{result['docs_per_second']:>8} {cos_min:>8.5f} {cos_mean:>9.5f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
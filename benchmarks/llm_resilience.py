@@ -0,0 +1,147 @@
+"""
+Benchmark of the resilient LLM layer against the latency-injecting Gemini stub.
+
+Starts benchmarks/llm_stub.py in-process and sends the same load through
+get_llm() under several configurations, each in its own subprocess (the LLM_*
+settings are read at import time):
+
+- plain: one attempt, no deadline, hedging or fallback (the old behaviour)
+- deadline: deadline per attempt, retries and fallback model
+- hedged: the same plus hedged requests after the p95 latency
+
+For every configuration the script reports the latency percentiles seen by
+the caller (p50/p95/p99/max), failed calls, and the deadlines, hedged
+requests and fallbacks counted by the layer.
+
+Usage:
+    python benchmarks/llm_resilience.py [--requests 300] [--concurrency 8] [--timeout 3]
+        [--modes plain deadline hedged] [stub options, see llm_stub.py --help]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from benchmarks.llm_stub import add_stub_arguments, build_state, start_stub  # noqa: E402
+
+PRIMARY_MODEL = "gemini-2.0-flash"
+FALLBACK_MODEL = "gemini-2.0-flash-lite"
+PROMPT = "¿Qué hacer en caso de quemadura? Responde en pocas líneas."
+
+
+def mode_environment(mode: str, timeout: float) -> dict:
+    """LLM_* settings of a configuration."""
+    if mode == "plain":
+        return {
+            "LLM_TIMEOUT_SECONDS": "600", "LLM_RETRY_ATTEMPTS": "1",
+            "LLM_FALLBACK_MODEL_NAME": "", "LLM_HEDGING_ENABLED": "false",
+        }
+    return {
+        "LLM_TIMEOUT_SECONDS": str(timeout), "LLM_RETRY_ATTEMPTS": "2",
+        "LLM_FALLBACK_MODEL_NAME": FALLBACK_MODEL, "LLM_HEDGING_ENABLED": str(mode == "hedged").lower(),
+        "LLM_RETRY_BASE_DELAY": "0.05",
+    }
+
+
+def _percentile(ordered: list, q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else 0.0
+
+
+async def run_worker(requests: int, concurrency: int) -> dict:
+    """Send the load through get_llm() in the current process."""
+    from app.rag.llm_chain import get_llm
+    from app.rag.resilient_llm import get_llm_call_stats
+
+    llm = get_llm(model_name=PRIMARY_MODEL)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(index: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await llm.ainvoke(f"{PROMPT} ({index})")
+            except Exception:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    models = get_llm_call_stats()["models"]
+    return {
+        "p50": round(_percentile(latencies, 0.50), 3),
+        "p95": round(_percentile(latencies, 0.95), 3),
+        "p99": round(_percentile(latencies, 0.99), 3),
+        "max": round(latencies[-1], 3) if latencies else 0.0,
+        "errors": errors,
+        "throughput": round(requests / elapsed, 1),
+        "deadlines": sum(calls["deadlines"] for calls in models.values()),
+        "hedges": sum(calls["hedges"] for calls in models.values()),
+        "fallbacks": sum(calls["fallbacks"] for calls in models.values()),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=3.0, help="LLM_TIMEOUT_SECONDS of the resilient modes")
+    parser.add_argument("--modes", nargs="+", default=["plain", "deadline", "hedged"])
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(asyncio.run(run_worker(args.requests, args.concurrency))))
+        return
+
+    if not any(name == FALLBACK_MODEL for name, *_ in args.model):
+        # the fallback is faster and steadier than the primary model unless told otherwise
+        args.model.append((FALLBACK_MODEL, args.latency_ms / 2, 0.0, 0.0))
+    server = start_stub(build_state(args))
+    host, port = server.server_address[:2]
+
+    results = {}
+    for mode in args.modes:
+        env = {
+            **os.environ,
+            "LLM_API_BASE": f"http://{host}:{port}",
+            "LLM_API_KEY": os.getenv("LLM_API_KEY", "stub"),
+            "WARMUP_LLM_ENABLED": "false",
+            **mode_environment(mode, args.timeout),
+        }
+        output = subprocess.run(
+            [sys.executable, __file__, "--worker",
+             "--requests", str(args.requests), "--concurrency", str(args.concurrency)],
+            env=env, cwd=PROJECT_ROOT, check=True, capture_output=True, text=True,
+        ).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+    server.shutdown()
+
+    header = (
+        f"{'mode':<10} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'max s':>7} {'errors':>7} "
+        f"{'req/s':>7} {'deadlines':>10} {'hedges':>7} {'fallbacks':>10}"
+    )
+    print(header)
+    print("-" * len(header))
+    for mode, result in results.items():
+        print(
+            f"{mode:<10} {result['p50']:>7} {result['p95']:>7} {result['p99']:>7} {result['max']:>7} "
+            f"{result['errors']:>7} {result['throughput']:>7} {result['deadlines']:>10} "
+            f"{result['hedges']:>7} {result['fallbacks']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
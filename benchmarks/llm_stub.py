@@ -0,0 +1,222 @@
+"""
+Local stand-in for the Gemini REST API that injects latency and errors.
+
+Serves the two endpoints the Gemini client calls with transport="rest":
+
+- POST /v1beta/models/{model}:generateContent
+- POST /v1beta/models/{model}:streamGenerateContent (JSON array, or SSE with ?alt=sse)
+
+Every response waits a base latency (with ±20% jitter); a fraction of them
+(--tail-rate) wait --tail-ms instead, and a fraction (--error-rate) fail with
+503 UNAVAILABLE. --model overrides the three settings for one model, e.g. a
+fast and reliable fallback. GET /stats returns the requests served per model.
+
+Point the backend at it with LLM_API_BASE=http://127.0.0.1:8089 (any
+LLM_API_KEY works). benchmarks/llm_resilience.py starts it by itself.
+
+Usage:
+    python benchmarks/llm_stub.py [--port 8089] [--latency-ms 400] [--tail-ms 8000] [--tail-rate 0.05]
+        [--error-rate 0.02] [--model gemini-2.0-flash-lite=150,0,0]
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+ROUTE = re.compile(r"^/v1(?:beta)?/models/(?P<model>[^:/]+):(?P<method>generateContent|streamGenerateContent)$")
+
+ANSWER = (
+    "**Pasos de Primeros Auxilios:** 1. Enfriar la zona con agua corriente durante al menos diez minutos. "
+    "2. Cubrir con un apósito estéril. 3. No aplicar hielo ni pomadas. "
+    "**Signos de Alarma:** Buscar ayuda médica si la quemadura es extensa o profunda."
+)
+STREAM_CHUNKS = 8
+
+
+@dataclass
+class LatencyProfile:
+    """Injected behaviour of a model."""
+    latency_ms: float
+    tail_ms: float
+    tail_rate: float
+    error_rate: float
+
+    def delay(self) -> float:
+        """Seconds to wait before answering."""
+        if random.random() < self.tail_rate:
+            return self.tail_ms / 1000
+        return self.latency_ms * random.uniform(0.8, 1.2) / 1000
+
+
+class StubState:
+    """Profiles by model and requests served, shared by the handler threads."""
+
+    def __init__(self, default: LatencyProfile, models: Optional[Dict[str, LatencyProfile]] = None):
+        self.default = default
+        self.models = dict(models or {})
+        self._lock = threading.Lock()
+        self.requests: Dict[str, Dict[str, int]] = {}
+
+    def profile(self, model: str) -> LatencyProfile:
+        return self.models.get(model, self.default)
+
+    def count(self, model: str, outcome: str) -> None:
+        with self._lock:
+            counters = self.requests.setdefault(model, {})
+            counters[outcome] = counters.get(outcome, 0) + 1
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {model: dict(counters) for model, counters in self.requests.items()}
+
+
+def _candidate(text: str, prompt_tokens: int, completion_tokens: int, finish: bool) -> dict:
+    response = {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}]}
+    if finish:
+        response["candidates"][0]["finishReason"] = "STOP"
+        response["usageMetadata"] = {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": completion_tokens,
+            "totalTokenCount": prompt_tokens + completion_tokens,
+        }
+    return response
+
+
+def _prompt_tokens(body: dict) -> int:
+    """Rough token count of a request (4 characters per token)."""
+    text = "".join(
+        part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", [])
+    )
+    return max(1, len(text) // 4)
+
+
+def make_handler(state: StubState):
+    class GeminiStubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):  # noqa: A002 - keep the request log quiet
+            pass
+
+        def do_GET(self):
+            if urlparse(self.path).path == "/stats":
+                self._send_json(200, state.stats())
+            else:
+                self._send_json(404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            match = ROUTE.match(url.path)
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if match is None:
+                self._send_json(404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+                return
+
+            model, method = match.group("model"), match.group("method")
+            profile = state.profile(model)
+            time.sleep(profile.delay())
+            if random.random() < profile.error_rate:
+                state.count(model, "error")
+                self._send_json(503, {
+                    "error": {"code": 503, "message": "The model is overloaded.", "status": "UNAVAILABLE"},
+                })
+                return
+
+            state.count(model, "ok")
+            prompt_tokens = _prompt_tokens(body)
+            completion_tokens = max(1, len(ANSWER) // 4)
+            if method == "generateContent":
+                self._send_json(200, _candidate(ANSWER, prompt_tokens, completion_tokens, finish=True))
+            else:
+                self._stream(ANSWER, prompt_tokens, completion_tokens, sse=parse_qs(url.query).get("alt") == ["sse"])
+
+        def _stream(self, text: str, prompt_tokens: int, completion_tokens: int, sse: bool) -> None:
+            size = -(-len(text) // STREAM_CHUNKS)
+            parts = [text[start:start + size] for start in range(0, len(text), size)]
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream" if sse else "application/json")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for index, part in enumerate(parts):
+                last = index == len(parts) - 1
+                event = json.dumps(_candidate(part, prompt_tokens, completion_tokens, finish=last))
+                if sse:
+                    payload = f"data: {event}\r\n\r\n"
+                else:
+                    payload = ("[" if index == 0 else ",") + event + ("]" if last else "")
+                self._write_chunk(payload.encode("utf-8"))
+                time.sleep(0.01)
+            self._write_chunk(b"")
+
+        def _write_chunk(self, data: bytes) -> None:
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def _send_json(self, status: int, payload: dict) -> None:
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return GeminiStubHandler
+
+
+def start_stub(state: StubState, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Serve the stub in a daemon thread; port=0 picks a free port (see server.server_address)."""
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def parse_model_profile(value: str) -> tuple:
+    """Parse NAME=LATENCY_MS,TAIL_RATE,ERROR_RATE."""
+    name, _, settings = value.partition("=")
+    latency_ms, tail_rate, error_rate = (float(part) for part in settings.split(","))
+    return name, latency_ms, tail_rate, error_rate
+
+
+def build_state(args: argparse.Namespace) -> StubState:
+    models = {}
+    for name, latency_ms, tail_rate, error_rate in args.model:
+        models[name] = LatencyProfile(latency_ms, args.tail_ms, tail_rate, error_rate)
+    return StubState(LatencyProfile(args.latency_ms, args.tail_ms, args.tail_rate, args.error_rate), models)
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=400)
+    parser.add_argument("--tail-ms", type=float, default=8000)
+    parser.add_argument("--tail-rate", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument(
+        "--model", type=parse_model_profile, action="append", default=[],
+        metavar="NAME=LATENCY_MS,TAIL_RATE,ERROR_RATE",
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(build_state(args)))
+    server.daemon_threads = True
+    print(f"Stub de Gemini escuchando en http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
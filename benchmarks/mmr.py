@@ -0,0 +1,101 @@
+"""
+Benchmark of MMR re-ranking: LangChain's maximal_marginal_relevance vs mmr_select.
+
+For each fetch_k pool size the script draws random candidate pools around a
+query (768 dimensions, as the embedding model) and reports the per-query time
+of both implementations (p50/p95) and whether they select the same candidates.
+The current path is LangChain's loop as called by the Chroma wrapper; the new
+path is the vectorized mmr_select of app/rag/retriever.py.
+
+Usage:
+    python benchmarks/mmr.py [--fetch-k 20 50 100 200 500] [--k 12] [--queries 200] [--output results.json]
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+DIMENSION = 768
+
+
+def _timed(function, *args, **kwargs):
+    """Run a function and return its result and elapsed milliseconds."""
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def run(fetch_k: int, k: int, queries: int, lambda_mult: float) -> dict:
+    """Measure both implementations for one pool size."""
+    import numpy as np
+    from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+    from app.rag.retriever import mmr_select
+
+    rng = np.random.default_rng(fetch_k)
+    baseline_ms, vectorized_ms = [], []
+    agreement = 0
+    for _ in range(queries):
+        query = rng.normal(size=DIMENSION).astype(np.float32)
+        # candidates close to the query, with some near-duplicates, as retrieved chunks are
+        candidates = query + rng.normal(scale=1.5, size=(fetch_k, DIMENSION)).astype(np.float32)
+        candidates[1::4] = candidates[::4][: len(candidates[1::4])] + 0.05 * rng.normal(
+            size=(len(candidates[1::4]), DIMENSION)
+        )
+
+        baseline, elapsed = _timed(
+            maximal_marginal_relevance, query, list(candidates), k=k, lambda_mult=lambda_mult
+        )
+        baseline_ms.append(elapsed)
+        vectorized, elapsed = _timed(mmr_select, query, candidates, k=k, lambda_mult=lambda_mult)
+        vectorized_ms.append(elapsed)
+        agreement += sorted(baseline) == sorted(vectorized)
+
+    return {
+        "fetch_k": fetch_k,
+        "k": k,
+        "baseline_p50_ms": round(statistics.median(baseline_ms), 3),
+        "baseline_p95_ms": round(_percentile(baseline_ms, 0.95), 3),
+        "vectorized_p50_ms": round(statistics.median(vectorized_ms), 3),
+        "vectorized_p95_ms": round(_percentile(vectorized_ms, 0.95), 3),
+        "speedup_p50": round(statistics.median(baseline_ms) / statistics.median(vectorized_ms), 1),
+        "same_selection": round(agreement / queries, 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fetch-k", nargs="+", type=int, default=[20, 50, 100, 200, 500])
+    parser.add_argument("--k", type=int, default=12)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--lambda-mult", type=float, default=0.5)
+    parser.add_argument("--output", type=Path, help="write the results as JSON")
+    args = parser.parse_args()
+
+    results = [run(fetch_k, args.k, args.queries, args.lambda_mult) for fetch_k in args.fetch_k]
+
+    header = f"{'fetch_k':>7} {'base p50':>9} {'base p95':>9} {'vec p50':>8} {'vec p95':>8} {'speedup':>8} {'same':>6}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        print(
+            f"{result['fetch_k']:>7} {result['baseline_p50_ms']:>9} {result['baseline_p95_ms']:>9} "
+            f"{result['vectorized_p50_ms']:>8} {result['vectorized_p95_ms']:>8} "
+            f"{result['speedup_p50']:>7}x {result['same_selection']:>6}"
+        )
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
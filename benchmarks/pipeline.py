@@ -0,0 +1,395 @@
+"""
+Offline micro-benchmarks of the ingestion and retrieval pipeline.
+
+Generates a synthetic corpus of Spanish medical guides as PDF files (written
+directly, without a PDF library) and measures each stage on this machine:
+
+- load: pages/s of load_pdf_documents
+- normalize, headers, clean: chars/s of normalize_text, remove_repeated_headers
+  and clean_documents
+- split: chunks/s of split_documents
+- embed: chunks/s of embed_documents and query latency (p50/p99) of embed_query
+- retrieve: latency (p50/p99) of the retriever's MMR and similarity searches
+  against an in-process index (the stand-in for ChromaDB) and of BM25 search
+
+Nothing is downloaded: with --embedder auto the configured model is used if
+its weights are cached locally, otherwise a deterministic hashing embedder
+stands in (and the JSON records which one ran). Results are saved as JSON
+with the git commit, so runs can be compared across commits with --compare.
+
+Usage:
+    python benchmarks/pipeline.py [--files 8] [--pages 40] [--queries 200] [--repeat 3]
+        [--embedder auto|model|hashing] [--extra-vectors 0] [--output PATH] [--compare PATH]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+RESULTS_DIR = PROJECT_ROOT / "benchmarks" / "results"
+DIMENSION = 768
+
+TOPICS = [
+    ("quemaduras", "enfriar la zona con agua corriente durante al menos diez minutos"),
+    ("hemorragia nasal", "inclinar la cabeza hacia delante y presionar las alas de la nariz"),
+    ("fractura expuesta", "cubrir la herida con un apósito estéril e inmovilizar el miembro"),
+    ("golpe de calor", "trasladar a la víctima a un lugar fresco y aplicar compresas frías"),
+    ("convulsiones", "proteger la cabeza y retirar los objetos cercanos sin sujetar a la persona"),
+    ("picadura de abeja", "retirar el aguijón raspando la piel y aplicar frío local"),
+    ("hipoglucemia", "administrar 15 g de azúcar por vía oral si la persona está consciente"),
+    ("intoxicación por monóxido", "ventilar el lugar y administrar oxígeno al 100 %"),
+    ("deshidratación infantil", "dar sales de rehidratación oral en pequeñas tomas frecuentes"),
+    ("parada cardiorrespiratoria", "iniciar compresiones torácicas a 100-120 por minuto"),
+    ("mordedura de serpiente", "inmovilizar el miembro y mantener a la víctima en reposo"),
+    ("asfixia por cuerpo extraño", "aplicar compresiones abdominales hasta expulsar el objeto"),
+]
+
+TEMPLATES = [
+    "Ante un caso de {topic}, el primer paso es {action}.",
+    "En la evaluación inicial de {topic} se valoran la conciencia, la respiración y el pulso.",
+    "Los signos de alarma de {topic} incluyen confusión, palidez intensa y dificultad respiratoria.",
+    "No se recomienda aplicar remedios caseros en {topic}; se debe {action}.",
+    "Si la situación de {topic} no mejora en 30 minutos, derive al paciente a un centro sanitario.",
+    "En niños menores de 5 años con {topic}, la dosis se ajusta a 10 mg/kg cada 8 horas.",
+    "El tratamiento de {topic} en adultos consiste en {action} y vigilar la evolución.",
+    "Registre la hora de inicio de los síntomas de {topic} y comuníquela al equipo de emergencias.",
+]
+
+# page headers removed by HEADER_PATTERNS, as in the real guides
+HEADERS = ["GUÍA CLÍNICA Y TERAPÉUTICA - MSF", "Manual de Primeros Auxilios - Cruz Roja Española"]
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def _median_rate(function: Callable[[], int], repeat: int) -> float:
+    """Run a function repeat times and return the median of units processed per second."""
+    rates = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        units = function()
+        rates.append(units / max(time.perf_counter() - started, 1e-9))
+    return statistics.median(rates)
+
+
+def _latencies(function: Callable[[object], object], inputs: List[object]) -> Dict[str, float]:
+    """Call a function on every input and return its p50/p99 latency in ms."""
+    elapsed = []
+    for item in inputs:
+        started = time.perf_counter()
+        function(item)
+        elapsed.append((time.perf_counter() - started) * 1000)
+    return {"p50_ms": round(statistics.median(elapsed), 3), "p99_ms": round(_percentile(elapsed, 0.99), 3)}
+
+
+def _page_lines(rng: random.Random, file_index: int, page: int) -> List[str]:
+    """Text lines of one synthetic page (every 10th page is short, to exercise page merging)."""
+    lines = [HEADERS[file_index % len(HEADERS)], ""]
+    topic, action = TOPICS[(file_index * 7 + page) % len(TOPICS)]
+    lines.append(f"Capítulo {page + 1}: {topic.capitalize()}")
+    short = page % 10 == 9
+    for _ in range(1 if short else 6):
+        sentences = " ".join(
+            rng.choice(TEMPLATES).format(topic=rng.choice(TOPICS)[0] if rng.random() < 0.2 else topic, action=action)
+            for _ in range(1 if short else rng.randint(3, 6))
+        )
+        lines.extend(textwrap.wrap(sentences, 95))
+        lines.append("")
+    return lines
+
+
+def _pdf_string(line: str) -> bytes:
+    """Encode a line as a PDF literal string (WinAnsi covers Spanish accents)."""
+    raw = line.encode("cp1252", errors="replace")
+    return b"(" + raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def write_pdf(path: Path, pages: List[List[str]]) -> None:
+    """Write a minimal text-only PDF with one Helvetica text block per page."""
+    objects: List[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"",  # page tree, filled in once page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    page_refs = []
+    for lines in pages:
+        stream = b"BT /F1 10 Tf 12 TL 50 800 Td\n" + b"".join(
+            _pdf_string(line) + b" Tj T*\n" for line in lines
+        ) + b"ET"
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects))
+        )
+        page_refs.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(page_refs), len(page_refs))
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(bytes(output))
+
+
+def generate_corpus(directory: Path, files: int, pages: int, seed: int = 0) -> List[Path]:
+    """Write the synthetic corpus and return the PDF paths."""
+    rng = random.Random(seed)
+    paths = []
+    for file_index in range(files):
+        path = directory / f"guia_sintetica_{file_index:02d}.pdf"
+        write_pdf(path, [_page_lines(rng, file_index, page) for page in range(pages)])
+        paths.append(path)
+    return paths
+
+
+class HashingEmbeddings:
+    """Deterministic bag-of-words embedder standing in for the model when its weights are missing."""
+
+    def __init__(self, dimension: int = DIMENSION):
+        self.dimension = dimension
+
+    def _embed(self, text: str) -> List[float]:
+        import numpy as np
+
+        from app.rag.lexical_index import tokenize
+
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for term in tokenize(text):
+            digest = zlib.crc32(term.encode("utf-8"))
+            vector[digest % self.dimension] += 1.0 if digest & (1 << 31) else -1.0
+        norm = float(np.linalg.norm(vector))
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def load_embedder(kind: str) -> Tuple[object, str]:
+    """Return the embedder to measure and its name, never downloading weights."""
+    if kind in ("auto", "model"):
+        os.environ.setdefault("HF_HUB_OFFLINE", "1")
+        os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+        try:
+            from app.rag.embeddings import CachedEmbeddings, get_embedding_model
+
+            config = get_embedding_model()
+            embedding = config.embedding
+            # measure the model itself, not the on-disk cache
+            if isinstance(embedding, CachedEmbeddings):
+                embedding = embedding.embedding
+            return embedding, f"{config.identifier}@{config.backend}"
+        except Exception as exc:
+            if kind == "model":
+                raise
+            print(f"Modelo de embeddings no disponible offline ({exc}); se usa el embedder de hashing")
+    return HashingEmbeddings(), "hashing"
+
+
+def run(args: argparse.Namespace) -> Dict[str, object]:
+    """Generate the corpus and measure every stage."""
+    import numpy as np
+
+    from app.core.constants import HEADER_PATTERNS, HYBRID_LEXICAL_K
+    from app.rag.lexical_index import LexicalIndex
+    from app.rag.loader import load_pdf_documents
+    from app.rag.local_index import LocalIndexClient, LocalVectorStore
+    from app.rag.retriever import get_retriever
+    from app.rag.splitter import clean_documents, normalize_text, remove_repeated_headers, split_documents
+
+    metrics: Dict[str, object] = {}
+    with tempfile.TemporaryDirectory(prefix="rag-bench-") as tmp:
+        tmp_dir = Path(tmp)
+        (tmp_dir / "pdfs").mkdir()
+        paths = generate_corpus(tmp_dir / "pdfs", args.files, args.pages)
+
+        pages = load_pdf_documents(paths=paths, workers=args.workers)
+        metrics["load_pages_per_second"] = round(
+            _median_rate(lambda: len(load_pdf_documents(paths=paths, workers=args.workers)), args.repeat), 1
+        )
+
+        texts = [page.page_content for page in pages]
+        characters = sum(len(text) for text in texts)
+        normalized = [normalize_text(text) for text in texts]
+
+        def normalize_all() -> int:
+            for text in texts:
+                normalize_text(text)
+            return characters
+
+        def remove_headers_all() -> int:
+            for text in normalized:
+                remove_repeated_headers(text, HEADER_PATTERNS)
+            return characters
+
+        def clean_all() -> int:
+            clean_documents(pages)
+            return characters
+
+        metrics["normalize_chars_per_second"] = round(_median_rate(normalize_all, args.repeat))
+        metrics["headers_chars_per_second"] = round(_median_rate(remove_headers_all, args.repeat))
+        metrics["clean_chars_per_second"] = round(_median_rate(clean_all, args.repeat))
+
+        cleaned = clean_documents(pages)
+        chunks = split_documents(cleaned)
+        metrics["split_chunks_per_second"] = round(
+            _median_rate(lambda: len(split_documents(cleaned)), args.repeat), 1
+        )
+
+        embedder, embedder_name = load_embedder(args.embedder)
+        chunk_texts = [chunk.page_content for chunk in chunks]
+        vectors = embedder.embed_documents(chunk_texts)
+        metrics["embed_chunks_per_second"] = round(
+            _median_rate(lambda: len(embedder.embed_documents(chunk_texts)), args.repeat), 1
+        )
+        rng = random.Random(1)
+        questions = [
+            f"¿{rng.choice(['Cómo', 'Qué hacer', 'Cuándo actuar'])} ante {rng.choice(TOPICS)[0]}? ({index})"
+            for index in range(args.queries)
+        ]
+        metrics["embed_query"] = _latencies(embedder.embed_query, questions)
+
+        # in-process index as the stand-in store, optionally padded with random vectors
+        client = LocalIndexClient(tmp_dir / "index")
+        collection = client.get_or_create_collection("benchmark")
+        ids = [f"chunk-{index}" for index in range(len(chunks))]
+        for start in range(0, len(chunks), 1000):
+            collection.upsert(
+                ids=ids[start:start + 1000],
+                embeddings=vectors[start:start + 1000],
+                metadatas=[chunk.metadata for chunk in chunks[start:start + 1000]],
+                documents=chunk_texts[start:start + 1000],
+            )
+        padding = np.random.default_rng(2)
+        for start in range(0, args.extra_vectors, 5000):
+            count = min(5000, args.extra_vectors - start)
+            collection.upsert(
+                ids=[f"extra-{start + index}" for index in range(count)],
+                embeddings=padding.normal(size=(count, len(vectors[0]))).astype(np.float32),
+                metadatas=[{"source": "relleno.pdf"}] * count,
+                documents=["relleno"] * count,
+            )
+        vectorstore = LocalVectorStore(collection, embedder)
+        query_vectors = [embedder.embed_query(question) for question in questions]
+
+        async def search_latencies(search_type: str) -> Dict[str, float]:
+            retriever = get_retriever(vectorstore=vectorstore, search_type=search_type, hybrid=False)
+            elapsed = []
+            for vector in query_vectors:
+                started = time.perf_counter()
+                await retriever.asearch_by_vector(vector)
+                elapsed.append((time.perf_counter() - started) * 1000)
+            return {"p50_ms": round(statistics.median(elapsed), 3), "p99_ms": round(_percentile(elapsed, 0.99), 3)}
+
+        metrics["retrieve_mmr"] = asyncio.run(search_latencies("mmr"))
+        metrics["retrieve_similarity"] = asyncio.run(search_latencies("similarity"))
+
+        lexical = LexicalIndex.build(zip(ids, chunk_texts))
+        metrics["retrieve_bm25"] = _latencies(lambda question: lexical.search(question, HYBRID_LEXICAL_K), questions)
+
+        corpus = {
+            "files": len(paths),
+            "pages": len(pages),
+            "characters": characters,
+            "chunks": len(chunks),
+            "store_rows": collection.count(),
+        }
+    return {"corpus": corpus, "embedder": embedder_name, "metrics": metrics}
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _flatten(metrics: Dict[str, object]) -> Dict[str, float]:
+    """Flatten nested latency metrics to name -> value."""
+    flat = {}
+    for name, value in metrics.items():
+        if isinstance(value, dict):
+            flat.update({f"{name}.{key}": item for key, item in value.items()})
+        else:
+            flat[name] = value
+    return flat
+
+
+def print_results(result: Dict[str, object], previous: Dict[str, object] = None) -> None:
+    """Print the metrics, with the change against a previous run if given."""
+    current = _flatten(result["metrics"])
+    before = _flatten(previous["metrics"]) if previous else {}
+    header = f"{'metric':<34} {'value':>14}" + (f" {'previous':>14} {'change':>8}" if previous else "")
+    print(header)
+    print("-" * len(header))
+    for name, value in current.items():
+        line = f"{name:<34} {value:>14}"
+        if previous and before.get(name):
+            line += f" {before[name]:>14} {(value - before[name]) / before[name]:>+8.1%}"
+        print(line)
+    if previous:
+        print(f"\n(previous: commit {previous.get('commit')}, embedder {previous.get('embedder')}; "
+              "higher is better for /s metrics, lower for _ms)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=8, help="synthetic PDF files")
+    parser.add_argument("--pages", type=int, default=40, help="pages per file")
+    parser.add_argument("--queries", type=int, default=200, help="questions for the latency metrics")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per throughput metric (median reported)")
+    parser.add_argument("--workers", type=int, help="loader worker processes (LOADER_WORKERS by default)")
+    parser.add_argument("--embedder", choices=["auto", "model", "hashing"], default="auto")
+    parser.add_argument("--extra-vectors", type=int, default=0, help="random vectors added to the store")
+    parser.add_argument("--output", type=Path, help="JSON file (benchmarks/results/pipeline-<commit>.json by default)")
+    parser.add_argument("--compare", type=Path, help="previous JSON result to compare with")
+    args = parser.parse_args()
+
+    commit = _git_commit()
+    result = {
+        "commit": commit,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        **run(args),
+    }
+
+    previous = json.loads(args.compare.read_text(encoding="utf-8")) if args.compare else None
+    print_results(result, previous)
+
+    output = args.output or RESULTS_DIR / f"pipeline-{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"\nResultados guardados en {output}")
+
+
+if __name__ == "__main__":
+    main()